@@ -0,0 +1,51 @@
+from pathlib import Path
+
+import click
+import structlog
+
+from hub_predtimechart.hub_config_ptc import HubConfigPtc
+from hub_predtimechart.util.byte_sizes import click_byte_size
+from hub_predtimechart.util.csv_cache import CsvCache
+from hub_predtimechart.util.logs import setup_logging
+from hub_predtimechart.viz_cube import VizCube
+
+
+setup_logging()
+logger = structlog.get_logger()
+
+
+@click.command()
+@click.argument('hub_dir', type=click.Path(file_okay=False, exists=True))
+@click.argument('ptc_config_file', type=click.Path(file_okay=True, exists=False))
+@click.argument('cube_dir', type=click.Path(file_okay=False))
+@click.option('--cache-dir', type=click.Path(file_okay=False), default=None)
+@click.option('--cache-max-size', type=str, default=None, callback=click_byte_size)
+def main(hub_dir, ptc_config_file, cube_dir, cache_dir, cache_max_size):
+    """
+    Builds or incrementally updates a hub's viz cube: a compact Parquet copy of only the model output that
+    predtimechart uses. Only new and changed submission files are reduced. Pass the cube to `ptc_generate_json_files`
+    and `ptc_generate_target_json_files` via --viz-cube. see `VizCube`
+
+    HUB_DIR: (input) a directory Path of a https://docs.hubverse.io hub
+
+    PTC_CONFIG_FILE: (input) a file Path to a `predtimechart-config.yaml` file that specifies how to process `hub_dir`
+    to get predtimechart output
+
+    CUBE_DIR: (output) a directory Path of the cube. created if necessary
+
+    --CACHE-DIR: (option) optional directory Path to cache parsed CSV model output files in. see `CsvCache`
+
+    --CACHE-MAX-SIZE: (option) optional maximum total size of --cache-dir, e.g., "2GB"
+    \f
+    :param hub_dir: (input) a directory Path of a https://docs.hubverse.io hub
+    :param ptc_config_file: (input) a file Path to a `predtimechart-config.yaml` file
+    :param cube_dir: (output) a directory Path of the cube
+    :param cache_dir: (option) optional directory Path to cache parsed CSV files in
+    :param cache_max_size: (option) optional maximum size of `cache_dir` in bytes (parsed by `click_byte_size()`)
+    """
+    logger.info(f"main({hub_dir=}, {ptc_config_file=}, {cube_dir=}, {cache_dir=}, {cache_max_size=}): entered")
+    hub_config = HubConfigPtc(Path(hub_dir), Path(ptc_config_file))
+    if cache_dir:
+        hub_config.csv_cache = CsvCache(Path(cache_dir), cache_max_size)
+    counts = VizCube(hub_config, Path(cube_dir)).update()
+    logger.info(f"main(): done: {counts}")
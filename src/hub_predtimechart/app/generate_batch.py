@@ -0,0 +1,188 @@
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import click
+import structlog
+import yaml
+from jsonschema import ValidationError, validate
+
+from hub_predtimechart.app.generate_json_files import _generate_forecast_json_files, _generate_options_file
+from hub_predtimechart.app.generate_target_json_files import _generate_target_json_files
+from hub_predtimechart.hub_config_ptc import HubConfigPtc
+from hub_predtimechart.util.byte_sizes import click_byte_size
+from hub_predtimechart.util.csv_cache import CsvCache
+from hub_predtimechart.util.logs import setup_logging
+from hub_predtimechart.util.write_files import OutputWriter, json_bytes, write_file_if_changed
+
+
+setup_logging()
+logger = structlog.get_logger()
+
+# the schema of the batch file passed to `main()`
+batch_schema = {
+    "$schema": "https://json-schema.org/draft/2020-12/schema",
+    "type": "object",
+    "properties": {
+        "hubs": {
+            "type": "array",
+            "minItems": 1,
+            "items": {
+                "type": "object",
+                "properties": {
+                    "hub_dir": {"type": "string", "minLength": 1},
+                    "ptc_config_file": {"type": "string", "minLength": 1},
+                    "options_file_out": {"type": "string", "minLength": 1},
+                    "forecasts_out_dir": {"type": "string", "minLength": 1},
+                    "target_out_dir": {"type": "string", "minLength": 1},
+                },
+                "required": ["hub_dir", "options_file_out", "forecasts_out_dir"],
+                "additionalProperties": False
+            }
+        }
+    },
+    "required": ["hubs"],
+    "additionalProperties": False
+}
+
+
+@click.command()
+@click.argument('batch_file', type=click.Path(file_okay=True, dir_okay=False, exists=True))
+@click.option('--regenerate', is_flag=True, default=False)
+@click.option('--workers', type=click.IntRange(min=1), default=4, show_default=True)
+@click.option('--writer-threads', type=click.IntRange(min=0), default=2, show_default=True)
+@click.option('--cache-dir', type=click.Path(file_okay=False), default=None)
+@click.option('--cache-max-size', type=str, default=None, callback=click_byte_size)
+@click.option('--summary-file', type=click.Path(file_okay=True, dir_okay=False), default=None)
+@click.option('--all-models', is_flag=True, default=False)
+def main(batch_file, regenerate, workers, writer_threads, cache_dir, cache_max_size, summary_file, all_models):
+    """
+    Generates the options, forecast, and (optionally) target data json files for each hub listed in BATCH_FILE in one
+    process, so that interpreter startup, imports, and logging setup are paid once rather than once per hub and CLI.
+    Hubs are processed concurrently by up to --workers threads. A failing hub does not stop the others. Exits with
+    status 1 if any hub failed.
+
+    BATCH_FILE: (input) a yaml file Path that lists the hubs to process, e.g.:
+
+    \b
+    hubs:
+      - hub_dir: hubs/flu-metrocast
+        ptc_config_file: hubs/flu-metrocast/hub-config/predtimechart-config.yml  # optional. this is the default
+        options_file_out: out/flu-metrocast/predtimechart-options.json
+        forecasts_out_dir: out/flu-metrocast/forecasts
+        target_out_dir: out/flu-metrocast/targets  # optional. no target data files are generated if omitted
+
+    Relative paths are relative to BATCH_FILE's directory. Output directories must exist.
+
+    --REGENERATE: (flag) indicator for a complete rebuild of the data regardless of whether the files exist.
+
+    --WORKERS: (option) maximum number of hubs to process at once
+
+    --WRITER-THREADS: (option) number of OutputWriter threads per hub. see `OutputWriter`
+
+    --CACHE-DIR: (option) optional directory Path to cache parsed CSV model output files in. shared by all hubs. see
+    `CsvCache`
+
+    --CACHE-MAX-SIZE: (option) optional maximum total size of --cache-dir, e.g., "2GB"
+
+    --SUMMARY-FILE: (output) optional file Path to save the run's per-hub summary to as json. see `_run_hub()`
+
+    --ALL-MODELS: (flag) indicator to output forecasts for all of each hub's models rather than only displayable ones.
+    see `ptc_generate_json_files`
+    \f
+    :param batch_file: (input) a yaml file Path that lists the hubs to process
+    :param regenerate: (flag) indicator for a complete rebuild of the data regardless of whether the files exist.
+    :param workers: (option) maximum number of hubs to process at once
+    :param writer_threads: (option) number of OutputWriter threads per hub
+    :param cache_dir: (option) optional directory Path to cache parsed CSV files in
+    :param cache_max_size: (option) optional maximum size of `cache_dir` in bytes (parsed by `click_byte_size()`)
+    :param summary_file: (output) optional file Path to save the per-hub summary json to
+    :param all_models: (flag) indicator to output forecasts for all models rather than only displayable ones
+    """
+    logger.info(f"main({batch_file=}, {regenerate=}, {workers=}, {writer_threads=}, {cache_dir=}, {cache_max_size=}, "
+                f"{summary_file=}, {all_models=}): entered")
+    try:
+        hub_entries = load_batch_file(Path(batch_file))
+    except (RuntimeError, yaml.YAMLError) as error:
+        raise click.ClickException(str(error))
+
+    csv_cache = CsvCache(Path(cache_dir), cache_max_size) if cache_dir else None
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='hub') as executor:
+        summaries = list(executor.map(lambda hub_entry: _run_hub(hub_entry, regenerate, writer_threads, csv_cache,
+                                                                 all_models),
+                                      hub_entries))
+
+    if summary_file:
+        write_file_if_changed(Path(summary_file), json_bytes(summaries, indent=4))
+    num_failed = sum(summary['status'] == 'failed' for summary in summaries)
+    for summary in summaries:
+        logger.info(f"main(): {summary}")
+    logger.info(f"main(): done: {len(summaries) - num_failed} hubs succeeded, {num_failed} failed")
+    if num_failed:
+        sys.exit(1)
+
+
+def load_batch_file(batch_file: Path) -> list[dict]:
+    """
+    Loads, validates, and returns `batch_file`'s hub entries, with relative paths resolved against `batch_file`'s
+    directory and 'ptc_config_file' defaulted. All paths are returned as Paths.
+
+    :raises RuntimeError: if `batch_file` does not match `batch_schema`
+    """
+    with open(batch_file) as fp:
+        batch = yaml.safe_load(fp)
+    try:
+        validate(batch, batch_schema)
+    except ValidationError as ve:
+        raise RuntimeError(f"invalid batch file: {batch_file}: {ve.message}")
+
+    hub_entries = []
+    for hub_entry in batch['hubs']:
+        hub_entry = {key: batch_file.parent / value for key, value in hub_entry.items()}
+        hub_entry.setdefault('ptc_config_file', hub_entry['hub_dir'] / 'hub-config/predtimechart-config.yml')
+        hub_entries.append(hub_entry)
+    return hub_entries
+
+
+def _run_hub(hub_entry: dict, is_regenerate: bool, writer_threads: int, csv_cache: CsvCache | None,
+             is_all_models: bool = False) -> dict:
+    """
+    `main()` helper that generates one hub's files. Errors are caught and reported in the returned summary so that
+    other hubs are not affected.
+
+    :param hub_entry: a dict as returned by `load_batch_file()`
+    :param is_all_models: boolean indicator to output forecasts for all models rather than only displayable ones
+    :return: a summary dict with these keys: 'hub_dir', 'status' ('ok' or 'failed'), 'num_forecast_files',
+        'num_target_files', 'seconds', and 'error' (a str, or None if 'ok')
+    """
+    hub_logger = logger.bind(hub_dir=str(hub_entry['hub_dir']))
+    summary = {'hub_dir': str(hub_entry['hub_dir']), 'status': 'ok', 'num_forecast_files': 0, 'num_target_files': 0,
+               'seconds': None, 'error': None}
+    start_time = time.perf_counter()
+    try:
+        for dir_key in ['forecasts_out_dir', 'target_out_dir']:
+            if (dir_key in hub_entry) and not hub_entry[dir_key].is_dir():
+                raise RuntimeError(f"{dir_key} not found: {hub_entry[dir_key]}")
+
+        hub_config = HubConfigPtc(hub_entry['hub_dir'], hub_entry['ptc_config_file'])
+        hub_config.csv_cache = csv_cache
+        if is_all_models:
+            hub_config.viz_model_ids = list(hub_config.model_id_to_metadata)
+        with OutputWriter(num_threads=writer_threads) as writer:
+            json_files = _generate_forecast_json_files(hub_config, hub_entry['forecasts_out_dir'], is_regenerate,
+                                                       writer=writer)
+            summary['num_forecast_files'] = len(json_files)
+            _generate_options_file(hub_config, hub_entry['options_file_out'], writer)
+            if 'target_out_dir' in hub_entry:
+                json_files = _generate_target_json_files(hub_config, hub_config.get_target_data_df(),
+                                                         hub_entry['target_out_dir'], is_regenerate, writer)
+                summary['num_target_files'] = len(json_files)
+    except Exception as error:
+        hub_logger.exception(f"_run_hub(): hub failed: {error!r}")
+        summary['status'] = 'failed'
+        summary['error'] = repr(error)
+
+    summary['seconds'] = round(time.perf_counter() - start_time, 3)
+    hub_logger.info(f"_run_hub(): done: {summary}")
+    return summary
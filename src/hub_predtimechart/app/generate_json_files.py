@@ -1,17 +1,23 @@
-import json
-import re
-from datetime import date
+from datetime import date, datetime
 from pathlib import Path
+from typing import Callable, Collection, Iterator
 
 import click
 import pandas as pd
+import pyarrow as pa
 import pyarrow.compute as pc
 import structlog
 
 from hub_predtimechart.generate_data import forecast_data_for_model_df
-from hub_predtimechart.generate_options import ptc_options_for_hub
-from hub_predtimechart.hub_config_ptc import HubConfigPtc
+from hub_predtimechart.generate_options import ptc_options_for_hub, ptc_sharded_options
+from hub_predtimechart.hub_config_ptc import HubConfigPtc, ModelTask
+from hub_predtimechart.util.byte_sizes import click_byte_size
+from hub_predtimechart.util.csv_cache import CsvCache
 from hub_predtimechart.util.logs import setup_logging
+from hub_predtimechart.util.shards import click_shard, is_shard_owner
+from hub_predtimechart.util.write_files import Changeset, OutputWriter, json_bytes, \
+    replace_file_name_chars
+from hub_predtimechart.viz_cube import VizCube
 
 
 setup_logging()
@@ -24,7 +30,24 @@ logger = structlog.get_logger()
 @click.argument('options_file_out', type=click.Path(file_okay=True, exists=False))
 @click.argument('forecasts_out_dir', type=click.Path(file_okay=False, exists=True))
 @click.option('--regenerate', is_flag=True, default=False)
-def main(hub_dir, ptc_config_file, options_file_out, forecasts_out_dir, regenerate):
+@click.option('--bundle', is_flag=True, default=False)
+@click.option('--changeset-file', type=click.Path(file_okay=True, dir_okay=False), default=None)
+@click.option('--compress', type=click.Choice(OutputWriter.COMPRESS_FORMATS), multiple=True)
+@click.option('--split-options', is_flag=True, default=False)
+@click.option('--cache-dir', type=click.Path(file_okay=False), default=None)
+@click.option('--cache-max-size', type=str, default=None, callback=click_byte_size)
+@click.option('--float32-values', is_flag=True, default=False)
+@click.option('--shard', type=str, default=None, callback=click_shard)
+@click.option('--writer-threads', type=click.IntRange(min=0), default=4, show_default=True)
+@click.option('--max-memory', type=str, default=None, callback=click_byte_size)
+@click.option('--since', type=click.DateTime(formats=['%Y-%m-%d']), default=None)
+@click.option('--last-n-rounds', type=click.IntRange(min=1), default=None)
+@click.option('--availability-file', type=click.Path(file_okay=True, dir_okay=False), default=None)
+@click.option('--viz-cube', type=click.Path(file_okay=False), default=None)
+@click.option('--all-models', is_flag=True, default=False)
+def main(hub_dir, ptc_config_file, options_file_out, forecasts_out_dir, regenerate, bundle, changeset_file,
+         compress, split_options, cache_dir, cache_max_size, float32_values, shard, writer_threads, max_memory, since,
+         last_n_rounds, availability_file, viz_cube, all_models):
     """
     Generates the options json file and forecast json files used by https://github.com/reichlab/predtimechart to
     visualize a hub's forecasts.
@@ -40,6 +63,56 @@ def main(hub_dir, ptc_config_file, options_file_out, forecasts_out_dir, regenera
     FORECASTS_OUT_DIR: (output) a directory Path to output the viz forecast json files to
 
     --REGENERATE: (flag) indicator for a complete rebuild of the data regardless of whether the files exist.
+
+    --BUNDLE: (flag) indicator to write one bundle file (plus a byte-range index file) per (target, reference_date)
+    instead of one json file per (target, task_ids, reference_date). see `generate_forecast_bundle_file()`
+
+    --CHANGESET-FILE: (output) optional file Path to output a json changeset to that lists the files this run added,
+    modified, left unchanged, and deleted, along with their sha256 hashes and sizes. see `Changeset`
+
+    --COMPRESS: (option) a precompressed sidecar format ('gz' or 'br') to save next to each forecast and options json
+    file, e.g., "foo.json.gz". can be passed more than once. 'br' requires the optional `brotli` package
+
+    --SPLIT-OPTIONS: (flag) indicator to save a small core options file plus per-target task_ids and available_as_ofs
+    shards that are fetched lazily. see `ptc_sharded_options()`
+
+    --CACHE-DIR: (option) optional directory Path to cache parsed CSV model output files in as memory-mappable Arrow
+    files so that later runs skip re-parsing unchanged submissions. see `CsvCache`
+
+    --CACHE-MAX-SIZE: (option) optional maximum total size of --cache-dir, e.g., "2GB". least recently used entries are
+    evicted beyond it
+
+    --FLOAT32-VALUES: (flag) indicator to hold forecast values in memory as float32 rather than float64, which halves
+    their memory. values keep about seven significant digits, which is plenty for plotting
+
+    --SHARD: (option) optional "i/N" spec (0 <= i < N) to generate only the forecast files owned by shard i of N (see
+    `is_shard_owner()`), e.g., to split a run across a CI matrix. requires --changeset-file, which receives this
+    shard's partial manifest. the options file is not generated - run `ptc_merge_shards` on all N manifests for that
+
+    --WRITER-THREADS: (option) number of threads that serialize and save json files while the main thread extracts
+    data. 0 saves files on the main thread. see `OutputWriter`
+
+    --MAX-MEMORY: (option) optional approximate budget for loaded model output data, e.g., "2GB". if passed then each
+    reference date's task ids are processed in slices sized to fit it rather than all at once. output is the same. not
+    supported with --bundle
+
+    --SINCE: (option) optional date (YYYY-MM-DD) to limit generation to reference dates on or after it, e.g., for
+    routine runs that only need the newest rounds rebuilt. see `HubConfigPtc.window_reference_dates()`
+
+    --LAST-N-ROUNDS: (option) optional number of the newest submitted rounds to limit generation to. an alternative to
+    --since
+
+    --AVAILABILITY-FILE: (input/output) optional json file Path that records each target's available reference dates.
+    with --since or --last-n-rounds, reference dates outside the window are taken from it rather than scanned, so the
+    options file's available_as_ofs is still complete. it is (re)saved after each run. see
+    `HubConfigPtc.save_availability_record()`
+
+    --VIZ-CUBE: (input/output) optional directory Path of a viz cube: a compact, pre-reduced copy of the hub's model
+    output. it is first updated for new and changed submissions, and then read instead of the submissions. see `VizCube`
+    and `ptc_build_viz_cube`
+
+    --ALL-MODELS: (flag) indicator to output forecasts for all models rather than only those that predtimechart can
+    display (designated models plus `initial_checked_models`). see `HubConfigPtc.displayable_model_ids`
     \f
     :param hub_dir: (input) a directory Path of a https://docs.hubverse.io hub to generate forecast json files from
     :param ptc_config_file: (input) a file Path to a `predtimechart-config.yaml` file that specifies how to process
@@ -48,94 +121,410 @@ def main(hub_dir, ptc_config_file, options_file_out, forecasts_out_dir, regenera
         https://github.com/reichlab/predtimechart?tab=readme-ov-file#options-object )
     :param forecasts_out_dir: (output) a directory Path to output the viz forecast json files to
     :param regenerate: (flag) indicator for a complete rebuild of the data regardless of whether the files exist.
+    :param bundle: (flag) indicator to write bundle files instead of individual json files
+    :param changeset_file: (output) optional file Path to output the run's changeset json to
+    :param compress: (option) tuple of sidecar formats to save
+    :param split_options: (flag) indicator to save a core options file plus shards
+    :param cache_dir: (option) optional directory Path to cache parsed CSV files in
+    :param cache_max_size: (option) optional maximum size of `cache_dir` in bytes (parsed by `click_byte_size()`)
+    :param float32_values: (flag) indicator to hold forecast values as float32
+    :param shard: (option) optional (index, count) tuple (parsed by `click_shard()`) of the shard to generate
+    :param writer_threads: (option) number of OutputWriter threads
+    :param max_memory: (option) optional memory budget in bytes (parsed by `click_byte_size()`)
+    :param since: (option) optional datetime of the oldest reference date to generate
+    :param last_n_rounds: (option) optional number of the newest submitted rounds to generate
+    :param availability_file: (input/output) optional file Path of the availability record json
+    :param viz_cube: (input/output) optional directory Path of a VizCube to update and then read model output from
+    :param all_models: (flag) indicator to output forecasts for all models rather than only displayable ones
     """
-    logger.info(f"main({hub_dir=}, {ptc_config_file=}, {options_file_out=}, {forecasts_out_dir=}, {regenerate=}): "
-                f"entered")
+    logger.info(f"main({hub_dir=}, {ptc_config_file=}, {options_file_out=}, {forecasts_out_dir=}, {regenerate=}, "
+                f"{bundle=}, {changeset_file=}, {compress=}, {split_options=}, {cache_dir=}, {cache_max_size=}, "
+                f"{float32_values=}, {shard=}, {writer_threads=}, {max_memory=}, {since=}, {last_n_rounds=}, "
+                f"{availability_file=}, {viz_cube=}, {all_models=}): entered")
+    if bundle and max_memory:
+        raise click.UsageError("--max-memory is not supported with --bundle")
+    if shard and not changeset_file:
+        raise click.UsageError("--shard requires --changeset-file to save the shard's manifest to")
+    if since and last_n_rounds:
+        raise click.UsageError("only one of --since and --last-n-rounds may be passed")
+
     hub_config = HubConfigPtc(Path(hub_dir), Path(ptc_config_file))
-    json_files = _generate_forecast_json_files(hub_config, Path(forecasts_out_dir), regenerate)
-    _generate_options_file(hub_config, Path(options_file_out))
+    if all_models:
+        hub_config.viz_model_ids = list(hub_config.model_id_to_metadata)
+    if cache_dir:
+        hub_config.csv_cache = CsvCache(Path(cache_dir), cache_max_size)
+    if viz_cube:
+        hub_config.viz_cube = VizCube(hub_config, Path(viz_cube))
+        hub_config.viz_cube.update()
+    reference_dates = _set_rounds_window(hub_config, since, last_n_rounds, availability_file)
+    changeset = Changeset(shard)
+    with OutputWriter(changeset, compress, writer_threads) as writer:
+        json_files = _generate_forecast_json_files(hub_config, Path(forecasts_out_dir), regenerate, bundle, writer,
+                                                   float32_values, shard, max_memory, reference_dates)
+        if not shard:  # o/w generated by `merge_shards.py`
+            _generate_options_file(hub_config, Path(options_file_out), writer, split_options)
+    if changeset_file:
+        changeset.save(Path(changeset_file))
+    if availability_file:
+        hub_config.save_availability_record(Path(availability_file))
     logger.info(f"main(): done: {len(json_files)} JSON files generated: {[str(_) for _ in json_files]}. "
-                f"config file generated: {options_file_out}")
+                f"config file generated: {None if shard else options_file_out}. changeset: "
+                f"{ {status: len(files) for status, files in changeset.status_to_files.items()} }")
+
+
+def _set_rounds_window(hub_config: HubConfigPtc, since: datetime | None, last_n_rounds: int | None,
+                       availability_file: str | None) -> set[str] | None:
+    """
+    `main()` helper shared with `generate_target_json_files.py` that sets `hub_config`'s `rounds_window` from the
+    `--since` or `--last-n-rounds` option, and loads its `availability_record` from `availability_file` if that exists.
+    Returns the window's reference_dates to limit generation to, or None if neither option was passed.
+    """
+    hub_config.rounds_window = hub_config.window_reference_dates(since.date().isoformat() if since else None,
+                                                                 last_n_rounds)
+    if availability_file and not hub_config.load_availability_record(Path(availability_file)):
+        logger.info(f"_set_rounds_window(): availability file not found. scanning all rounds. {availability_file=}")
+    logger.info(f"_set_rounds_window(): {hub_config.rounds_window=}")
+    return hub_config.rounds_window
 
 
 #
 # _generate_forecast_json_files() and helpers
 #
 
-def _generate_forecast_json_files(hub_config: HubConfigPtc, output_dir: Path, is_regenerate: bool = False) \
-        -> list[Path]:
+def _generate_forecast_json_files(hub_config: HubConfigPtc, output_dir: Path, is_regenerate: bool = False,
+                                  is_bundle: bool = False, writer: OutputWriter | None = None,
+                                  is_float32_values: bool = False,
+                                  shard: tuple[int, int] | None = None, max_memory: int | None = None,
+                                  reference_dates: Collection[str] | None = None) -> list[Path]:
     """
     Generates forecast json files from `hub_config`. Returns a list of Paths of the generated files.
 
     :param hub_config: see caller above
     :param output_dir: ""
     :param is_regenerate: boolean indicator for a complete rebuild of the data regardless of whether the files exist.
+    :param is_bundle: boolean indicator to write one bundle file and index file per (target, reference_date) rather
+        than one json file per (target, task_ids, reference_date). see `generate_forecast_bundle_file()`
+    :param writer: optional OutputWriter to save and remove files with. defaults to a plain OutputWriter()
+    :param is_float32_values: boolean indicator to hold the `value` column as float32. see `_model_table_to_df()`
+    :param shard: optional (index, count) tuple that limits generation to the work units owned by that shard, where a
+        unit is one json file (or one bundle if `is_bundle`). see `is_shard_owner()`. None generates all units. when
+        passed (without `is_bundle`), only the owned task_ids_tuples' rows are loaded (the task id filter is pushed
+        into the scan, and CSV files are streamed), so shards split the model output work and not just the json output
+    :param max_memory: optional approximate budget (bytes) for each reference_date's loaded model data. if passed then
+        the reference_date's task_ids_tuples are processed in slices, loading only each slice's rows (the task id
+        filter is pushed into the scan, and CSV files are streamed) and sizing later slices from the measured size of
+        earlier ones that had rows. None (the default) loads all of a reference_date's task_ids_tuples at once
+    :param reference_dates: optional collection of reference_dates to limit generation to, e.g., those affected by new
+        submissions. None (the default) generates all of them
+    :raises RuntimeError: if both `is_bundle` and `max_memory` are passed
+    """
+    if is_bundle and max_memory:
+        raise RuntimeError("max_memory is not supported with is_bundle")
+
+    writer = writer if writer is not None else OutputWriter()
+    json_files = []  # list of files actually generated
+    if not is_bundle:
+        # existing files are skipped before their data is loaded, except for the newest round's, which may have changed
+        def skip_fn(file_name, is_newest_reference_date):
+            return (not is_regenerate) and (not is_newest_reference_date) and (output_dir / file_name).exists()
+
+        for file_name, forecast_data in _iter_forecast_data(hub_config, is_float32_values, shard, max_memory,
+                                                            reference_dates, skip_fn):
+            json_file_path = output_dir / file_name
+            if forecast_data:
+                writer.write_json(json_file_path, forecast_data, indent=4, default=str)
+                json_files.append(json_file_path)
+            else:
+                writer.remove(json_file_path)  # out of date
+        return json_files
+
+    for model_task in hub_config.model_tasks:
+        newest_reference_date = _newest_reference_date(model_task)
+        for reference_date in model_task.viz_reference_dates:
+            bundle_file_path = output_dir / bundle_file_name(model_task.viz_target_id, reference_date)
+            if ((reference_dates is not None) and (reference_date not in reference_dates)) or \
+                    not is_shard_owner(bundle_file_path.name, shard):
+                continue
+
+            # skip existing bundles before their data is loaded, except for the newest round's. see
+            # `generate_forecast_bundle_file()`
+            if (not is_regenerate) and (reference_date != newest_reference_date) and bundle_file_path.exists():
+                continue
+
+            model_id_to_df = load_model_id_to_df(hub_config, model_task, reference_date, is_float32_values)
+            if model_id_to_df:
+                json_files.extend(generate_forecast_bundle_file(hub_config, model_id_to_df, output_dir, model_task,
+                                                                reference_date, newest_reference_date, is_regenerate,
+                                                                writer))
+    return json_files
+
+
+def iter_forecast_payloads(hub_config: HubConfigPtc, is_float32_values: bool = False,
+                           shard: tuple[int, int] | None = None, max_memory: int | None = None,
+                           reference_dates: Collection[str] | None = None) -> Iterator[tuple[str, dict]]:
+    """
+    A generator that lazily yields a `(relative_path, payload)` tuple for each forecast json file that
+    `_generate_forecast_json_files()` would save, without touching the disk. This lets callers that embed this package
+    stream payloads into any sink (object storage, a database, an HTTP response, etc.). ex:
+
+    ('wk-inc-flu-hosp_US_2022-10-22.json', {'Flusight-baseline': {'target_end_date': [...], 'q0.025': [...], ...}})
+
+    `relative_path` is relative to the forecasts output directory, i.e., `json_file_name()`. `payload` is the dict
+    documented at `forecast_data_for_task_ids()`, which `json_bytes(payload, indent=4, default=str)` serializes exactly
+    as the saved file. Files with no data are not yielded. Only one reference_date's (or slice's) model data is held in
+    memory at a time.
+
+    :param hub_config: a HubConfigPtc
+    :param is_float32_values: see `_generate_forecast_json_files()`
+    :param shard: ""
+    :param max_memory: ""
+    :param reference_dates: ""
+    """
+    for relative_path, payload in _iter_forecast_data(hub_config, is_float32_values, shard, max_memory,
+                                                      reference_dates):
+        if payload:
+            yield relative_path, payload
+
+
+def _iter_forecast_data(hub_config: HubConfigPtc, is_float32_values: bool, shard: tuple[int, int] | None,
+                        max_memory: int | None, reference_dates: Collection[str] | None,
+                        skip_fn: Callable[[str, bool], bool] | None = None) -> Iterator[tuple[str, dict]]:
+    """
+    Shared generator of `iter_forecast_payloads()` and `_generate_forecast_json_files()` that yields a
+    `(json_file_name, forecast_data)` tuple for each of the non-bundle json files, including files with no data (an
+    empty dict), so that writers can delete out of date files.
+
+    :param skip_fn: optional function that's passed each file's name and whether its reference_date is the newest one
+        that has model output, and returns True if the file should be skipped. skipped files are not yielded, and a
+        reference_date whose files are all skipped is not loaded
     """
     # for each ModelTask in hub_config, loop over every (reference_date X model_id) combination. the nested order of
     # reference_date, model_id ensures we open each model_output file only once. the tradeoff is that all model_output
     # files for a particular reference_date are loaded into memory, but that should be reasonable given the number of
-    # teams a hub might have and the size of their model_output files
-    json_files = []  # list of files actually generated
+    # teams a hub might have and the size of their model_output files. `max_memory` bounds this at the cost of
+    # re-opening each file once per slice
     for model_task in hub_config.model_tasks:
-        available_ref_dates = model_task.get_available_ref_dates()
-        newest_reference_date = max([date.fromisoformat(date_str) for date_str in available_ref_dates]).isoformat()
-        df_cols_to_use = ([model_task.viz_target_col_name] + model_task.viz_task_ids +
-                          [hub_config.target_date_col_name, 'output_type', 'output_type_id', 'value'])
+        newest_reference_date = _newest_reference_date(model_task)
         for reference_date in model_task.viz_reference_dates:  # ex: ['2022-10-22', '2022-10-29', ...]
-            # set model_id_to_df
-            model_id_to_df: dict[str, pd.DataFrame] = {}
-            for model_id in hub_config.model_id_to_metadata:  # ex: ['Flusight-baseline', 'MOBS-GLEAM_FLUH', ...]
-                model_output_file = hub_config.model_output_file_for_ref_date(model_id, reference_date)
-                if model_output_file:
-                    # Use hubdata's to_table() method with filtering to load only this model's data
-                    # for this reference_date. This applies the schema from tasks.json, ensuring
-                    # task_id columns (like location) are properly typed as strings, preventing
-                    # dtype inference issues with numeric-only values like "01", "02"
-                    filter_expr = (pc.field('model_id') == model_id) & \
-                                  (pc.field(hub_config.reference_date_col_name) == date.fromisoformat(reference_date))
-                    pa_table = hub_config.to_table(columns=df_cols_to_use, filter=filter_expr)
-                    model_id_to_df[model_id] = pa_table.to_pandas()
-
-            if not model_id_to_df:  # no model outputs for reference_date
+            if (reference_dates is not None) and (reference_date not in reference_dates):
                 continue
 
-            # iterate over each (target X task_ids) combination (for now we only support one target), outputting to the
-            # corresponding json file
+            # get the task_ids_tuples owned by `shard` and not skipped, skipping reference_dates that have none before
+            # loading any data
+            task_ids_tuples = []
             for task_ids_tuple in model_task.viz_task_ids_tuples:
-                json_file = generate_forecast_json_file(hub_config, model_id_to_df, output_dir,
-                                                        model_task.viz_target_id, task_ids_tuple, reference_date,
-                                                        newest_reference_date, is_regenerate)
-                if json_file:
-                    json_files.append(json_file)
+                file_name = json_file_name(model_task.viz_target_id, task_ids_tuple, reference_date)
+                if is_shard_owner(file_name, shard) and \
+                        not (skip_fn and skip_fn(file_name, reference_date == newest_reference_date)):
+                    task_ids_tuples.append(task_ids_tuple)
+            if not task_ids_tuples:
+                continue
 
-    # done
-    return json_files
+            # process task_ids_tuples in slices: one slice of all of them, or, if `max_memory`, slices that start with a
+            # single task_ids_tuple (to measure rows' in-memory size) and are then sized to fit `max_memory`. a slice's
+            # task_ids_tuples are pushed into the scan if `max_memory` or `shard`, i.e., whenever it may not be all of
+            # them
+            slice_size = 1 if max_memory else len(task_ids_tuples)
+            is_filter_task_ids = bool(max_memory) or (shard is not None)
+            slice_start = 0
+            while slice_start < len(task_ids_tuples):
+                slice_task_ids_tuples = task_ids_tuples[slice_start:slice_start + slice_size]
+                slice_start += len(slice_task_ids_tuples)
+                model_id_to_df = load_model_id_to_df(hub_config, model_task, reference_date, is_float32_values,
+                                                      slice_task_ids_tuples if is_filter_task_ids else None)
+                if not model_id_to_df:  # no model outputs for reference_date
+                    break
+
+                # size the next slice from this one's measured size. slices without rows measure only the data frames'
+                # fixed overhead, which would size the next slice far too large, so they instead double the size until
+                # rows appear
+                if max_memory:
+                    slice_num_rows = sum(len(model_df) for model_df in model_id_to_df.values())
+                    slice_bytes = sum(model_df.memory_usage(deep=True).sum() for model_df in model_id_to_df.values())
+                    if slice_num_rows == 0:
+                        slice_size *= 2
+                    else:
+                        slice_size = max(1, int(max_memory * len(slice_task_ids_tuples) / slice_bytes))
+
+                # iterate over each (target X task_ids) combination (for now we only support one target)
+                for task_ids_tuple in slice_task_ids_tuples:
+                    yield (json_file_name(model_task.viz_target_id, task_ids_tuple, reference_date),
+                           forecast_data_for_task_ids(hub_config, model_id_to_df, model_task.viz_target_id,
+                                                      task_ids_tuple))
+                del model_id_to_df  # release before loading the next slice
+
+
+def _newest_reference_date(model_task: ModelTask) -> str:
+    """
+    :return: the newest reference_date that `model_task` has model output for
+    """
+    return max([date.fromisoformat(date_str) for date_str in model_task.get_available_ref_dates()]).isoformat()
+
+
+def load_model_id_to_df(hub_config: HubConfigPtc, model_task: ModelTask, reference_date: str,
+                        is_float32_values: bool = False,
+                        task_ids_tuples: list[tuple] | None = None) -> dict[str, pd.DataFrame]:
+    """
+    Returns a dict that maps each of `hub_config.viz_model_ids` with a model output file for `reference_date` to a
+    pd.DataFrame of its rows for `model_task` as used by `forecast_data_for_model_df()`. Returns an empty dict if no
+    models have a file for `reference_date`.
+
+    :param is_float32_values: see `_model_table_to_df()`
+    :param task_ids_tuples: optional list of task_ids_tuples to limit rows to. if passed then the task id filter is
+        pushed into the scan and CSV files are streamed. None (the default) loads all task ids
+    """
+    df_cols_to_use = ([model_task.viz_target_col_name] + model_task.viz_task_ids +
+                      [hub_config.target_date_col_name, 'output_type', 'output_type_id', 'value'])
+    filter_cols = [hub_config.reference_date_col_name, model_task.viz_target_col_name, 'output_type',
+                   'output_type_id'] + model_task.viz_task_ids  # those used by the filter expressions
+    categorical_cols = [model_task.viz_target_col_name] + model_task.viz_task_ids + ['output_type']
+    filter_expr = _forecast_filter_expr(hub_config, model_task, reference_date)
+    if task_ids_tuples is not None:
+        filter_expr = filter_expr & _task_ids_filter_expr(hub_config, model_task, task_ids_tuples)
+
+    model_id_to_df: dict[str, pd.DataFrame] = {}
+    for model_id in hub_config.viz_model_ids:  # ex: ['Flusight-baseline', 'MOBS-GLEAM_FLUH', ...]
+        model_output_file = hub_config.model_output_file_for_ref_date(model_id, reference_date)
+        if model_output_file:
+            # Use model_output_table() with filtering to load only this model's data for this reference_date. This
+            # applies the schema from tasks.json, ensuring task_id columns (like location) are properly typed as
+            # strings, preventing dtype inference issues with numeric-only values like "01", "02". The filter also
+            # selects only the rows that `forecast_data_for_model_df()` uses so that other output types (samples, pmf,
+            # etc.) are never decoded
+            pa_table = hub_config.model_output_table(model_id, model_output_file, df_cols_to_use, filter_expr,
+                                                     filter_cols, is_streaming=task_ids_tuples is not None)
+            model_id_to_df[model_id] = _model_table_to_df(_normalize_output_type_id(pa_table), categorical_cols,
+                                                          is_float32_values)
+    return model_id_to_df
+
+
+def _task_ids_filter_expr(hub_config: HubConfigPtc, model_task: ModelTask,
+                          task_ids_tuples: list[tuple]) -> pc.Expression:
+    """
+    `load_model_id_to_df()` helper that returns a filter expression that selects rows whose viz task ids are among
+    `task_ids_tuples`' values. Each task id is filtered separately, so with more than one task id this can select some
+    extra rows, which `forecast_data_for_model_df()` filters out. Values are cast to the hub's schema types.
+    """
+    filter_expr = pc.scalar(True)
+    for idx, viz_task_id in enumerate(model_task.viz_task_ids):
+        values = sorted({task_ids_tuple[idx] for task_ids_tuple in task_ids_tuples})
+        filter_expr &= pc.field(viz_task_id).isin(pa.array(values).cast(hub_config.schema.field(viz_task_id).type))
+    return filter_expr
+
+
+def _forecast_filter_expr(hub_config: HubConfigPtc, model_task: ModelTask, reference_date: str) -> pc.Expression:
+    """
+    `_generate_forecast_json_files()` helper that returns a filter expression for `HubConfigPtc.model_output_table()`
+    that selects the `VIZ_QUANTILE_LEVELS` quantile rows for `model_task`'s target and `reference_date`. Quantile levels
+    are matched as typed by `HubConfigPtc.viz_quantile_levels()`.
+    """
+    return ((pc.field(hub_config.reference_date_col_name) == date.fromisoformat(reference_date)) &
+            (pc.field(model_task.viz_target_col_name) == model_task.viz_target_id) &
+            (pc.field('output_type') == 'quantile') &
+            pc.field('output_type_id').isin(hub_config.viz_quantile_levels()))
 
 
-def generate_forecast_json_file(hub_config, model_id_to_df, output_dir, target, task_ids_tuple, reference_date,
-                                newest_reference_date, is_regenerate):
+def _normalize_output_type_id(pa_table: pa.Table) -> pa.Table:
     """
-    Gets the forecast data to save using the passed args and then saves it to the appropriately-named json file in
-    `output_dir`. Returns the saved json file Path, or None if no json file was generated (i.e., there was no forecast
-    data for the args) OR if the json file already exists and is not the current round.
+    `_generate_forecast_json_files()` helper that casts `pa_table`'s `output_type_id` column to float64 so that
+    downstream code sees one spelling of each quantile level regardless of the hub's schema. Assumes `pa_table` was
+    filtered by `_forecast_filter_expr()`, i.e., that all `output_type_id`s are quantile levels.
     """
-    file_name = json_file_name(target, task_ids_tuple, reference_date)
-    json_file_path = output_dir / file_name
-    if not is_regenerate and (reference_date != newest_reference_date) and Path(json_file_path).exists():
-        return None
+    col_idx = pa_table.schema.get_field_index('output_type_id')
+    return pa_table.set_column(col_idx, 'output_type_id', pc.cast(pa_table['output_type_id'], pa.float64()))
 
+
+def _model_table_to_df(pa_table: pa.Table, categorical_cols: list[str],
+                       is_float32_values: bool = False) -> pd.DataFrame:
+    """
+    `_generate_forecast_json_files()` helper that converts `pa_table` to a memory-compact pd.DataFrame. All of a
+    reference date's model frames are held in memory at once, and `pa.Table.to_pandas()`'s default of one Python str
+    object per cell makes them several times larger than their Arrow data. So we dictionary-encode
+    `categorical_cols` (low-cardinality columns like the target, task ids, and output_type), which become
+    pd.Categoricals, and keep any other string columns Arrow-backed.
+
+    :param pa_table: a pa.Table as returned by `_normalize_output_type_id()`
+    :param categorical_cols: the string columns to dictionary-encode
+    :param is_float32_values: boolean indicator to cast the `value` column to float32 (see
+        `forecast_data_for_model_df()` for how these are converted back for output)
+    """
+    for col_name in categorical_cols:
+        col_idx = pa_table.schema.get_field_index(col_name)
+        if pa.types.is_string(pa_table.schema.field(col_idx).type):
+            pa_table = pa_table.set_column(col_idx, col_name, pc.dictionary_encode(pa_table[col_name]))
+    if is_float32_values:
+        col_idx = pa_table.schema.get_field_index('value')
+        pa_table = pa_table.set_column(col_idx, 'value', pc.cast(pa_table['value'], pa.float32()))
+    return pa_table.to_pandas(types_mapper={pa.string(): pd.ArrowDtype(pa.string()),
+                                            pa.large_string(): pd.ArrowDtype(pa.large_string())}.get)
+
+
+def forecast_data_for_task_ids(hub_config, model_id_to_df, target, task_ids_tuple) -> dict[str, dict]:
+    """
+    Returns the forecast data for all models in `model_id_to_df` as a dict that maps model_ids to the output of
+    `forecast_data_for_model_df()`, i.e., the contents of a single forecast json file. Models with no forecast data for
+    the args are omitted, so an empty dict means there is no data.
+    """
     forecast_data = {}
     for model_id, model_df in model_id_to_df.items():
         model_forecast_data = forecast_data_for_model_df(hub_config, model_df, target, task_ids_tuple)
         if model_forecast_data:
             forecast_data[model_id] = model_forecast_data
+    return forecast_data
 
-    if forecast_data:
-        with open(json_file_path, 'w') as fp:
-            json.dump(forecast_data, fp, indent=4, default=str)
-            return json_file_path
 
-    return None
+def generate_forecast_bundle_file(hub_config, model_id_to_df, output_dir, model_task, reference_date,
+                                  newest_reference_date, is_regenerate, writer=None) -> list[Path]:
+    """
+    Bundle mode counterpart of the individual json files that saves the forecast data for *all* of `model_task`'s
+    `viz_task_ids_tuples` for `reference_date` into a single bundle file, which is simply the concatenation of the
+    json payloads that `_iter_forecast_data()` yields for them, serialized as individual files are. An index json
+    file is saved alongside it that maps each payload's `json_file_name()` to an `[offset, length]` byte range within
+    the bundle, which allows static hosts that support HTTP Range requests to serve any single payload from the one
+    object. ex:
+
+    {
+        "wk-inc-flu-hosp_US_2022-10-22.json": [0, 2803],
+        "wk-inc-flu-hosp_01_2022-10-22.json": [2803, 2790],
+        ...
+    }
+
+    Returns a list containing the saved bundle and index file Paths, or an empty list if nothing was saved (i.e., there
+    was no forecast data for the args) OR if the bundle file already exists and is not the current round. As with
+    individual json files, files are saved via `writer` and out of date files are deleted. NB: the bundle file
+    gets no compressed sidecars because range offsets refer to its uncompressed bytes, but the index file does.
+    """
+    writer = writer if writer is not None else OutputWriter()
+    bundle_file_path = output_dir / bundle_file_name(model_task.viz_target_id, reference_date)
+    index_file_path = output_dir / bundle_index_file_name(model_task.viz_target_id, reference_date)
+    if not is_regenerate and (reference_date != newest_reference_date) and bundle_file_path.exists():
+        return []
+
+    payloads = []  # bytes
+    file_name_to_range = {}  # the index
+    offset = 0
+    for task_ids_tuple in model_task.viz_task_ids_tuples:
+        forecast_data = forecast_data_for_task_ids(hub_config, model_id_to_df, model_task.viz_target_id,
+                                                   task_ids_tuple)
+        if not forecast_data:
+            continue
+
+        # serialize exactly as individual json files are (`json_bytes(..., indent=4, default=str)`) so that a
+        # range-served payload is identical to the corresponding individual json file
+        payload = json_bytes(forecast_data, indent=4, default=str)
+        file_name_to_range[json_file_name(model_task.viz_target_id, task_ids_tuple, reference_date)] = \
+            [offset, len(payload)]
+        payloads.append(payload)
+        offset += len(payload)
+
+    if not payloads:
+        writer.remove(bundle_file_path)
+        writer.remove(index_file_path)
+        return []
+
+    writer.write(bundle_file_path, b''.join(payloads), is_compress=False)
+    writer.write(index_file_path, json_bytes(file_name_to_range, indent=4))
+    return [bundle_file_path, index_file_path]
 
 
 def json_file_name(target: str, task_ids_tuple: tuple[str], reference_date: str) -> str:
@@ -153,30 +542,61 @@ def json_file_name(target: str, task_ids_tuple: tuple[str], reference_date: str)
     :param reference_date: string naming the reference_date of interest
     :return: a "valid" file name
     """
+    target_str = replace_file_name_chars(target)
+    task_ids_str = replace_file_name_chars('_'.join(task_ids_tuple))
+    return f"{target_str}_{task_ids_str}_{reference_date}.json"
 
 
-    def replace_chars(the_string: str) -> str:
-        # replace all non-alphanumeric characters, except dashes and underscores, with a dash
-        return re.sub(r'[^a-zA-Z0-9-_]', '-', the_string)
+def bundle_file_name(target: str, reference_date: str) -> str:
+    """
+    Returns the name of the bundle file for `target` and `reference_date` as saved by `generate_forecast_bundle_file()`.
+    Like `json_file_name()`, the translation is one way.
 
+    :param target: string naming the target of interest
+    :param reference_date: string naming the reference_date of interest
+    :return: a "valid" file name
+    """
+    return f"{replace_file_name_chars(target)}_{reference_date}.bundle"
 
-    target_str = replace_chars(target)
-    task_ids_str = replace_chars('_'.join(task_ids_tuple))
-    return f"{target_str}_{task_ids_str}_{reference_date}.json"
+
+def bundle_index_file_name(target: str, reference_date: str) -> str:
+    """
+    Returns the name of the index json file that accompanies the bundle file named by `bundle_file_name()`.
+    """
+    return f"{replace_file_name_chars(target)}_{reference_date}.bundle-index.json"
 
 
 #
 # _generate_options_file()
 #
 
-def _generate_options_file(hub_config: HubConfigPtc, options_file: Path):
+def _generate_options_file(hub_config: HubConfigPtc, options_file: Path, writer: OutputWriter | None = None,
+                           is_split_options: bool = False):
     """
     Generates a predtimechart config .json file from `hub_config` as documented at `ptc_options_for_hub()`, saving it to
-    `options_file`. NB: `options_file` is overwritten if already present.
+    `options_file` via `writer` (defaults to a plain OutputWriter()). NB: `options_file` is overwritten if already
+    present and its contents have changed.
+
+    If `is_split_options` then `options_file` gets only the core options, and the shards documented at
+    `ptc_sharded_options()` are saved under a directory next to `options_file` named after its stem, e.g.,
+    "predtimechart-options/" for "predtimechart-options.json". Shard paths are relative to `options_file`'s directory.
+    Shard files from earlier runs that the new options no longer refer to (task id values shards are named by content
+    hash) are deleted via `writer`.
     """
+    writer = writer if writer is not None else OutputWriter()
     options = ptc_options_for_hub(hub_config)
-    with open(options_file, 'w') as fp:
-        json.dump(options, fp, indent=4)
+    if is_split_options:
+        options, shard_path_to_contents = ptc_sharded_options(options, options_file.stem)
+        shard_files = set()
+        for shard_path, shard_contents in shard_path_to_contents.items():
+            shard_file = options_file.parent / shard_path
+            shard_file.parent.mkdir(parents=True, exist_ok=True)
+            writer.write(shard_file, json_bytes(shard_contents, indent=4))
+            shard_files.add(shard_file)
+        for old_shard_file in sorted((options_file.parent / options_file.stem).rglob('*.json')):
+            if old_shard_file not in shard_files:
+                writer.remove(old_shard_file)
+    writer.write(options_file, json_bytes(options, indent=4))
 
 
 #
@@ -1,16 +1,22 @@
-import json
 import sys
 from datetime import date
 from pathlib import Path
+from typing import Callable, Collection, Iterator
 
 import click
 import pandas as pd
 import polars as pl
 import structlog
 
-from hub_predtimechart.app.generate_json_files import json_file_name
+from hub_predtimechart.app.generate_json_files import _set_rounds_window, json_file_name
+from hub_predtimechart.generate_data import round_values
 from hub_predtimechart.hub_config_ptc import HubConfigPtc, ModelTask
+from hub_predtimechart.util.byte_sizes import click_byte_size
+from hub_predtimechart.util.csv_cache import CsvCache
 from hub_predtimechart.util.logs import setup_logging
+from hub_predtimechart.util.shards import click_shard, is_shard_owner
+from hub_predtimechart.util.write_files import Changeset, OutputWriter
+from hub_predtimechart.viz_cube import VizCube
 
 
 setup_logging()
@@ -22,7 +28,19 @@ logger = structlog.get_logger()
 @click.argument('ptc_config_file', type=click.Path(file_okay=True, exists=False))
 @click.argument('target_out_dir', type=click.Path(file_okay=False, exists=True))
 @click.option('--regenerate', is_flag=True, default=False)
-def main(hub_dir, ptc_config_file, target_out_dir, regenerate):
+@click.option('--changeset-file', type=click.Path(file_okay=True, dir_okay=False), default=None)
+@click.option('--compress', type=click.Choice(OutputWriter.COMPRESS_FORMATS), multiple=True)
+@click.option('--cache-dir', type=click.Path(file_okay=False), default=None)
+@click.option('--cache-max-size', type=str, default=None, callback=click_byte_size)
+@click.option('--shard', type=str, default=None, callback=click_shard)
+@click.option('--writer-threads', type=click.IntRange(min=0), default=4, show_default=True)
+@click.option('--since', type=click.DateTime(formats=['%Y-%m-%d']), default=None)
+@click.option('--last-n-rounds', type=click.IntRange(min=1), default=None)
+@click.option('--availability-file', type=click.Path(file_okay=True, dir_okay=False), default=None)
+@click.option('--viz-cube', type=click.Path(file_okay=False), default=None)
+@click.option('--all-models', is_flag=True, default=False)
+def main(hub_dir, ptc_config_file, target_out_dir, regenerate, changeset_file, compress, cache_dir, cache_max_size,
+         shard, writer_threads, since, last_n_rounds, availability_file, viz_cube, all_models):
     """
     Generates the target data json files used by https://github.com/reichlab/predtimechart to visualize a hub's
     forecasts. Handles missing input target data in two ways, depending on the error. 1) If the `target_data_file_name`
@@ -38,15 +56,73 @@ def main(hub_dir, ptc_config_file, target_out_dir, regenerate):
     TARGET_OUT_DIR: (output) a directory Path to output the viz target data json files to
 
     --REGENERATE: (flag) indicator for a complete rebuild of the data regardless of whether the files exist.
+
+    --CHANGESET-FILE: (output) optional file Path to output a json changeset to that lists the files this run added,
+    modified, left unchanged, and deleted, along with their sha256 hashes and sizes. see `Changeset`
+
+    --COMPRESS: (option) a precompressed sidecar format ('gz' or 'br') to save next to each target json file, e.g.,
+    "foo.json.gz". can be passed more than once. 'br' requires the optional `brotli` package
+
+    --CACHE-DIR: (option) optional directory Path to cache parsed CSV model output files in (used to find each target's
+    available reference dates). see `CsvCache`
+
+    --CACHE-MAX-SIZE: (option) optional maximum total size of --cache-dir, e.g., "2GB". least recently used entries are
+    evicted beyond it
+
+    --SHARD: (option) optional "i/N" spec (0 <= i < N) to generate only the target files owned by shard i of N (see
+    `is_shard_owner()`). requires --changeset-file, which receives this shard's partial manifest
+
+    --WRITER-THREADS: (option) number of threads that serialize and save json files while the main thread extracts
+    data. 0 saves files on the main thread. see `OutputWriter`
+
+    --SINCE: (option) optional date (YYYY-MM-DD) to limit generation to reference dates on or after it. see
+    `ptc_generate_json_files`
+
+    --LAST-N-ROUNDS: (option) optional number of the newest submitted rounds to limit generation to. ""
+
+    --AVAILABILITY-FILE: (input/output) optional json file Path that records each target's available reference dates.
+    ""
+
+    --VIZ-CUBE: (input/output) optional directory Path of a viz cube to read model output from when finding each
+    target's available reference dates. see `ptc_generate_json_files`
+
+    --ALL-MODELS: (flag) indicator to find each target's available reference dates from all models' output rather than
+    only displayable models'. pass it if the forecast files were generated with `ptc_generate_json_files --all-models`
+    so that both agree on the available dates
     \f
     :param hub_dir: (input) a directory Path of a https://docs.hubverse.io hub to generate target data json files from
     :param ptc_config_file: (input) a file Path to a `predtimechart-config.yaml` file that specifies how to process
         `hub_dir` to get predtimechart output
     :param target_out_dir: (output) a directory Path to output the viz target data json files to
     :param regenerate: (flag) indicator for a complete rebuild of the data regardless of whether the files exist.
+    :param changeset_file: (output) optional file Path to output the run's changeset json to
+    :param compress: (option) tuple of sidecar formats to save
+    :param cache_dir: (option) optional directory Path to cache parsed CSV files in
+    :param cache_max_size: (option) optional maximum size of `cache_dir` in bytes (parsed by `click_byte_size()`)
+    :param shard: (option) optional (index, count) tuple (parsed by `click_shard()`) of the shard to generate
+    :param writer_threads: (option) number of OutputWriter threads
+    :param since: (option) optional datetime of the oldest reference date to generate
+    :param last_n_rounds: (option) optional number of the newest submitted rounds to generate
+    :param availability_file: (input/output) optional file Path of the availability record json
+    :param viz_cube: (input/output) optional directory Path of a VizCube to update and then read model output from
+    :param all_models: (flag) indicator to find available reference dates from all models rather than displayable ones
     """
-    logger.info(f'main({hub_dir=}, {target_out_dir=}, {regenerate=}): entered')
+    logger.info(f'main({hub_dir=}, {target_out_dir=}, {regenerate=}, {changeset_file=}, {compress=}, {cache_dir=}, '
+                f'{cache_max_size=}, {shard=}, {writer_threads=}, {since=}, {last_n_rounds=}, '
+                f'{availability_file=}, {viz_cube=}, {all_models=}): entered')
+    if shard and not changeset_file:
+        raise click.UsageError("--shard requires --changeset-file to save the shard's manifest to")
+    if since and last_n_rounds:
+        raise click.UsageError("only one of --since and --last-n-rounds may be passed")
     hub_config = HubConfigPtc(Path(hub_dir), Path(ptc_config_file))
+    if all_models:
+        hub_config.viz_model_ids = list(hub_config.model_id_to_metadata)
+    if cache_dir:
+        hub_config.csv_cache = CsvCache(Path(cache_dir), cache_max_size)
+    if viz_cube:
+        hub_config.viz_cube = VizCube(hub_config, Path(viz_cube))
+        hub_config.viz_cube.update()
+    reference_dates = _set_rounds_window(hub_config, since, last_n_rounds, availability_file)
 
     try:
         target_data_df = hub_config.get_target_data_df()
@@ -54,12 +130,22 @@ def main(hub_dir, ptc_config_file, target_out_dir, regenerate):
         logger.error(f"target data file not found. {error=}")
         sys.exit(1)
 
-    json_files = _generate_target_json_files(hub_config, target_data_df, target_out_dir, regenerate)
-    logger.info(f'main(): done: {len(json_files)} JSON files generated: {[str(_) for _ in json_files]}. ')
+    changeset = Changeset(shard)
+    with OutputWriter(changeset, compress, writer_threads) as writer:
+        json_files = _generate_target_json_files(hub_config, target_data_df, target_out_dir, regenerate, writer,
+                                                 shard, reference_dates)
+    if changeset_file:
+        changeset.save(Path(changeset_file))
+    if availability_file:
+        hub_config.save_availability_record(Path(availability_file))
+    logger.info(f'main(): done: {len(json_files)} JSON files generated: {[str(_) for _ in json_files]}. changeset: '
+                f'{ {status: len(files) for status, files in changeset.status_to_files.items()} }')
 
 
 def _generate_target_json_files(hub_config: HubConfigPtc, target_data_df: pd.DataFrame, target_out_dir: Path,
-                                is_regenerate: bool = False) -> list[Path]:
+                                is_regenerate: bool = False, writer: OutputWriter | None = None,
+                                shard: tuple[int, int] | None = None,
+                                reference_dates: Collection[str] | None = None) -> list[Path]:
     """
     Generates target json files from `hub_config`. Returns a list of Paths of the generated files.
 
@@ -67,40 +153,118 @@ def _generate_target_json_files(hub_config: HubConfigPtc, target_data_df: pd.Dat
     :param target_data_df: ""
     :param target_out_dir: ""
     :param is_regenerate: boolean indicator for a complete rebuild of the data regardless of whether the files exist.
+    :param writer: optional OutputWriter to save files with. defaults to a plain OutputWriter()
+    :param shard: optional (index, count) tuple that limits generation to the files owned by that shard. see
+        `is_shard_owner()`. None generates all files
+    :param reference_dates: optional collection of reference_dates to limit generation to. None (the default) generates
+        all of them
     """
-    def get_max_ref_date_or_first_config_ref_date(reference_dates):
-        if len(reference_dates) == 0:
-            return min(hub_config.viz_reference_dates)
-        else:
-            return max(reference_dates)
-
+    writer = writer if writer is not None else OutputWriter()
     json_files = []  # list of files actually generated
-    # for each (model_task x reference_date x task_ids_tuple) combination, generate and save target data as a json file
-    available_as_ofs = {}
-    for model_task in hub_config.model_tasks:
-        available_as_ofs[model_task.viz_target_id] = model_task.get_available_ref_dates()
-    max_available_ref_date = max([get_max_ref_date_or_first_config_ref_date(reference_dates)
-                                    for reference_dates in available_as_ofs.values()])
     target_out_dir = Path(target_out_dir)
+
+    def skip_fn(file_name):
+        return (not is_regenerate) and (target_out_dir / file_name).exists()  # skip existing file
+
+    for file_name, location_data_dict in _iter_target_data(hub_config, target_data_df, shard, reference_dates,
+                                                           skip_fn):
+        file_p = target_out_dir / file_name
+        json_files.append(file_p)
+        writer.write_json(file_p, location_data_dict, indent=4)
+    return json_files
+
+
+def iter_target_payloads(hub_config: HubConfigPtc, target_data_df: pl.DataFrame | None = None,
+                         shard: tuple[int, int] | None = None,
+                         reference_dates: Collection[str] | None = None) -> Iterator[tuple[str, dict]]:
+    """
+    A generator that lazily yields a `(relative_path, payload)` tuple for each target json file that
+    `_generate_target_json_files()` would save, without touching the disk. `relative_path` is relative to the target
+    output directory, i.e., `json_file_name()`, and `payload` is the dict documented at `ptc_target_data()`. See
+    `iter_forecast_payloads()`.
+
+    :param hub_config: a HubConfigPtc
+    :param target_data_df: optional target data as returned by `HubConfigPtc.get_target_data_df()`. loaded if None
+    :param shard: see `_generate_target_json_files()`
+    :param reference_dates: ""
+    """
+    target_data_df = target_data_df if target_data_df is not None else hub_config.get_target_data_df()
+    yield from _iter_target_data(hub_config, target_data_df, shard, reference_dates)
+
+
+def _iter_target_data(hub_config: HubConfigPtc, target_data_df: pl.DataFrame, shard: tuple[int, int] | None,
+                      reference_dates: Collection[str] | None,
+                      skip_fn: Callable[[str], bool] | None = None) -> Iterator[tuple[str, dict]]:
+    """
+    Shared generator of `iter_target_payloads()` and `_generate_target_json_files()` that yields a
+    `(json_file_name, location_data_dict)` tuple for each target json file that has data.
+
+    :param skip_fn: optional function that's passed each file's name and returns True if the file should be skipped.
+        skipped files are not yielded, and their data is not computed
+    """
+    # for each (model_task x reference_date x task_ids_tuple) combination, generate target data from the model_task's
+    # slice of `target_data_df`
+    max_ref_date = max_available_ref_date(hub_config)
+    target_id_to_df = partition_target_data(hub_config, target_data_df)
     for model_task in hub_config.model_tasks:
+        model_task_df = target_id_to_df[model_task.viz_target_id]
         for reference_date in model_task.viz_reference_dates:
-            if date.fromisoformat(reference_date) > date.fromisoformat(max_available_ref_date):
+            if date.fromisoformat(reference_date) > date.fromisoformat(max_ref_date):
                 break  # reference_date is in the future. break instead of continue b/c viz_reference_dates is sorted
 
+            if (reference_dates is not None) and (reference_date not in reference_dates):
+                continue
+
             for task_ids_tuple in model_task.viz_task_ids_tuples:
                 file_name = json_file_name(model_task.viz_target_id, task_ids_tuple, reference_date)
-                file_p = target_out_dir / file_name
-                if not is_regenerate and file_p.exists():
-                    continue  # skip existing file
+                if not is_shard_owner(file_name, shard):
+                    continue  # owned by another shard
 
-                location_data_dict = ptc_target_data(model_task, target_data_df, task_ids_tuple, reference_date, max_available_ref_date)
-                if not location_data_dict:
-                    continue  # no data
+                if skip_fn and skip_fn(file_name):
+                    continue
 
-                json_files.append(file_p)
-                with open(file_p, 'w') as fp:
-                    json.dump(location_data_dict, fp, indent=4)
-    return json_files
+                location_data_dict = ptc_target_data(model_task, model_task_df, task_ids_tuple, reference_date,
+                                                     max_ref_date)
+                if location_data_dict:
+                    yield file_name, location_data_dict
+
+
+def partition_target_data(hub_config: HubConfigPtc, target_data_df: pl.DataFrame) -> dict[str, pl.DataFrame]:
+    """
+    Returns a dict that maps each model_task's `viz_target_id` to its slice of `target_data_df`, partitioned in one pass
+    so that `ptc_target_data()` and `_max_as_of_le_reference_date()` filter only one target's rows rather than the
+    whole hub's for every task_ids_tuple and reference_date. Targets with no rows map to an empty frame. Custom target
+    data files (`HubConfigPtc.target_data_file_name`) are not keyed by target, so every target maps to all of
+    `target_data_df`.
+    """
+    if hub_config.target_data_file_name:
+        return {model_task.viz_target_id: target_data_df for model_task in hub_config.model_tasks}
+
+    target_id_to_df = {}
+    for target_col_name in sorted({model_task.viz_target_col_name for model_task in hub_config.model_tasks}):
+        for (target_id,), target_df in target_data_df.partition_by(target_col_name, as_dict=True).items():
+            target_id_to_df[target_id] = target_df
+    return {model_task.viz_target_id: target_id_to_df.get(model_task.viz_target_id, target_data_df.clear())
+            for model_task in hub_config.model_tasks}
+
+
+def max_available_ref_date(hub_config: HubConfigPtc) -> str:
+    """
+    Returns the newest reference_date that any model_task has model output for, which is treated as the effective
+    as_of of target data files that have no as_of column. A model_task without any model output contributes its first
+    configured reference_date.
+    """
+    def get_max_ref_date_or_first_config_ref_date(reference_dates):
+        if len(reference_dates) == 0:
+            return min(hub_config.viz_reference_dates)
+        else:
+            return max(reference_dates)
+
+    available_as_ofs = {}
+    for model_task in hub_config.model_tasks:
+        available_as_ofs[model_task.viz_target_id] = model_task.get_available_ref_dates()
+    return max([get_max_ref_date_or_first_config_ref_date(reference_dates)
+                for reference_dates in available_as_ofs.values()])
 
 
 def ptc_target_data(model_task: ModelTask, target_data_df: pl.DataFrame, task_ids_tuple: tuple[str],
@@ -158,11 +322,21 @@ def ptc_target_data(model_task: ModelTask, target_data_df: pl.DataFrame, task_id
     if len(target_data_df) == 0:
         return None
 
-    # date column type depends on data source: date objects from `connect_target_data()`, strings from custom CSV files.
-    # convert date objects to ISO strings for JSON serialization; pass through strings as-is.
+    # round all values at once if configured
+    if model_task.hub_config_ptc.value_precision:
+        y_values = round_values(target_data_df[observation_col_name].to_numpy(),
+                                model_task.hub_config_ptc.value_precision).tolist()
+    else:
+        y_values = target_data_df[observation_col_name].to_list()
+
+    # date column type depends on data source: dates from `connect_target_data()`, strings from custom CSV files.
+    # convert dates to ISO strings for JSON serialization in one vectorized cast; pass through strings as-is.
+    date_series = target_data_df[target_date_col_name]
+    if date_series.dtype.is_temporal():
+        date_series = date_series.cast(pl.Date).cast(pl.String)
     return {
-        'date': [d.isoformat() if isinstance(d, date) else d for d in target_data_df[target_date_col_name].to_list()],
-        'y': target_data_df[observation_col_name].to_list()
+        'date': date_series.to_list(),
+        'y': y_values
     }
 
 
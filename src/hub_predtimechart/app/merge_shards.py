@@ -0,0 +1,99 @@
+from pathlib import Path
+
+import click
+import structlog
+
+from hub_predtimechart.app.generate_json_files import _generate_options_file
+from hub_predtimechart.hub_config_ptc import HubConfigPtc
+from hub_predtimechart.util.logs import setup_logging
+from hub_predtimechart.util.write_files import Changeset, OutputWriter
+
+
+setup_logging()
+logger = structlog.get_logger()
+
+
+@click.command()
+@click.argument('hub_dir', type=click.Path(file_okay=False, exists=True))
+@click.argument('ptc_config_file', type=click.Path(file_okay=True, exists=False))
+@click.argument('options_file_out', type=click.Path(file_okay=True, exists=False))
+@click.argument('manifest_files', type=click.Path(file_okay=True, dir_okay=False, exists=True), nargs=-1,
+                required=True)
+@click.option('--changeset-file', type=click.Path(file_okay=True, dir_okay=False), default=None)
+@click.option('--compress', type=click.Choice(OutputWriter.COMPRESS_FORMATS), multiple=True)
+@click.option('--split-options', is_flag=True, default=False)
+def main(hub_dir, ptc_config_file, options_file_out, manifest_files, changeset_file, compress, split_options):
+    """
+    Finishes a sharded run of `ptc_generate_json_files --shard i/N`: validates that MANIFEST_FILES are the partial
+    manifests of all N shards, generates the options json file, and optionally saves the combined changeset.
+
+    HUB_DIR: (input) a directory Path of a https://docs.hubverse.io hub
+
+    PTC_CONFIG_FILE: (input) a file Path to a `predtimechart-config.yaml` file that specifies how to process `hub_dir`
+    to get predtimechart output
+
+    OPTIONS_FILE_OUT: (output) a file Path to output the predtimechart options object file to
+
+    MANIFEST_FILES: (input) one or more file Paths of the shards' partial manifests, i.e., their --changeset-file
+    outputs
+
+    --CHANGESET-FILE: (output) optional file Path to output the combined json changeset to, which includes the options
+    file. see `Changeset`
+
+    --COMPRESS: (option) a precompressed sidecar format ('gz' or 'br') to save next to the options file. can be passed
+    more than once
+
+    --SPLIT-OPTIONS: (flag) indicator to save a core options file plus shards. see `ptc_sharded_options()`
+    \f
+    :param hub_dir: (input) a directory Path of a https://docs.hubverse.io hub
+    :param ptc_config_file: (input) a file Path to a `predtimechart-config.yaml` file
+    :param options_file_out: (output) a file Path to output the predtimechart options object file to
+    :param manifest_files: (input) tuple of the shards' partial manifest file Paths
+    :param changeset_file: (output) optional file Path to output the combined changeset json to
+    :param compress: (option) tuple of sidecar formats to save
+    :param split_options: (flag) indicator to save a core options file plus shards
+    """
+    logger.info(f"main({hub_dir=}, {ptc_config_file=}, {options_file_out=}, {manifest_files=}, {changeset_file=}, "
+                f"{compress=}, {split_options=}): entered")
+    try:
+        changeset = merge_shard_manifests([Path(manifest_file) for manifest_file in manifest_files])
+    except RuntimeError as error:
+        raise click.ClickException(str(error))
+
+    hub_config = HubConfigPtc(Path(hub_dir), Path(ptc_config_file))
+    _generate_options_file(hub_config, Path(options_file_out), OutputWriter(changeset, compress), split_options)
+    if changeset_file:
+        changeset.save(Path(changeset_file))
+    logger.info(f"main(): done: merged {len(manifest_files)} manifests. config file generated: {options_file_out}. "
+                f"changeset: { {status: len(files) for status, files in changeset.status_to_files.items()} }")
+
+
+def merge_shard_manifests(manifest_files: list[Path]) -> Changeset:
+    """
+    Returns a Changeset that combines the shards' partial manifests in `manifest_files`.
+
+    :param manifest_files: list of manifest file Paths as saved by a `--shard i/N` run, one per shard
+    :raises RuntimeError: if a manifest is not a shard's, if the manifests disagree on N, or if they do not cover each
+        of the N shards exactly once
+    """
+    changeset = Changeset()
+    shard_idxs = []
+    shard_counts = set()
+    for manifest_file in manifest_files:
+        shard_changeset = Changeset.load(manifest_file)
+        if shard_changeset.shard is None:
+            raise RuntimeError(f"not a shard manifest (no 'shard' key): {str(manifest_file)!r}")
+
+        shard_idxs.append(shard_changeset.shard[0])
+        shard_counts.add(shard_changeset.shard[1])
+        changeset.update(shard_changeset)
+
+    if len(shard_counts) != 1:
+        raise RuntimeError(f"manifests are from runs with different shard counts: {sorted(shard_counts)}")
+
+    shard_count = shard_counts.pop()
+    if sorted(shard_idxs) != list(range(shard_count)):
+        raise RuntimeError(f"manifests do not cover each of the {shard_count} shards exactly once. found shard "
+                           f"indexes: {sorted(shard_idxs)}")
+
+    return changeset
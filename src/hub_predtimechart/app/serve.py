@@ -0,0 +1,292 @@
+import threading
+from datetime import date
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import unquote, urlsplit
+
+import click
+import polars as pl
+import structlog
+
+from hub_predtimechart.app.generate_json_files import forecast_data_for_task_ids, json_file_name, load_model_id_to_df
+from hub_predtimechart.app.generate_target_json_files import max_available_ref_date, partition_target_data, \
+    ptc_target_data
+from hub_predtimechart.generate_options import ptc_options_for_hub
+from hub_predtimechart.hub_config_ptc import HubConfigPtc, ModelTask
+from hub_predtimechart.util.byte_sizes import click_byte_size
+from hub_predtimechart.util.csv_cache import CsvCache
+from hub_predtimechart.util.logs import setup_logging
+from hub_predtimechart.util.lru_cache import LruCache
+from hub_predtimechart.util.write_files import json_bytes
+
+
+setup_logging()
+logger = structlog.get_logger()
+
+# the URL paths that PtcServer answers. forecast and target file names are those of `json_file_name()`, i.e., the
+# same layout that the static json files are published with
+OPTIONS_PATH = '/predtimechart-options.json'
+FORECASTS_PATH_PREFIX = '/forecasts/'
+TARGETS_PATH_PREFIX = '/targets/'
+
+
+@click.command()
+@click.argument('hub_dir', type=click.Path(file_okay=False, exists=True))
+@click.argument('ptc_config_file', type=click.Path(file_okay=True, exists=False))
+@click.option('--host', type=str, default='127.0.0.1', show_default=True)
+@click.option('--port', type=click.IntRange(min=0, max=65535), default=8000, show_default=True)
+@click.option('--payload-cache-size', type=str, default='256MB', show_default=True, callback=click_byte_size)
+@click.option('--max-loaded-dates', type=click.IntRange(min=1), default=8, show_default=True)
+@click.option('--refresh-interval', type=click.FloatRange(min=0), default=60.0, show_default=True)
+@click.option('--cache-dir', type=click.Path(file_okay=False), default=None)
+@click.option('--cache-max-size', type=str, default=None, callback=click_byte_size)
+@click.option('--all-models', is_flag=True, default=False)
+def main(hub_dir, ptc_config_file, host, port, payload_cache_size, max_loaded_dates, refresh_interval, cache_dir,
+         cache_max_size, all_models):
+    """
+    Runs a local HTTP server that answers predtimechart's `_fetchData()` requests for a hub by computing each json
+    payload on demand rather than precomputing every file. The server answers these paths:
+
+    \b
+    - /predtimechart-options.json: the options object. see `ptc_options_for_hub()`
+    - /forecasts/<file name>: a forecast json payload, named as by `json_file_name()`
+    - /targets/<file name>: a target data json payload, ""
+
+    Payloads are identical to the files that `ptc_generate_json_files` and `ptc_generate_target_json_files` save. New
+    submissions and target data are picked up every --refresh-interval seconds. Changes to the hub's configuration or
+    model metadata require a restart. Stop via Ctrl-C.
+
+    HUB_DIR: (input) a directory Path of a https://docs.hubverse.io hub to serve
+
+    PTC_CONFIG_FILE: (input) a file Path to a `predtimechart-config.yaml` file that specifies how to process `hub_dir`
+    to get predtimechart output
+
+    --HOST: (option) the interface to listen on
+
+    --PORT: (option) the port to listen on. 0 picks a free port
+
+    --PAYLOAD-CACHE-SIZE: (option) maximum total size of the cached json payloads, e.g., "256MB"
+
+    --MAX-LOADED-DATES: (option) maximum number of (target, reference_date) model output data sets to keep loaded
+
+    --REFRESH-INTERVAL: (option) number of seconds between refreshes, which discard cached payloads and data and
+    re-index the hub's model output files. 0 never refreshes. see `PtcServer.refresh()`
+
+    --CACHE-DIR: (option) optional directory Path to cache parsed CSV model output files in. see `CsvCache`
+
+    --CACHE-MAX-SIZE: (option) optional maximum total size of --cache-dir, e.g., "2GB"
+
+    --ALL-MODELS: (flag) indicator to serve forecasts for all models rather than only displayable ones. see
+    `ptc_generate_json_files`
+    \f
+    :param hub_dir: (input) a directory Path of a https://docs.hubverse.io hub to serve
+    :param ptc_config_file: (input) a file Path to a `predtimechart-config.yaml` file
+    :param host: (option) the interface to listen on
+    :param port: (option) the port to listen on
+    :param payload_cache_size: (option) maximum size of the payload cache in bytes (parsed by `click_byte_size()`)
+    :param max_loaded_dates: (option) maximum number of model output data sets to keep loaded
+    :param refresh_interval: (option) number of seconds between refreshes. 0 never refreshes
+    :param cache_dir: (option) optional directory Path to cache parsed CSV files in
+    :param cache_max_size: (option) optional maximum size of `cache_dir` in bytes (parsed by `click_byte_size()`)
+    :param all_models: (flag) indicator to serve forecasts for all models rather than only displayable ones
+    """
+    logger.info(f"main({hub_dir=}, {ptc_config_file=}, {host=}, {port=}, {payload_cache_size=}, {max_loaded_dates=}, "
+                f"{refresh_interval=}, {cache_dir=}, {cache_max_size=}, {all_models=}): entered")
+    hub_config = HubConfigPtc(Path(hub_dir), Path(ptc_config_file))
+    if all_models:
+        hub_config.viz_model_ids = list(hub_config.model_id_to_metadata)
+    if cache_dir:
+        hub_config.csv_cache = CsvCache(Path(cache_dir), cache_max_size)
+    with PtcServer(hub_config, (host, port), payload_cache_size, max_loaded_dates, refresh_interval) as server:
+        logger.info(f"main(): serving on http://{server.server_address[0]}:{server.server_address[1]}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            logger.info("main(): done")
+
+
+class PtcServer(ThreadingHTTPServer):
+    """
+    A ThreadingHTTPServer that computes predtimechart json payloads on demand (see `main()` for the paths it answers).
+    Two LruCaches avoid repeated work:
+
+    - payload_cache: maps a request path to its json payload bytes, bounded by their total size
+    - model_data_cache: maps a (viz_target_id, reference_date) to the dict returned by `load_model_id_to_df()`, so that
+        all of a reference_date's forecast files (one per task_ids_tuple) are computed from a single load. bounded by
+        the number of data sets
+
+    A file name is mapped back to its (model_task, task_ids_tuple, reference_date) by an index built at startup, since
+    `json_file_name()` cannot be reversed. `refresh()` (called every `refresh_interval` seconds, if passed) picks up
+    changes to the hub's model output and target data.
+    """
+
+    daemon_threads = True  # don't let in-progress requests block shutdown
+
+
+    def __init__(self, hub_config: HubConfigPtc, server_address: tuple[str, int], payload_cache_size: int,
+                 max_loaded_dates: int, refresh_interval: float = 0):
+        """
+        :param hub_config: the HubConfigPtc to serve
+        :param server_address: a (host, port) tuple. port 0 picks a free port
+        :param payload_cache_size: see `main()`
+        :param max_loaded_dates: ""
+        :param refresh_interval: "". 0 (the default) never refreshes
+        """
+        super().__init__(server_address, _PtcRequestHandler)
+        self.hub_config = hub_config
+        self.payload_cache = LruCache(payload_cache_size, len)
+        self.model_data_cache = LruCache(max_loaded_dates)
+        self._file_name_to_args: dict[str, tuple[ModelTask, tuple, str]] = {}
+        for model_task in hub_config.model_tasks:
+            for reference_date in model_task.viz_reference_dates:
+                for task_ids_tuple in model_task.viz_task_ids_tuples:
+                    file_name = json_file_name(model_task.viz_target_id, task_ids_tuple, reference_date)
+                    self._file_name_to_args[file_name] = (model_task, task_ids_tuple, reference_date)
+        # the hub's target data partitioned by target. loaded on the first target request. see `_target_data()`
+        self._target_id_to_df: dict[str, pl.DataFrame] | None = None
+        self._max_available_ref_date: str | None = None  # ""
+        self._target_data_lock = threading.Lock()
+        self._refresh_stop = threading.Event()  # set by `server_close()`
+        if refresh_interval > 0:
+            threading.Thread(target=self._refresh_periodically, args=(refresh_interval,), name='PtcServer-refresh',
+                             daemon=True).start()
+
+
+    def refresh(self):
+        """
+        Picks up changes to the hub's model output and target data: refreshes `hub_config`'s dataset and model output
+        file index (see `HubConfigPtc.refresh_dataset()`), and discards all cached payloads, loaded model output, and
+        target data.
+        """
+        self.hub_config.refresh_dataset()
+        self.model_data_cache.clear()
+        with self._target_data_lock:
+            self._target_id_to_df = None
+            self._max_available_ref_date = None
+        self.payload_cache.clear()
+
+
+    def server_close(self):
+        self._refresh_stop.set()
+        super().server_close()
+
+
+    def _refresh_periodically(self, refresh_interval: float):
+        while not self._refresh_stop.wait(refresh_interval):
+            try:
+                self.refresh()
+            except Exception as error:
+                logger.exception(f"_refresh_periodically(): error refreshing. {error=}")
+
+
+    def payload_for_path(self, path: str) -> bytes | None:
+        """
+        :param path: a request's URL path, e.g., '/forecasts/wk-inc-flu-hosp_US_2022-10-22.json'
+        :return: the json payload bytes for `path`, or None if there is none, i.e., `path` is unknown or there is no
+            data for it
+        """
+        payload = self.payload_cache.get(path)
+        if payload is not None:
+            return payload
+
+        payload = None  # unknown path
+        if path == OPTIONS_PATH:
+            payload = json_bytes(ptc_options_for_hub(self.hub_config), indent=4)
+        elif path.startswith(FORECASTS_PATH_PREFIX):
+            payload = self._forecast_payload(path.removeprefix(FORECASTS_PATH_PREFIX))
+        elif path.startswith(TARGETS_PATH_PREFIX):
+            payload = self._target_payload(path.removeprefix(TARGETS_PATH_PREFIX))
+        if payload is not None:
+            self.payload_cache.put(path, payload)
+        return payload
+
+
+    def _forecast_payload(self, file_name: str) -> bytes | None:
+        if file_name not in self._file_name_to_args:
+            return None
+
+        model_task, task_ids_tuple, reference_date = self._file_name_to_args[file_name]
+        model_id_to_df = self.model_data_cache.get_or_compute(
+            (model_task.viz_target_id, reference_date),
+            lambda: load_model_id_to_df(self.hub_config, model_task, reference_date))
+        forecast_data = forecast_data_for_task_ids(self.hub_config, model_id_to_df, model_task.viz_target_id,
+                                                   task_ids_tuple)
+        return json_bytes(forecast_data, indent=4, default=str) if forecast_data else None
+
+
+    def _target_payload(self, file_name: str) -> bytes | None:
+        if file_name not in self._file_name_to_args:
+            return None
+
+        model_task, task_ids_tuple, reference_date = self._file_name_to_args[file_name]
+        target_data = self._target_data()
+        if target_data is None:
+            return None
+
+        target_id_to_df, max_available_ref_date = target_data
+        if date.fromisoformat(reference_date) > date.fromisoformat(max_available_ref_date):
+            return None  # reference_date is in the future. see `_generate_target_json_files()`
+
+        location_data_dict = ptc_target_data(model_task, target_id_to_df[model_task.viz_target_id], task_ids_tuple,
+                                             reference_date, max_available_ref_date)
+        return json_bytes(location_data_dict, indent=4) if location_data_dict else None
+
+
+    def _target_data(self) -> tuple[dict[str, pl.DataFrame], str] | None:
+        """
+        :return: a 2-tuple: (the hub's target data as returned by `partition_target_data()`,
+            `max_available_ref_date()`), loading them on the first call (or the first after a `refresh()`), or None if
+            the hub has no target data
+        """
+        with self._target_data_lock:
+            if self._target_id_to_df is None:
+                try:
+                    target_data_df = self.hub_config.get_target_data_df()
+                except FileNotFoundError as error:
+                    logger.error(f"target data file not found. {error=}")
+                    return None
+
+                self._target_id_to_df = partition_target_data(self.hub_config, target_data_df)
+                self._max_available_ref_date = max_available_ref_date(self.hub_config)
+            return self._target_id_to_df, self._max_available_ref_date
+
+
+class _PtcRequestHandler(BaseHTTPRequestHandler):
+    """
+    PtcServer's request handler. Answers GET requests with `PtcServer.payload_for_path()`. Responses allow any origin
+    so that a dashboard served from another local port can fetch from the server.
+    """
+
+
+    def do_GET(self):
+        path = unquote(urlsplit(self.path).path)
+        try:
+            payload = self.server.payload_for_path(path)
+        except Exception as error:
+            logger.exception(f"do_GET(): error computing payload. {path=}, {error=}")
+            self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR)
+            return
+
+        if payload is None:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()}: {format % args}")
+
+
+#
+# main()
+#
+
+if __name__ == '__main__':
+    main()
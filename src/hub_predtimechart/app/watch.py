@@ -0,0 +1,262 @@
+import re
+import time
+from datetime import date
+from pathlib import Path
+
+import click
+import structlog
+
+from hub_predtimechart.app.generate_json_files import _generate_forecast_json_files, _generate_options_file
+from hub_predtimechart.app.generate_target_json_files import _generate_target_json_files
+from hub_predtimechart.hub_config_ptc import HubConfigPtc
+from hub_predtimechart.util.byte_sizes import click_byte_size
+from hub_predtimechart.util.csv_cache import CsvCache
+from hub_predtimechart.util.logs import setup_logging
+from hub_predtimechart.util.write_files import OutputWriter
+
+
+setup_logging()
+logger = structlog.get_logger()
+
+# the hub directories that HubWatcher polls. changes elsewhere (e.g., README files) are ignored
+WATCHED_DIRS = ('model-output', 'model-metadata', 'target-data', 'hub-config')
+
+
+@click.command()
+@click.argument('hub_dir', type=click.Path(file_okay=False, exists=True))
+@click.argument('ptc_config_file', type=click.Path(file_okay=True, exists=False))
+@click.argument('options_file_out', type=click.Path(file_okay=True, exists=False))
+@click.argument('forecasts_out_dir', type=click.Path(file_okay=False, exists=True))
+@click.option('--target-out-dir', type=click.Path(file_okay=False, exists=True), default=None)
+@click.option('--interval', type=click.FloatRange(min=0, min_open=True), default=5.0, show_default=True)
+@click.option('--debounce', type=click.FloatRange(min=0), default=30.0, show_default=True)
+@click.option('--writer-threads', type=click.IntRange(min=0), default=4, show_default=True)
+@click.option('--cache-dir', type=click.Path(file_okay=False), default=None)
+@click.option('--cache-max-size', type=str, default=None, callback=click_byte_size)
+@click.option('--all-models', is_flag=True, default=False)
+def main(hub_dir, ptc_config_file, options_file_out, forecasts_out_dir, target_out_dir, interval, debounce,
+         writer_threads, cache_dir, cache_max_size, all_models):
+    """
+    Generates a hub's options, forecast, and (optionally) target data json files, and then keeps running, polling the
+    hub for new or changed files and regenerating only the affected files. Stop via Ctrl-C.
+
+    HUB_DIR: (input) a directory Path of a https://docs.hubverse.io hub to generate json files from
+
+    PTC_CONFIG_FILE: (input) a file Path to a `predtimechart-config.yaml` file that specifies how to process `hub_dir`
+    to get predtimechart output
+
+    OPTIONS_FILE_OUT: (output) a file Path to output the predtimechart options object file to
+
+    FORECASTS_OUT_DIR: (output) a directory Path to output the viz forecast json files to
+
+    --TARGET-OUT-DIR: (output) optional directory Path to output the viz target data json files to. no target data
+    files are generated if omitted
+
+    --INTERVAL: (option) number of seconds between polls
+
+    --DEBOUNCE: (option) number of seconds without further changes to wait before regenerating, so that a burst of
+    submissions is processed once
+
+    --WRITER-THREADS: (option) number of OutputWriter threads. see `OutputWriter`
+
+    --CACHE-DIR: (option) optional directory Path to cache parsed CSV model output files in. see `CsvCache`
+
+    --CACHE-MAX-SIZE: (option) optional maximum total size of --cache-dir, e.g., "2GB"
+
+    --ALL-MODELS: (flag) indicator to output forecasts for all models rather than only displayable ones. see
+    `ptc_generate_json_files`
+    \f
+    :param hub_dir: (input) a directory Path of a https://docs.hubverse.io hub to generate json files from
+    :param ptc_config_file: (input) a file Path to a `predtimechart-config.yaml` file
+    :param options_file_out: (output) a file Path to output the predtimechart options object file to
+    :param forecasts_out_dir: (output) a directory Path to output the viz forecast json files to
+    :param target_out_dir: (output) optional directory Path to output the viz target data json files to
+    :param interval: (option) number of seconds between polls
+    :param debounce: (option) number of quiet seconds to wait before regenerating
+    :param writer_threads: (option) number of OutputWriter threads
+    :param cache_dir: (option) optional directory Path to cache parsed CSV files in
+    :param cache_max_size: (option) optional maximum size of `cache_dir` in bytes (parsed by `click_byte_size()`)
+    :param all_models: (flag) indicator to output forecasts for all models rather than only displayable ones
+    """
+    logger.info(f"main({hub_dir=}, {ptc_config_file=}, {options_file_out=}, {forecasts_out_dir=}, {target_out_dir=}, "
+                f"{interval=}, {debounce=}, {writer_threads=}, {cache_dir=}, {cache_max_size=}, {all_models=}): "
+                f"entered")
+    csv_cache = CsvCache(Path(cache_dir), cache_max_size) if cache_dir else None
+    watcher = HubWatcher(Path(hub_dir), Path(ptc_config_file), Path(options_file_out), Path(forecasts_out_dir),
+                         Path(target_out_dir) if target_out_dir else None, debounce, writer_threads, csv_cache,
+                         all_models)
+    watcher.generate_all()
+    try:
+        while True:
+            time.sleep(interval)
+            watcher.poll()
+    except KeyboardInterrupt:
+        logger.info("main(): done")
+
+
+class HubWatcher:
+    """
+    Keeps a HubConfigPtc (and with it the memoized availability checks and the optional CSV cache) warm in memory and
+    incrementally regenerates a hub's json files as its files change. Each `poll()` compares the sizes and mtimes of
+    the files in `WATCHED_DIRS` against the previous poll's. Changes are accumulated until `debounce_seconds` pass
+    without new ones, and are then processed together:
+
+    - model-output: the HubConfigPtc's dataset is refreshed (see `HubConfigPtc.refresh_dataset()`), and forecast files
+        are regenerated for the changed files' reference dates (parsed from their "<reference_date>-<model_id>" names),
+        as are target files for those dates and the newest available date. the options file is regenerated
+    - target-data: all target files and the options file are regenerated
+    - model-metadata or hub-config: the HubConfigPtc is rebuilt and all files are regenerated
+
+    Instance variables:
+    - hub_config: the current HubConfigPtc
+    - debounce_seconds: number of seconds without further changes to wait before regenerating
+    """
+
+
+    def __init__(self, hub_dir: Path, ptc_config_file: Path, options_file_out: Path, forecasts_out_dir: Path,
+                 target_out_dir: Path | None = None, debounce_seconds: float = 30.0, writer_threads: int = 0,
+                 csv_cache: CsvCache | None = None, is_all_models: bool = False):
+        """
+        :param hub_dir: see `main()`
+        :param ptc_config_file: ""
+        :param options_file_out: ""
+        :param forecasts_out_dir: ""
+        :param target_out_dir: "". None means no target data files are generated
+        :param debounce_seconds: ""
+        :param writer_threads: ""
+        :param csv_cache: optional CsvCache to set on `hub_config`
+        :param is_all_models: boolean indicator to set `hub_config.viz_model_ids` to all models. see `main()`
+        """
+        self.hub_dir = hub_dir
+        self.ptc_config_file = ptc_config_file
+        self.options_file_out = options_file_out
+        self.forecasts_out_dir = forecasts_out_dir
+        self.target_out_dir = target_out_dir
+        self.debounce_seconds = debounce_seconds
+        self.writer_threads = writer_threads
+        self.csv_cache = csv_cache
+        self.is_all_models = is_all_models
+        self.hub_config = self._new_hub_config()
+        self._file_to_stat = _snapshot_files(hub_dir)  # the previous poll's files. maps Path -> (size, mtime_ns)
+        self._pending_files: set[Path] = set()  # changed files not yet processed
+        self._last_change_time: float | None = None
+
+
+    def _new_hub_config(self) -> HubConfigPtc:
+        hub_config = HubConfigPtc(self.hub_dir, self.ptc_config_file)
+        hub_config.csv_cache = self.csv_cache
+        if self.is_all_models:
+            hub_config.viz_model_ids = list(hub_config.model_id_to_metadata)
+        return hub_config
+
+
+    def generate_all(self, is_regenerate: bool = False):
+        """
+        Generates all of the hub's files, as the individual CLIs would.
+
+        :param is_regenerate: boolean indicator for a complete rebuild of the data regardless of whether the files exist
+        """
+        self._generate(is_regenerate, None, None)
+
+
+    def poll(self, now: float | None = None) -> set[Path]:
+        """
+        Checks the hub for new, changed, or deleted files, and processes the accumulated changes if none have been seen
+        for `debounce_seconds`. If processing fails (e.g., because a submission is only partly uploaded) then the error
+        is logged and the changes are kept and retried after another `debounce_seconds` (or after further changes).
+
+        :param now: the current time as returned by `time.monotonic()`. defaults to that. passed by tests
+        :return: the set of files that were processed, which is empty if none were (no changes, or still debouncing)
+        """
+        now = time.monotonic() if now is None else now
+        file_to_stat = _snapshot_files(self.hub_dir)
+        changed_files = {file for file in file_to_stat.keys() | self._file_to_stat.keys()
+                         if file_to_stat.get(file) != self._file_to_stat.get(file)}
+        self._file_to_stat = file_to_stat
+        if changed_files:
+            logger.info(f"poll(): changed files: {sorted(str(file) for file in changed_files)}")
+            self._pending_files |= changed_files
+            self._last_change_time = now
+
+        if (not self._pending_files) or (now - self._last_change_time < self.debounce_seconds):
+            return set()
+
+        try:
+            self._process(self._pending_files)
+        except Exception as error:
+            logger.exception(f"poll(): error processing changes. retrying after the next quiet period. {error=}")
+            self._last_change_time = now
+            return set()
+
+        processed_files, self._pending_files = self._pending_files, set()
+        return processed_files
+
+
+    def _process(self, changed_files: set[Path]):
+        """
+        `poll()` helper that regenerates the files affected by `changed_files`. See class docs.
+        """
+        dir_to_files = {watched_dir: [] for watched_dir in WATCHED_DIRS}
+        for changed_file in changed_files:
+            dir_to_files[changed_file.relative_to(self.hub_dir).parts[0]].append(changed_file)
+
+        if dir_to_files['model-metadata'] or dir_to_files['hub-config']:
+            logger.info("_process(): hub config or metadata changed. regenerating all files")
+            self.hub_config = self._new_hub_config()
+            self.generate_all(is_regenerate=True)
+            return
+
+        if dir_to_files['model-output']:
+            self.hub_config.refresh_dataset()  # files may have been added or removed
+        forecast_ref_dates = set()
+        for model_output_file in dir_to_files['model-output']:
+            match = re.match(r'(\d{4}-\d{2}-\d{2})-', model_output_file.name)
+            if match:
+                forecast_ref_dates.add(match.group(1))
+        if dir_to_files['target-data']:
+            target_ref_dates = None  # all
+        else:
+            newest_ref_dates = {max(model_task.get_available_ref_dates(), key=date.fromisoformat)
+                                for model_task in self.hub_config.model_tasks}
+            target_ref_dates = forecast_ref_dates | newest_ref_dates
+        logger.info(f"_process(): {forecast_ref_dates=}, {target_ref_dates=}")
+        self._generate(True, forecast_ref_dates, target_ref_dates)
+
+
+    def _generate(self, is_regenerate: bool, forecast_ref_dates: set[str] | None, target_ref_dates: set[str] | None):
+        """
+        Generates forecast files for `forecast_ref_dates` (None means all), the options file, and, if I have a
+        `target_out_dir`, target files for `target_ref_dates` (None means all).
+        """
+        with OutputWriter(num_threads=self.writer_threads) as writer:
+            if (forecast_ref_dates is None) or forecast_ref_dates:
+                json_files = _generate_forecast_json_files(self.hub_config, self.forecasts_out_dir, is_regenerate,
+                                                           writer=writer, reference_dates=forecast_ref_dates)
+                logger.info(f"_generate(): {len(json_files)} forecast files generated")
+            _generate_options_file(self.hub_config, self.options_file_out, writer)
+            if self.target_out_dir:
+                json_files = _generate_target_json_files(self.hub_config, self.hub_config.get_target_data_df(),
+                                                         self.target_out_dir, is_regenerate, writer,
+                                                         reference_dates=target_ref_dates)
+                logger.info(f"_generate(): {len(json_files)} target files generated")
+
+
+def _snapshot_files(hub_dir: Path) -> dict[Path, tuple[int, int]]:
+    """
+    Returns a dict that maps each file in `hub_dir`'s `WATCHED_DIRS` to its (size, mtime_ns). Hidden files (e.g.,
+    in-progress temporary files) are skipped.
+    """
+    file_to_stat = {}
+    for watched_dir in WATCHED_DIRS:
+        for file in (hub_dir / watched_dir).rglob('*'):
+            if file.name.startswith('.'):
+                continue
+
+            try:
+                stat = file.stat()
+            except FileNotFoundError:  # deleted since rglob() listed it
+                continue
+
+            if file.is_file():
+                file_to_stat[file] = (stat.st_size, stat.st_mtime_ns)
+    return file_to_stat
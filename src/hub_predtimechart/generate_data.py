@@ -1,8 +1,8 @@
-from collections import defaultdict
-
+import numpy as np
 import pandas as pd
+import pyarrow as pa
 
-from hub_predtimechart.hub_config_ptc import HubConfigPtc
+from hub_predtimechart.hub_config_ptc import VIZ_QUANTILE_LEVELS, HubConfigPtc
 
 
 def forecast_data_for_model_df(hub_config: HubConfigPtc, model_df: pd.DataFrame, target: str,
@@ -43,15 +43,77 @@ def forecast_data_for_model_df(hub_config: HubConfigPtc, model_df: pd.DataFrame,
     model_df = model_df.query("output_type == 'quantile'")
 
     # note that we include both strings and numbers b/c we can't depend on the output_type_id being one or the other
-    quantile_levels = (0.025, 0.25, 0.5, 0.75, 0.975, '0.025', '0.25', '0.5', '0.75', '0.975')
+    quantile_levels = VIZ_QUANTILE_LEVELS + tuple(str(quantile_level) for quantile_level in VIZ_QUANTILE_LEVELS)
     model_df = model_df.query(f"output_type_id in {quantile_levels}")
 
-    # groupby target_end_date
-    forecasts = defaultdict(list)
-    for target_end_date, group in model_df.groupby(hub_config.target_date_col_name):
-        quantile_df = group.sort_values(by=['output_type_id'])[['output_type_id', 'value']]
-        forecasts['target_end_date'].append(target_end_date)
-        for output_type_id, value in quantile_df.itertuples(index=False):
-            forecasts[f"q{output_type_id}"].append(value)  # e.g., 'q0.025'
+    # float32 values (see `generate_json_files._model_table_to_df()`) are widened via their shortest decimal repr so
+    # that, e.g., 0.1 is output as 0.1 rather than 0.10000000149011612
+    if model_df['value'].dtype == np.float32:
+        model_df = model_df.assign(value=model_df['value'].to_numpy().astype(str).astype(np.float64))
+
+    # round all values at once rather than one at a time below
+    if hub_config.value_precision:
+        model_df = model_df.assign(value=round_values(model_df['value'].to_numpy(), hub_config.value_precision))
 
+    # build the output column-wise: sort once by (target_end_date, output_type_id), and then take each quantile level's
+    # values as a whole column rather than appending them row by row. dates are converted to ISO strings in one Arrow
+    # cast. this matches grouping by target_end_date and appending each group's sorted quantiles
+    target_date_col_name = hub_config.target_date_col_name
+    model_df = model_df[model_df[target_date_col_name].notna()]
+    if model_df.empty:
+        return {}
+
+    model_df = model_df.sort_values(by=[target_date_col_name, 'output_type_id'], kind='stable')
+    output_type_ids = model_df['output_type_id'].to_numpy()
+    values = model_df['value'].to_numpy()
+    forecasts = {'target_end_date': _iso_date_strings(model_df[target_date_col_name].drop_duplicates())}
+    for output_type_id in sorted(pd.unique(output_type_ids)):
+        forecasts[f"q{output_type_id}"] = values[output_type_ids == output_type_id].tolist()  # e.g., 'q0.025'
     return forecasts
+
+
+def _iso_date_strings(dates: pd.Series) -> list[str]:
+    """
+    `forecast_data_for_model_df()` helper that returns `dates` as a list of ISO date strings, e.g., '2022-10-22'.
+    Handles date objects (as from a pa.date32 column), timestamps, and strings (passed through as-is), converting in
+    Arrow.
+    """
+    dates_array = pa.array(dates, from_pandas=True)
+    if pa.types.is_timestamp(dates_array.type):
+        dates_array = dates_array.cast(pa.date32())
+    if pa.types.is_date(dates_array.type):
+        dates_array = dates_array.cast(pa.string())
+    return dates_array.to_pylist()
+
+
+def round_values(values: np.ndarray, value_precision: dict) -> np.ndarray:
+    """
+    Returns a copy of `values` rounded according to `value_precision` (see `HubConfigPtc.value_precision`), in an object
+    array that holds Python ints for values that are integral after rounding (so they are saved to json as, e.g., `1724`
+    rather than `1724.0`), Python floats for the rest, and None for nulls (NaNs). Rounding is vectorized.
+
+    :param values: an array-like of numbers, possibly containing NaNs
+    :param value_precision: a dict with exactly one key: either 'significant_digits' or 'decimal_places'
+    :return: an object np.ndarray as documented above
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if 'decimal_places' in value_precision:
+        rounded_values = np.round(values, value_precision['decimal_places'])
+    elif 'significant_digits' in value_precision:
+        # scale each value so that the digits to keep are to the left of the decimal point. zeros, NaNs, and infinities
+        # have no magnitude and are left as-is
+        with np.errstate(divide='ignore', invalid='ignore'):
+            magnitudes = np.floor(np.log10(np.abs(values)))
+        magnitudes = np.where(np.isfinite(magnitudes), magnitudes, 0)
+        scales = 10.0 ** (value_precision['significant_digits'] - 1 - magnitudes)
+        rounded_values = np.round(values * scales) / scales
+    else:
+        raise RuntimeError(f"invalid value_precision: {value_precision!r}")
+
+    # convert integral values to ints. we limit this to values that float64 represents exactly
+    is_integral = (np.isfinite(rounded_values) & (rounded_values == np.trunc(rounded_values)) &
+                   (np.abs(rounded_values) < 2 ** 53))
+    out_values = rounded_values.astype(object)
+    out_values[is_integral] = rounded_values[is_integral].astype(np.int64)
+    out_values[np.isnan(rounded_values)] = None
+    return out_values
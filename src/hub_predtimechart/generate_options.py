@@ -1,6 +1,9 @@
+import hashlib
+import json
 from collections import defaultdict
 
 from hub_predtimechart.hub_config_ptc import HubConfigPtc
+from hub_predtimechart.util.write_files import replace_file_name_chars
 
 
 def ptc_options_for_hub(hub_config: HubConfigPtc):
@@ -63,10 +66,7 @@ def ptc_options_for_hub(hub_config: HubConfigPtc):
     options['current_date'] = options['initial_as_of']
 
     # set `models` and `initial_checked_models`
-    options['models'] = []
-    for model_id, metadata in hub_config.model_id_to_metadata.items():
-        if metadata['designated_model'] or model_id in hub_config.initial_checked_models:
-            options['models'].append(model_id)
+    options['models'] = list(hub_config.displayable_model_ids)
     options['models'].sort(key=lambda model_id: (model_id not in hub_config.initial_checked_models,
                                                  model_id))  # put initial_checked_models at top
     options['initial_checked_models'] = hub_config.initial_checked_models
@@ -93,6 +93,51 @@ def ptc_options_for_hub(hub_config: HubConfigPtc):
     return options
 
 
+def ptc_sharded_options(options: dict, shards_dir_name: str) -> tuple[dict, dict[str, object]]:
+    """
+    Splits `options` (as returned by `ptc_options_for_hub()`) into a small "core" options dict plus per-target shards
+    that a dashboard can fetch lazily, which helps hubs with many task id values (e.g., thousands of locations) whose
+    monolithic options are megabytes. Specifically:
+
+    - The core options are `options` minus the per-target `task_ids` and `available_as_ofs` entries, plus a new
+      `target_shards` entry that maps each target to the relative path of its target shard. Everything needed for the
+      first paint (`initial_target_var`, `initial_task_ids`, `initial_as_of`, etc.) stays in the core.
+    - Each target shard has two keys: `available_as_ofs` (the target's list) and `task_ids`, which maps each task id to
+      the relative path of a task id values shard.
+    - Each task id values shard is the `[{'value': ..., 'text': ...}, ...]` list from `options['task_ids']`. These are
+      named by a hash of their content, so identical lists shared by multiple targets are saved only once.
+
+    For example, with `shards_dir_name` = 'predtimechart-options':
+
+    core: {..., "target_shards": {"wk inc flu hosp": "predtimechart-options/targets/wk-inc-flu-hosp.json"}}
+    "predtimechart-options/targets/wk-inc-flu-hosp.json": {
+        "task_ids": {"location": "predtimechart-options/task_ids/location-3f2a9c1b7d6e5f40.json"},
+        "available_as_ofs": ["2022-10-22", "2022-11-19", "2022-12-17"]}
+    "predtimechart-options/task_ids/location-3f2a9c1b7d6e5f40.json": [{"value": "US", "text": "United States"}, ...]
+
+    :param options: a predtimechart options dict as returned by `ptc_options_for_hub()`
+    :param shards_dir_name: the relative directory to name shard paths under
+    :return: a 2-tuple: (core_options, shard_path_to_contents), where shard_path_to_contents maps relative shard paths
+        to their (json-serializable) contents
+    """
+
+    core_options = {key: value for key, value in options.items() if key not in ['task_ids', 'available_as_ofs']}
+    core_options['target_shards'] = {}
+    shard_path_to_contents = {}
+    for target, task_id_to_values in options['task_ids'].items():
+        target_shard = {'task_ids': {}, 'available_as_ofs': options['available_as_ofs'][target]}
+        for task_id, task_values in task_id_to_values.items():
+            digest = hashlib.sha256(json.dumps(task_values, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+            task_values_path = f"{shards_dir_name}/task_ids/{replace_file_name_chars(task_id)}-{digest}.json"
+            shard_path_to_contents[task_values_path] = task_values  # dedups identical lists
+            target_shard['task_ids'][task_id] = task_values_path
+
+        target_shard_path = f"{shards_dir_name}/targets/{replace_file_name_chars(target)}.json"
+        shard_path_to_contents[target_shard_path] = target_shard
+        core_options['target_shards'][target] = target_shard_path
+    return core_options, shard_path_to_contents
+
+
 def _host_owner_name(hub_config):
     """
     `ptc_options_for_hub()` helper that returns a 3-tuple for `hub_config`'s `repository` section, handling the various
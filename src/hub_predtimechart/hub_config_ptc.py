@@ -1,17 +1,34 @@
 import itertools
+import json
+import threading
 from collections import defaultdict
 from dataclasses import dataclass, field
+from datetime import date
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Optional
 
-import pandas as pd
 import polars as pl
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 import yaml
 from hubdata import HubConnection
 from hubdata.connect_target_data import TargetType, connect_target_data
 from jsonschema import FormatChecker, ValidationError, validate
 
 from hub_predtimechart.ptc_schema import ptc_config_schema
+from hub_predtimechart.util.csv_cache import CsvCache
+from hub_predtimechart.util.write_files import json_bytes, write_file_if_changed
+
+
+# the quantile levels (`output_type_id`s) that predtimechart plots. see README.MD > Assumptions/limitations
+VIZ_QUANTILE_LEVELS = (0.025, 0.25, 0.5, 0.75, 0.975)
+
+# block size (bytes) for incrementally reading CSV model output files. smallish so that checks that can stop early
+# (e.g., `_csv_file_has_value()`) parse little of the file
+CSV_BLOCK_SIZE = 1 << 18
 
 
 class HubConfigPtc(HubConnection):
@@ -38,8 +55,30 @@ class HubConfigPtc(HubConnection):
     - target_data_file_name: either None (if the hub implements our new time-series target data standard) which means to
         use the fixed data file location "target-data/time-series.csv"), or the file name to look for in the
         "target-data" dir. use the function HubConfigPtc.get_target_data_file_name() to access the actual file name
+    - value_precision: "", or None if not passed. a dict with exactly one key: either 'significant_digits' or
+        'decimal_places'. see `generate_data.round_values()`
+    - csv_cache: an optional CsvCache that CSV model output files are read through (see `model_output_table()`). None
+        by default (no caching). set by the apps' `--cache-dir` option
+    - viz_cube: an optional `viz_cube.VizCube` whose pre-reduced parts are read instead of model output files when they
+        are current (see `model_output_table()`). None by default. set by the apps' `--viz-cube` option
+
+    - rounds_window: an optional set of reference_dates that limits which reference_dates `get_available_ref_dates()`
+        scans for model output when `availability_record` is set (see `window_reference_dates()`). None by default (no
+        window). set by the apps' `--since` and `--last-n-rounds` options
+    - availability_record: an optional dict that maps each `viz_target_id` to its available reference_dates as of a
+        previous run, which supplies the reference_dates outside `rounds_window`. None by default. see
+        `load_availability_record()`
+
+    The model output dataset returned by `get_dataset()` and the index of model output files used by
+    `model_output_file_for_ref_date()` are built on first use and then reused. Call `refresh_dataset()` after model
+    output files are added or removed.
     - model_id_to_metadata: maps model_ids (team_abbr + model_abbr) to metadata as loaded from files in the hub's
         'model-metadata' dir. functions both as a map to metadata and as an iterable of model_ids (keys)
+    - displayable_model_ids: the model_ids that predtimechart can display, i.e., the options' `models`: designated
+        models plus `initial_checked_models`. in `model_id_to_metadata` order
+    - viz_model_ids: the model_ids whose forecasts are loaded and output, and whose model output files determine the
+        available reference_dates (see `ModelTask.get_available_ref_dates()`). `displayable_model_ids` by default. set
+        to all of `model_id_to_metadata` by the apps' `--all-models` option
     - model_tasks: a list of ModelTask instances, one per predtimechart-compatible *target* (is_step_ahead is true and
         the surrounding model_tasks block has 'quantile' in output_type). The target, not the model_tasks block, is the
         unit of iteration downstream: options, data files, and available_as_ofs are all keyed by `viz_target_id`. A
@@ -78,6 +117,15 @@ class HubConfigPtc(HubConnection):
         self.initial_xaxis_range: str | None = ptc_config.get('initial_xaxis_range')  # ""
         self.task_id_text: dict | None = ptc_config.get('task_id_text')  # ""
         self.target_data_file_name: str | None = ptc_config.get('target_data_file_name')  # ""
+        self.value_precision: dict | None = ptc_config.get('value_precision')  # ""
+        self.csv_cache: CsvCache | None = None
+        self.viz_cube = None  # a VizCube. not annotated b/c viz_cube.py imports this module
+        self.rounds_window: set[str] | None = None
+        self.availability_record: dict[str, list[str]] | None = None
+        self._file_has_value_memo: dict[tuple, bool] = {}  # see `_model_output_file_has_value()`
+        self._dataset_args_to_dataset: dict[tuple, ds.Dataset] = {}  # see `get_dataset()`
+        self._model_id_to_file_names: dict[str, set[str]] | None = None  # see `model_output_file_for_ref_date()`
+        self._dataset_lock = threading.Lock()  # guards the above two. writer and server threads share a HubConfigPtc
 
         # set model_id_to_metadata
         self.model_id_to_metadata: dict[str, dict] = {}
@@ -104,21 +152,198 @@ class HubConfigPtc(HubConnection):
         # it here after I've finished initializing for convenience
         _validate_hub_ptc_compatibility(self)
 
+        # set displayable_model_ids and viz_model_ids. done after validation, which checks for `designated_model`
+        self.displayable_model_ids: list[str] = [model_id for model_id, metadata in self.model_id_to_metadata.items()
+                                                 if metadata['designated_model']
+                                                 or model_id in self.initial_checked_models]
+        self.viz_model_ids: list[str] = self.displayable_model_ids
+
+
+    def get_dataset(self, exclude_invalid_files: bool = False,
+                    ignore_files: Iterable[str] = ('README', '.DS_Store')) -> ds.Dataset:
+        """
+        Overrides `HubConnection.get_dataset()` to build the dataset (file discovery, per-format datasets, and partition
+        info) once per distinct set of args and then reuse it, rather than rebuilding it on every `to_table()` call. See
+        `refresh_dataset()`.
+        """
+        dataset_args = (exclude_invalid_files, tuple(ignore_files))
+        with self._dataset_lock:
+            if dataset_args not in self._dataset_args_to_dataset:
+                self._dataset_args_to_dataset[dataset_args] = super().get_dataset(exclude_invalid_files, ignore_files)
+            return self._dataset_args_to_dataset[dataset_args]
+
+
+    def refresh_dataset(self):
+        """
+        Discards the dataset cached by `get_dataset()` and the model output file index used by
+        `model_output_file_for_ref_date()` so that they are rebuilt on next use. Call after model output files are added
+        or removed. (Changes to existing files' contents do not require a refresh.) Also prunes the
+        `_model_output_file_has_value()` memo of entries for files that were removed or changed, which would otherwise
+        accumulate in a long-running process.
+        """
+        with self._dataset_lock:
+            self._dataset_args_to_dataset.clear()
+            self._model_id_to_file_names = None
+
+        file_to_stat = {}  # maps a memoized file's str path to its current (size, mtime_ns), or None if removed
+        for memo_key in list(self._file_has_value_memo):
+            file = memo_key[0]
+            if file not in file_to_stat:
+                try:
+                    stat = Path(file).stat()
+                    file_to_stat[file] = (stat.st_size, stat.st_mtime_ns)
+                except FileNotFoundError:
+                    file_to_stat[file] = None
+            if file_to_stat[file] != memo_key[1:3]:
+                del self._file_has_value_memo[memo_key]
+
 
     def model_output_file_for_ref_date(self, model_id: str, reference_date: str) -> Optional[Path]:
         """
         Returns a Path to the model output file corresponding to `model_id` and `reference_date`. Returns None if none
-        found.
+        found. Files are looked up in an index of the model output directory that is built on the first call rather than
+        checked with two `exists()` calls per (model, reference_date). See `refresh_dataset()`.
         """
-        poss_output_files = [self.hub_path / 'model-output' / model_id / f"{reference_date}-{model_id}.csv",
-                             self.hub_path / 'model-output' / model_id / f"{reference_date}-{model_id}.parquet"]
-        for poss_output_file in poss_output_files:
-            if poss_output_file.exists():
-                return poss_output_file
+        with self._dataset_lock:
+            if self._model_id_to_file_names is None:
+                model_output_dir = self.hub_path / 'model-output'
+                model_dirs = [path for path in model_output_dir.iterdir() if path.is_dir()] \
+                    if model_output_dir.is_dir() else []
+                self._model_id_to_file_names = {model_dir.name: {file.name for file in model_dir.iterdir()}
+                                                for model_dir in model_dirs}
+            file_names = self._model_id_to_file_names.get(model_id, set())
+
+        for file_name in [f"{reference_date}-{model_id}.csv", f"{reference_date}-{model_id}.parquet"]:
+            if file_name in file_names:
+                return self.hub_path / 'model-output' / model_id / file_name
 
         return None
 
 
+    def window_reference_dates(self, since: str | None = None, last_n_rounds: int | None = None) -> set[str] | None:
+        """
+        Returns the set of reference_dates in a window of recent rounds, e.g., for routine runs that only need to
+        rebuild the newest rounds. For each model_task, the window contains either its `viz_reference_dates` on or after
+        `since`, or the newest `last_n_rounds` of them that have at least one `viz_model_ids` model output file. (The
+        latter is checked by file name only, without reading any files.) Returns None (no window) if neither arg is
+        passed.
+
+        :param since: optional ISO date string of the oldest reference_date to include
+        :param last_n_rounds: optional number of rounds to include
+        :raises RuntimeError: if both args are passed
+        """
+        if (since is not None) and (last_n_rounds is not None):
+            raise RuntimeError("only one of since and last_n_rounds may be passed")
+
+        if (since is None) and (last_n_rounds is None):
+            return None
+
+        window = set()
+        for model_task in self.model_tasks:
+            if since is not None:
+                window.update(reference_date for reference_date in model_task.viz_reference_dates
+                              if date.fromisoformat(reference_date) >= date.fromisoformat(since))
+            else:
+                submitted_ref_dates = [reference_date for reference_date in model_task.viz_reference_dates
+                                       if any(self.model_output_file_for_ref_date(model_id, reference_date)
+                                              for model_id in self.viz_model_ids)]
+                window.update(submitted_ref_dates[-last_n_rounds:])
+        return window
+
+
+    def load_availability_record(self, availability_file: Path) -> bool:
+        """
+        Sets `availability_record` from `availability_file` as saved by `save_availability_record()`. Does nothing if
+        `availability_file` does not exist yet, in which case `get_available_ref_dates()` scans all reference_dates.
+
+        :return: True if `availability_file` was loaded, False o/w
+        """
+        if not availability_file.exists():
+            return False
+
+        with open(availability_file) as fp:
+            self.availability_record = json.load(fp)
+        return True
+
+
+    def save_availability_record(self, availability_file: Path):
+        """
+        Saves each model_task's available reference_dates (see `get_available_ref_dates()`) to `availability_file` as a
+        json object that maps `viz_target_id`s to sorted lists of reference_dates, for a later windowed run to load via
+        `load_availability_record()`. The file is left untouched if its contents are unchanged.
+        """
+        availability_record = {model_task.viz_target_id: sorted(model_task._available_ref_dates())
+                               for model_task in self.model_tasks}
+        write_file_if_changed(availability_file, json_bytes(availability_record, indent=4))
+
+
+    def viz_quantile_levels(self) -> list[float] | list[str]:
+        """
+        :return: `VIZ_QUANTILE_LEVELS` typed to match the `output_type_id` column type from the hub's schema, which can
+            be either numeric or string, e.g., for filtering on `output_type_id`
+        """
+        if pa.types.is_floating(self.schema.field('output_type_id').type):
+            return list(VIZ_QUANTILE_LEVELS)
+        else:
+            return [str(quantile_level) for quantile_level in VIZ_QUANTILE_LEVELS]
+
+
+    def model_output_table(self, model_id: str, model_output_file: Path, columns: list[str], filter: pc.Expression,
+                           filter_columns: list[str] | None = None, is_streaming: bool = False) -> pa.Table:
+        """
+        Returns a pa.Table of `model_id`'s rows in `model_output_file` that match `filter`, limited to `columns`. All
+        paths apply the hub's tasks.json-based schema. If `viz_cube` is set and has a current part for
+        `model_output_file` then the part is read instead (`columns` and `filter` must then only refer to the cube's
+        columns plus 'output_type', 'output_type_id', and 'value'). Otherwise CSV files are read through `csv_cache` if
+        set, or otherwise parsed directly via `read_model_output_csv()`, reading only `columns` and `filter_columns`.
+        All other files are read via `to_table()`.
+
+        :param model_id: the model_id that `model_output_file` belongs to
+        :param model_output_file: a Path as returned by `model_output_file_for_ref_date()`
+        :param columns: the columns to return
+        :param filter: a pc.Expression to filter rows by. must not refer to the 'model_id' partition column
+        :param filter_columns: the columns that `filter` refers to. None (the default) means all columns are read from
+            uncached CSV files
+        :param is_streaming: boolean indicator to filter uncached CSV files block by block as they are parsed rather
+            than parsing them whole first, which bounds memory to the result plus one block. (`to_table()` already
+            filters parquet files one batch at a time, and cached files are memory-mapped)
+        """
+        if self.viz_cube is not None:
+            pa_table = self.viz_cube.model_output_table(model_output_file, columns, filter)
+            if pa_table is not None:
+                return pa_table
+
+        if (self.csv_cache is not None) and (model_output_file.suffix == '.csv'):
+            pa_table = self.csv_cache.get_table(model_output_file, self._read_model_output_csv,
+                                               self._csv_parse_key())
+            return pa_table.filter(filter).select(columns)
+        elif model_output_file.suffix == '.csv':
+            read_columns = None if filter_columns is None else list(dict.fromkeys(columns + filter_columns))
+            if is_streaming:
+                pa_table = read_model_output_csv(model_output_file, self.schema, read_columns, filter=filter)
+                return pa_table.select(columns)
+
+            pa_table = read_model_output_csv(model_output_file, self.schema, read_columns)
+            return pa_table.filter(filter).select(columns)
+
+        return self.to_table(columns=columns, filter=(pc.field('model_id') == model_id) & filter)
+
+
+    def _read_model_output_csv(self, csv_file: Path) -> pa.Table:
+        """
+        Parses all of `csv_file`'s columns via `read_model_output_csv()`. Used as `csv_cache`'s `read_csv_fn`.
+        """
+        return read_model_output_csv(csv_file, self.schema)
+
+
+    def _csv_parse_key(self) -> str:
+        """
+        :return: `csv_cache`'s parse_key for `_read_model_output_csv()`: the column types it parses with, so that cached
+            tables are re-parsed when tasks.json changes them
+        """
+        return str(_csv_convert_options(self.schema).column_types)
+
+
     def get_target_data_df(self) -> pl.DataFrame:
         """
         Loads the target data file from the hub repo. Uses `hubdata.connect_target_data()` for standard target data
@@ -150,6 +375,44 @@ class HubConfigPtc(HubConnection):
             raise FileNotFoundError(f"target data file not found. {target_data_file_path=}, {error=}")
 
 
+#
+# CSV model output reading
+#
+
+def read_model_output_csv(csv_file: Path, schema: pa.Schema, columns: list[str] | None = None,
+                          use_threads: bool = True, filter: pc.Expression | None = None) -> pa.Table:
+    """
+    Parses the CSV model output file `csv_file` into a pa.Table using Arrow's multi-threaded CSV reader. Column types
+    come from `schema` (the hub's tasks.json-based `HubConnection.schema`) rather than being inferred, so that task ids
+    like location "01" stay strings and `value` is always a float.
+
+    :param csv_file: Path of the CSV file to read
+    :param schema: the hub's pa.Schema
+    :param columns: optional list of columns to read. None (the default) reads all of them. other columns are skipped
+        without being converted
+    :param use_threads: boolean indicator to parse blocks in parallel
+    :param filter: optional pc.Expression to keep only matching rows. if passed then the file is streamed, i.e., each
+        block is filtered as soon as it is parsed, so that at most one unfiltered block is held in memory
+    """
+    read_options = pacsv.ReadOptions(use_threads=use_threads)
+    convert_options = _csv_convert_options(schema, columns)
+    if filter is None:
+        return pacsv.read_csv(csv_file, read_options=read_options, convert_options=convert_options)
+
+    with pacsv.open_csv(csv_file, read_options=read_options, convert_options=convert_options) as reader:
+        pa_tables = [pa.Table.from_batches([record_batch]).filter(filter) for record_batch in reader]
+        return pa.concat_tables(pa_tables) if pa_tables else reader.schema.empty_table()
+
+
+def _csv_convert_options(schema: pa.Schema, columns: list[str] | None = None) -> pacsv.ConvertOptions:
+    """
+    Returns pacsv.ConvertOptions that type columns using `schema` (excluding the 'model_id' partition column, which is
+    not in the files) and that optionally read only `columns`.
+    """
+    column_types = {field.name: field.type for field in schema if field.name != 'model_id'}
+    return pacsv.ConvertOptions(column_types=column_types, include_columns=columns)
+
+
 def _valid_targets(the_round: dict):
     """
     Yields `(model_task, target_metadata_idx)` pairs for every target in `the_round` that is compatible with
@@ -228,7 +491,7 @@ def _validate_hub_ptc_compatibility(hub_config_ptc: HubConfigPtc):
     for model_task in hub_config_ptc.model_tasks:
         # validate: required quantile levels are present
         quantile_levels = model_task.task['output_type']['quantile']['output_type_id']['required']
-        req_quantile_levels = {0.025, 0.25, 0.5, 0.75, 0.975}
+        req_quantile_levels = set(VIZ_QUANTILE_LEVELS)
         if not req_quantile_levels <= set(quantile_levels):  # subset
             raise ValidationError(f"some quantile output_type_ids are missing. required={req_quantile_levels}, "
                                   f"found={set(quantile_levels)}")
@@ -330,22 +593,130 @@ class ModelTask:
                 return sorted(list(reference_dates))
 
 
+        return get_sorted_values_or_first_config_ref_date(self._available_ref_dates())
+
+
+    def _available_ref_dates(self) -> set[str]:
+        """
+        `get_available_ref_dates()` helper that returns the set of viz_reference_dates with at least one forecast file
+        from a `viz_model_ids` model.
+        If the HubConfigPtc has both a `rounds_window` and an `availability_record` then only the window's
+        reference_dates are scanned, and the others are taken from the record.
+        """
+        hub_config_ptc = self.hub_config_ptc
+        is_windowed = (hub_config_ptc.rounds_window is not None) and (hub_config_ptc.availability_record is not None)
+        if is_windowed:
+            scan_ref_dates = [reference_date for reference_date in self.viz_reference_dates
+                              if reference_date in hub_config_ptc.rounds_window]
+            reference_dates = {reference_date
+                               for reference_date in hub_config_ptc.availability_record.get(self.viz_target_id, [])
+                               if (reference_date in self.viz_reference_dates)
+                               and (reference_date not in hub_config_ptc.rounds_window)}
+        else:
+            scan_ref_dates = self.viz_reference_dates
+            reference_dates = set()
+
         # loop over every (reference_date X model_id) combination
-        reference_dates = set()
-        for reference_date in self.viz_reference_dates:  # ex: ['2022-10-22', '2022-10-29', ...]
-            for model_id in self.hub_config_ptc.model_id_to_metadata:  # ex: 'Flusight-baseline'
-                model_output_file = self.hub_config_ptc.model_output_file_for_ref_date(model_id, reference_date)
-                if model_output_file:
-                    if model_output_file.suffix == '.csv':
-                        df = pd.read_csv(model_output_file, usecols=[self.viz_target_col_name])
-                    elif model_output_file.suffix in ['.parquet', '.pqt']:
-                        df = pd.read_parquet(model_output_file, columns=[self.viz_target_col_name])
-                    else:
-                        raise RuntimeError(f"unsupported model output file type: {model_output_file!r}. "
-                                           f"Only .csv and .parquet are supported")
-
-                    df = df.loc[df[self.viz_target_col_name] == self.viz_target_id, :]
-                    if not df.empty:
-                        reference_dates.add(reference_date)
-
-        return get_sorted_values_or_first_config_ref_date(reference_dates)
+        for reference_date in scan_ref_dates:  # ex: ['2022-10-22', '2022-10-29', ...]
+            for model_id in hub_config_ptc.viz_model_ids:  # ex: 'Flusight-baseline'
+                model_output_file = hub_config_ptc.model_output_file_for_ref_date(model_id, reference_date)
+                if model_output_file and _model_output_file_has_value(hub_config_ptc, model_output_file,
+                                                                      self.viz_target_col_name, self.viz_target_id):
+                    reference_dates.add(reference_date)
+                    break  # no need to check the remaining models
+
+        return reference_dates
+
+
+def _model_output_file_has_value(hub_config_ptc: HubConfigPtc, model_output_file: Path, col_name: str,
+                                 value: str) -> bool:
+    """
+    `ModelTask.get_available_ref_dates()` helper that returns True if `model_output_file` has at least one row whose
+    `col_name` column equals `value`. CSV files are checked via `hub_config_ptc.csv_cache` if set. Results are memoized
+    in `hub_config_ptc` keyed by the file's size and mtime, so repeated availability checks (e.g., by both the forecast
+    and options generation, or by a long-running watcher) only re-check new or changed files.
+
+    :param hub_config_ptc: the HubConfigPtc whose schema is used to type CSV columns
+    :raises RuntimeError: if `model_output_file` is not a .csv or .parquet file
+    """
+    stat = model_output_file.stat()
+    memo_key = (str(model_output_file), stat.st_size, stat.st_mtime_ns, col_name, value)
+    if memo_key not in hub_config_ptc._file_has_value_memo:
+        hub_config_ptc._file_has_value_memo[memo_key] = _model_output_file_has_value_uncached(
+            hub_config_ptc, model_output_file, col_name, value)
+    return hub_config_ptc._file_has_value_memo[memo_key]
+
+
+def _model_output_file_has_value_uncached(hub_config_ptc: HubConfigPtc, model_output_file: Path, col_name: str,
+                                          value: str) -> bool:
+    if hub_config_ptc.viz_cube is not None:
+        has_value = hub_config_ptc.viz_cube.file_has_value(model_output_file, col_name, value)
+        if has_value is not None:
+            return has_value
+
+    if (model_output_file.suffix == '.csv') and (hub_config_ptc.csv_cache is not None):
+        pa_table = hub_config_ptc.csv_cache.get_table(model_output_file, hub_config_ptc._read_model_output_csv,
+                                                      hub_config_ptc._csv_parse_key())
+        return bool(pc.any(pc.equal(pa_table[col_name], value)).as_py())
+    elif model_output_file.suffix == '.csv':
+        return _csv_file_has_value(model_output_file, col_name, value, hub_config_ptc.schema)
+    elif model_output_file.suffix in ['.parquet', '.pqt']:
+        return _parquet_file_has_value(model_output_file, col_name, value)
+    else:
+        raise RuntimeError(f"unsupported model output file type: {model_output_file!r}. "
+                           f"Only .csv and .parquet are supported")
+
+
+def _csv_file_has_value(csv_file: Path, col_name: str, value: str, schema: pa.Schema) -> bool:
+    """
+    `_model_output_file_has_value()` helper for CSV files that reads only `col_name`, one `CSV_BLOCK_SIZE` block at a
+    time, stopping as soon as `value` is seen. Since the target usually appears in the first rows, this typically
+    parses a small fraction of the file. Like `read_model_output_csv()`, column types come from the hub's
+    tasks.json-based `schema`, so no type inference is done.
+    """
+    read_options = pacsv.ReadOptions(block_size=CSV_BLOCK_SIZE)
+    convert_options = _csv_convert_options(schema, [col_name])
+    with pacsv.open_csv(csv_file, read_options=read_options, convert_options=convert_options) as reader:
+        for record_batch in reader:
+            if pc.any(pc.equal(record_batch.column(0), value)).as_py():
+                return True
+
+    return False
+
+
+def _parquet_file_has_value(parquet_file_path: Path, col_name: str, value: str) -> bool:
+    """
+    `_model_output_file_has_value()` helper for parquet files that answers from the file footer's row group statistics
+    where possible, without decoding any data: a row group whose min and max both equal `value` has it, and one whose
+    [min, max] range excludes `value` does not. Only row groups whose statistics are missing or inconclusive are read,
+    and only `col_name` is read from them.
+    """
+    parquet_file = pq.ParquetFile(parquet_file_path)
+    metadata = parquet_file.metadata
+    col_paths = [metadata.schema.column(col_idx).path for col_idx in range(metadata.num_columns)]
+    if col_name not in col_paths:
+        return False
+
+    col_idx = col_paths.index(col_name)
+    inconclusive_row_group_idxs = []
+    for row_group_idx in range(metadata.num_row_groups):
+        row_group = metadata.row_group(row_group_idx)
+        if row_group.num_rows == 0:
+            continue
+
+        stats = row_group.column(col_idx).statistics
+        if (stats is None) or (not stats.has_min_max) or (not isinstance(stats.min, type(value))):
+            inconclusive_row_group_idxs.append(row_group_idx)
+        elif stats.min == stats.max == value:
+            return True
+        elif not (stats.min <= value <= stats.max):
+            continue  # excluded
+        else:
+            inconclusive_row_group_idxs.append(row_group_idx)
+
+    for row_group_idx in inconclusive_row_group_idxs:
+        pa_table = parquet_file.read_row_group(row_group_idx, columns=[col_name])
+        if pc.any(pc.equal(pa_table[col_name], value)).as_py():
+            return True
+
+    return False
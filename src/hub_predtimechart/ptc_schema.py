@@ -62,6 +62,25 @@ ptc_config_schema = {
             "type": "string",
             "minLength": 1
         },
+        "value_precision": {
+            "description": "optional rounding to apply to forecast and target data values before they are saved, which reduces json file sizes. specify exactly one of `significant_digits` or `decimal_places`. values that are integral after rounding are saved as integers",
+            "type": "object",
+            "additionalProperties": False,
+            "minProperties": 1,
+            "maxProperties": 1,
+            "properties": {
+                "significant_digits": {
+                    "description": "number of significant digits to round values to",
+                    "type": "integer",
+                    "minimum": 1
+                },
+                "decimal_places": {
+                    "description": "number of decimal places to round values to",
+                    "type": "integer",
+                    "minimum": 0
+                }
+            }
+        },
     },
     "required": [
         "rounds_idx",
@@ -0,0 +1,40 @@
+import re
+
+import click
+
+
+_UNIT_TO_MULTIPLIER = {'': 1, 'B': 1,
+                       'K': 1024, 'KB': 1024, 'KIB': 1024,
+                       'M': 1024 ** 2, 'MB': 1024 ** 2, 'MIB': 1024 ** 2,
+                       'G': 1024 ** 3, 'GB': 1024 ** 3, 'GIB': 1024 ** 3,
+                       'T': 1024 ** 4, 'TB': 1024 ** 4, 'TIB': 1024 ** 4}
+
+
+def parse_byte_size(size_str: str) -> int:
+    """
+    Parses a human-readable byte size like "512MB", "2G", "1.5GiB", or "1048576" into a number of bytes. Units are
+    case-insensitive and binary (1K = 1024 bytes).
+
+    :param size_str: the size to parse
+    :return: the number of bytes
+    :raises ValueError: if `size_str` is not a valid size
+    """
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([a-zA-Z]*)\s*', size_str)
+    if not match or (match.group(2).upper() not in _UNIT_TO_MULTIPLIER):
+        raise ValueError(f"invalid byte size: {size_str!r}. expected a number optionally followed by a unit such as "
+                         f"'KB', 'MB', or 'GB'")
+
+    return int(float(match.group(1)) * _UNIT_TO_MULTIPLIER[match.group(2).upper()])
+
+
+def click_byte_size(ctx, param, value) -> int | None:
+    """
+    A click option callback that parses `value` via `parse_byte_size()`, passing None through.
+    """
+    if value is None:
+        return None
+
+    try:
+        return parse_byte_size(value)
+    except ValueError as error:
+        raise click.BadParameter(str(error))
@@ -0,0 +1,98 @@
+import hashlib
+import os
+import uuid
+from pathlib import Path
+from typing import Callable
+
+import pyarrow as pa
+import structlog
+
+
+logger = structlog.get_logger()
+
+
+class CsvCache:
+    """
+    A local directory cache of parsed CSV model output files. Each CSV file is parsed once and saved as an uncompressed
+    Arrow IPC (Feather v2) file whose name is keyed by the CSV file's path, size, and mtime plus a caller-supplied
+    `parse_key` that identifies how it was parsed (e.g., the column types), so a changed submission or a changed schema
+    gets a new entry. Later reads memory-map the cached file instead of re-parsing the CSV, which makes cache hits
+    zero-copy. When `max_bytes` is set, least recently used entries are evicted after each new entry is saved.
+
+    Instance variables:
+    - cache_dir: Path of the cache directory. created if necessary
+    - max_bytes: maximum total size of cached files in bytes, or None for no limit
+    """
+
+
+    def __init__(self, cache_dir: Path, max_bytes: int | None = None):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+
+    def get_table(self, csv_file: Path, read_csv_fn: Callable[[Path], pa.Table], parse_key: str = '') -> pa.Table:
+        """
+        Returns the pa.Table for `csv_file`, either memory-mapped from the cache or, on a cache miss, parsed via
+        `read_csv_fn(csv_file)` and then saved to the cache.
+
+        :param csv_file: Path of the CSV file to read
+        :param read_csv_fn: a function that parses `csv_file` into a (typed) pa.Table
+        :param parse_key: a string that identifies how `read_csv_fn` parses, e.g., a string form of the schema it types
+            columns with. entries parsed with a different `parse_key` are not reused
+        """
+        cache_file = self.cache_dir / f"{self._cache_key(csv_file, parse_key)}.arrow"
+        if cache_file.exists():
+            os.utime(cache_file)  # mark as recently used for eviction
+            return _read_ipc_file(cache_file)
+
+        # save atomically (temp file + rename) so that concurrent readers never see a partial file
+        pa_table = read_csv_fn(csv_file)
+        tmp_file = cache_file.with_name(f".{cache_file.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            with pa.OSFile(str(tmp_file), 'wb') as sink, pa.ipc.new_file(sink, pa_table.schema) as writer:
+                writer.write_table(pa_table)
+            os.replace(tmp_file, cache_file)
+        except BaseException:
+            tmp_file.unlink(missing_ok=True)
+            raise
+
+        self._evict()
+        return _read_ipc_file(cache_file) if cache_file.exists() else pa_table  # might have been evicted
+
+
+    @staticmethod
+    def _cache_key(csv_file: Path, parse_key: str = '') -> str:
+        csv_file = Path(csv_file).resolve()
+        stat = csv_file.stat()
+        return hashlib.sha256(f"{csv_file}|{stat.st_size}|{stat.st_mtime_ns}|{parse_key}".encode('utf-8')).hexdigest()
+
+
+    def _evict(self):
+        """
+        Deletes least recently used cache files until their total size is at most `max_bytes`.
+        """
+        if self.max_bytes is None:
+            return
+
+        cache_files = []  # (mtime_ns, size, Path)
+        for cache_file in self.cache_dir.glob('*.arrow'):
+            try:
+                stat = cache_file.stat()
+            except FileNotFoundError:  # evicted by another process
+                continue
+            cache_files.append((stat.st_mtime_ns, stat.st_size, cache_file))
+
+        total_bytes = sum(size for _, size, _ in cache_files)
+        for _, size, cache_file in sorted(cache_files):
+            if total_bytes <= self.max_bytes:
+                break
+
+            cache_file.unlink(missing_ok=True)  # NB: safe even if memory-mapped elsewhere
+            total_bytes -= size
+            logger.info(f"evicted cache file: {cache_file.name}, {size=}")
+
+
+def _read_ipc_file(ipc_file: Path) -> pa.Table:
+    # NB: the returned table's buffers keep the memory map alive, so we don't close it here
+    return pa.ipc.open_file(pa.memory_map(str(ipc_file))).read_all()
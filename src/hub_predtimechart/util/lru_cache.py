@@ -0,0 +1,104 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+
+class LruCache:
+    """
+    A thread-safe, size-bounded least-recently-used cache. Each value's size is given by `size_fn` (defaults to 1 per
+    value, i.e., a bound on the number of values). When a `put()` takes the total size over `max_size`, the least
+    recently used values are evicted until it fits again. A single value larger than `max_size` is not cached at all.
+
+    Instance variables:
+    - max_size: the maximum total size of the cached values
+    - total_size: the current total size of the cached values
+    """
+
+
+    def __init__(self, max_size: int, size_fn: Callable[[Any], int] | None = None):
+        """
+        :param max_size: the maximum total size of the cached values, in `size_fn` units
+        :param size_fn: optional function that returns a value's size. defaults to 1 per value
+        """
+        self.max_size = max_size
+        self.size_fn = size_fn if size_fn is not None else (lambda value: 1)
+        self.total_size = 0
+        self._key_to_value_size: OrderedDict[Hashable, tuple[Any, int]] = OrderedDict()  # least recently used first
+        self._lock = threading.Lock()
+        self._key_to_compute_lock: dict[Hashable, list] = {}  # [Lock, num_callers]. see `get_or_compute()`
+
+
+    def __len__(self):
+        with self._lock:
+            return len(self._key_to_value_size)
+
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._key_to_value_size
+
+
+    def get(self, key: Hashable, default=None):
+        """
+        :return: `key`'s value, marking it as the most recently used, or `default` if not cached
+        """
+        with self._lock:
+            if key not in self._key_to_value_size:
+                return default
+
+            self._key_to_value_size.move_to_end(key)
+            return self._key_to_value_size[key][0]
+
+
+    def put(self, key: Hashable, value):
+        """
+        Caches `value` under `key` as the most recently used value, evicting others as needed.
+        """
+        size = self.size_fn(value)
+        with self._lock:
+            if key in self._key_to_value_size:
+                self.total_size -= self._key_to_value_size.pop(key)[1]
+            if size > self.max_size:
+                return
+
+            self._key_to_value_size[key] = (value, size)
+            self.total_size += size
+            while self.total_size > self.max_size:
+                _, (_, evicted_size) = self._key_to_value_size.popitem(last=False)
+                self.total_size -= evicted_size
+
+
+    def clear(self):
+        """
+        Evicts all values.
+        """
+        with self._lock:
+            self._key_to_value_size.clear()
+            self.total_size = 0
+
+
+    def get_or_compute(self, key: Hashable, compute_fn: Callable[[], Any]):
+        """
+        Returns `key`'s cached value, or, if not cached, calls `compute_fn()`, caches its result, and returns it.
+        Concurrent calls for the same uncached `key` compute it only once: the others wait for the first one's result.
+        Calls for different keys do not block each other.
+
+        :param key: the cache key
+        :param compute_fn: a no-argument function that returns `key`'s value
+        """
+        with self._lock:
+            compute_lock_and_count = self._key_to_compute_lock.setdefault(key, [threading.Lock(), 0])
+            compute_lock_and_count[1] += 1  # the number of callers using the lock
+        try:
+            with compute_lock_and_count[0]:
+                sentinel = object()
+                value = self.get(key, sentinel)
+                if value is sentinel:
+                    value = compute_fn()
+                    self.put(key, value)
+                return value
+        finally:
+            with self._lock:
+                compute_lock_and_count[1] -= 1
+                if compute_lock_and_count[1] == 0:
+                    del self._key_to_compute_lock[key]
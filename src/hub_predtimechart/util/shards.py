@@ -0,0 +1,49 @@
+import re
+import zlib
+
+import click
+
+
+def parse_shard(shard_str: str) -> tuple[int, int]:
+    """
+    Parses a shard spec like "0/4" (the first of four shards) into an (index, count) tuple.
+
+    :param shard_str: the shard spec to parse: "i/N" where 0 <= i < N
+    :return: a 2-tuple: (i, N)
+    :raises ValueError: if `shard_str` is not a valid shard spec
+    """
+    match = re.fullmatch(r'\s*(\d+)\s*/\s*(\d+)\s*', shard_str)
+    if (not match) or not (0 <= int(match.group(1)) < int(match.group(2))):
+        raise ValueError(f"invalid shard: {shard_str!r}. expected 'i/N' where 0 <= i < N, e.g., '0/4'")
+
+    return int(match.group(1)), int(match.group(2))
+
+
+def click_shard(ctx, param, value) -> tuple[int, int] | None:
+    """
+    A click option callback that parses `value` via `parse_shard()`, passing None through.
+    """
+    if value is None:
+        return None
+
+    try:
+        return parse_shard(value)
+    except ValueError as error:
+        raise click.BadParameter(str(error))
+
+
+def is_shard_owner(unit_name: str, shard: tuple[int, int] | None) -> bool:
+    """
+    Returns True if `shard` owns the work unit named `unit_name`, i.e., if the unit's crc32 hash modulo the shard count
+    equals the shard index. Ownership is deterministic across machines and Python processes (unlike `hash()`), so every
+    unit is owned by exactly one of a run's N shards. Work units are named by their output file name, e.g.,
+    `json_file_name()`.
+
+    :param unit_name: the work unit's name
+    :param shard: an (index, count) tuple as returned by `parse_shard()`, or None, which owns every unit
+    """
+    if shard is None:
+        return True
+
+    shard_idx, shard_count = shard
+    return zlib.crc32(unit_name.encode('utf-8')) % shard_count == shard_idx
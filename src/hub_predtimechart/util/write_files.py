@@ -0,0 +1,358 @@
+import gzip
+import hashlib
+import json
+import os
+import queue
+import re
+import threading
+import uuid
+from pathlib import Path
+
+import structlog
+
+
+logger = structlog.get_logger()
+
+
+class Changeset:
+    """
+    Records the files that a run added, modified, left unchanged, or deleted, so that downstream sync steps (e.g., an S3
+    upload) can push exactly the delta without diffing the whole output tree. Instances are passed to
+    `write_file_if_changed()` and `remove_file()`, which do the recording. Recording is thread-safe.
+
+    Instance variables:
+    - status_to_files: dict that maps each of `Changeset.STATUSES` to a dict that maps file paths (str) to a dict with
+        two keys: 'sha256' (hex digest of the file's content) and 'size' (in bytes). for 'deleted' files these describe
+        the content that was removed. a file is under at most one status: the last one recorded
+    - shard: an (index, count) tuple if I am the partial manifest of a `--shard` run, or None otherwise. saved under the
+        'shard' key
+    """
+    STATUSES = ('added', 'modified', 'unchanged', 'deleted')
+
+
+    def __init__(self, shard: tuple[int, int] | None = None):
+        self.status_to_files: dict[str, dict[str, dict]] = {status: {} for status in Changeset.STATUSES}
+        self.shard = shard
+        self._lock = threading.Lock()
+
+
+    @classmethod
+    def load(cls, changeset_file: Path) -> 'Changeset':
+        """
+        Returns a Changeset loaded from `changeset_file` as saved by `save()`.
+        """
+        with open(changeset_file) as fp:
+            changeset_dict = json.load(fp)
+        changeset = cls(tuple(changeset_dict['shard']) if 'shard' in changeset_dict else None)
+        for status in Changeset.STATUSES:
+            changeset.status_to_files[status].update(changeset_dict.get(status, {}))
+        return changeset
+
+
+    def record(self, file: Path, status: str, content: bytes):
+        """
+        Records that `file` has `status` (one of `Changeset.STATUSES`) with `content`, replacing any status that `file`
+        was previously recorded with.
+        """
+        if status not in Changeset.STATUSES:
+            raise ValueError(f"invalid status: {status!r}. must be one of {Changeset.STATUSES}")
+
+        file_info = {'sha256': hashlib.sha256(content).hexdigest(), 'size': len(content)}
+        with self._lock:
+            self._set_status(str(file), status, file_info)
+
+
+    def update(self, other: 'Changeset'):
+        """
+        Adds `other`'s files to mine, e.g., to combine shards' partial manifests. `other`'s entries win for files that
+        we both have, replacing my status for them as `record()` does.
+        """
+        with self._lock:
+            for status in Changeset.STATUSES:
+                for file, file_info in other.status_to_files[status].items():
+                    self._set_status(file, status, file_info)
+
+
+    def _set_status(self, file: str, status: str, file_info: dict):
+        """
+        `record()` and `update()` helper that puts `file` under `status` only. the caller must hold `_lock`
+        """
+        for files in self.status_to_files.values():
+            files.pop(file, None)
+        self.status_to_files[status][file] = file_info
+
+
+    def save(self, changeset_file: Path):
+        """
+        Saves my `status_to_files` (and my `shard`, if set) to `changeset_file` as json, sorting the file paths within
+        each status.
+        """
+        with self._lock:
+            changeset = {status: dict(sorted(files.items())) for status, files in self.status_to_files.items()}
+        if self.shard is not None:
+            changeset['shard'] = list(self.shard)
+        write_file_if_changed(changeset_file, json_bytes(changeset, indent=4))
+
+
+class OutputWriter:
+    """
+    Writes a run's output files via `write_file_if_changed()` and deletes them via `remove_file()`, recording changes in
+    an optional Changeset. Can also save precompressed sidecar files next to each written file (e.g., "foo.json.gz" for
+    "foo.json") so that static hosts can serve them without compressing on the fly. Sidecars respect the
+    write-if-changed behavior: they are only (re)compressed when their file changed or when they are missing.
+
+    When `num_threads` > 0, `write_json()` becomes the producer side of a pipeline: it puts (file, data) items onto a
+    bounded queue and returns right away, and a pool of writer threads serializes and saves them, so the caller's
+    CPU-bound extraction overlaps with file I/O. The queue blocks producers when full, which keeps memory flat. Threaded
+    writers must be closed via `close()` (or used as a context manager), which waits for queued items and re-raises the
+    first error that a writer thread hit.
+
+    Instance variables:
+    - changeset: a Changeset to record written and removed files (including sidecars) in, or None to not record
+    - compress_formats: a tuple of sidecar formats to save, each one of `OutputWriter.COMPRESS_FORMATS`. 'br' requires
+        the optional `brotli` package
+    - num_threads: number of writer threads. 0 (the default) writes synchronously on the caller's thread
+    """
+    COMPRESS_FORMATS = ('gz', 'br')
+
+
+    def __init__(self, changeset: Changeset | None = None, compress_formats: tuple[str, ...] = (),
+                 num_threads: int = 0, queue_size: int | None = None):
+        """
+        :param changeset: see class docs
+        :param compress_formats: ""
+        :param num_threads: ""
+        :param queue_size: maximum number of queued items when `num_threads` > 0. defaults to twice `num_threads`
+        """
+        for compress_format in compress_formats:
+            if compress_format not in OutputWriter.COMPRESS_FORMATS:
+                raise ValueError(f"invalid compress_format: {compress_format!r}. must be one of "
+                                 f"{OutputWriter.COMPRESS_FORMATS}")
+
+        if 'br' in compress_formats:
+            _brotli_module()  # fail fast if not installed
+
+        self.changeset = changeset
+        self.compress_formats = tuple(compress_formats)
+        self.num_threads = num_threads
+        self._queue = queue.Queue(maxsize=queue_size or 2 * num_threads) if num_threads > 0 else None
+        self._error: Exception | None = None  # the first error that a writer thread hit
+        self._is_closed = False  # set by `close()`
+        self._threads = [threading.Thread(target=self._write_queued_items, name=f"OutputWriter-{idx}", daemon=True)
+                         for idx in range(num_threads)]
+        for thread in self._threads:
+            thread.start()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:  # stop the threads without masking the caller's exception, but don't lose a writer thread's error
+            try:
+                self.close()
+            except RuntimeError as error:
+                logger.error(f"__exit__(): a writer thread also failed. {error=}, {error.__cause__=}")
+
+
+    def close(self):
+        """
+        Waits for all queued items to be written and stops my writer threads. A no-op for synchronous writers. Safe to
+        call more than once.
+
+        :raises RuntimeError: if a writer thread failed, chained from its error
+        """
+        for _ in self._threads:
+            self._queue.put(None)  # sentinel
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self._is_closed = True
+        self._raise_if_error()
+
+
+    def write_json(self, file: Path, data, is_compress: bool = True, **kwargs):
+        """
+        Saves `data` to `file` as json via `write()`, either right away or, if I have writer threads, by queueing it
+        (blocking while the queue is full). Serialization happens on the writer thread in the latter case.
+
+        :param file: Path of the file to save
+        :param data: the data to serialize via `json_bytes()`. must not be mutated after the call
+        :param is_compress: passed to `write()`
+        :param kwargs: passed to `json_bytes()`, e.g., `indent`
+        :raises RuntimeError: if a writer thread has already failed, so that producers stop early, or if I have writer
+            threads and have been closed, since nothing would write the item
+        """
+        if self._queue is None:
+            self.write(file, json_bytes(data, **kwargs), is_compress)
+            return
+
+        if self._is_closed:
+            raise RuntimeError(f"write_json() called on a closed OutputWriter. {file=}")
+
+        self._raise_if_error()
+        self._queue.put((file, data, is_compress, kwargs))
+
+
+    def write(self, file: Path, content: bytes, is_compress: bool = True) -> bool:
+        """
+        Saves `content` to `file` via `write_file_if_changed()` along with any sidecars.
+
+        :param file: Path of the file to save
+        :param content: the bytes to save
+        :param is_compress: boolean indicator to save sidecars for `file`. pass False for files that are not served
+            as-is, e.g., bundles that are served via HTTP Range requests
+        :return: True if `file` was written, or False if it was unchanged
+        """
+        is_written = write_file_if_changed(file, content, self.changeset)
+        if is_compress:
+            for compress_format in self.compress_formats:
+                sidecar_file = _sidecar_file(file, compress_format)
+                if is_written or not sidecar_file.exists():
+                    write_file_if_changed(sidecar_file, _compress(content, compress_format), self.changeset)
+                elif self.changeset is not None:
+                    self.changeset.record(sidecar_file, 'unchanged', sidecar_file.read_bytes())
+        return is_written
+
+
+    def remove(self, file: Path) -> bool:
+        """
+        Deletes `file` and any sidecars for it via `remove_file()`.
+
+        :param file: Path of the file to delete
+        :return: True if `file` was deleted, or False if it did not exist
+        """
+        for compress_format in OutputWriter.COMPRESS_FORMATS:  # all formats in case a previous run used other ones
+            remove_file(_sidecar_file(file, compress_format), self.changeset)
+        return remove_file(file, self.changeset)
+
+
+    def _write_queued_items(self):
+        """
+        Writer thread target that writes queued items until it gets a None sentinel. After an error, items are drained
+        without being written so that producers blocked on a full queue are released.
+        """
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+
+            if self._error is not None:
+                continue
+
+            file, data, is_compress, kwargs = item
+            try:
+                self.write(file, json_bytes(data, **kwargs), is_compress)
+            except Exception as error:
+                self._error = self._error or error
+
+
+    def _raise_if_error(self):
+        if self._error is not None:
+            raise RuntimeError(f"an OutputWriter thread failed: {self._error!r}") from self._error
+
+
+def _sidecar_file(file: Path, compress_format: str) -> Path:
+    file = Path(file)
+    return file.with_name(f"{file.name}.{compress_format}")
+
+
+def _compress(content: bytes, compress_format: str) -> bytes:
+    """
+    OutputWriter helper that returns `content` compressed using `compress_format`. Output is deterministic (e.g., gzip's
+    header mtime is zeroed) so that unchanged content compresses to unchanged bytes.
+    """
+    if compress_format == 'gz':
+        return gzip.compress(content, compresslevel=9, mtime=0)
+    elif compress_format == 'br':
+        return _brotli_module().compress(content)
+    else:
+        raise ValueError(f"invalid compress_format: {compress_format!r}")
+
+
+def _brotli_module():
+    try:
+        import brotli
+    except ImportError:
+        raise RuntimeError("'br' compression requires the optional 'brotli' package. install it via "
+                           "`pip install hub-dashboard-predtimechart[brotli]`")
+    return brotli
+
+
+def write_file_if_changed(file: Path, content: bytes, changeset: Changeset | None = None) -> bool:
+    """
+    Saves `content` to `file` unless `file` already exists with identical bytes, in which case it is left untouched so
+    that its mtime is preserved (and downstream caches are not invalidated). Writes are atomic: `content` is first
+    written to a temporary file in the same directory, which is then renamed to `file`, so readers never see a partially
+    written file.
+
+    :param file: Path of the file to save
+    :param content: the bytes to save
+    :param changeset: optional Changeset to record the outcome ('added', 'modified', or 'unchanged') in
+    :return: True if `file` was written, or False if it was unchanged
+    """
+    file = Path(file)
+    status = 'added'
+    try:
+        if (file.stat().st_size == len(content)) and (file.read_bytes() == content):
+            if changeset is not None:
+                changeset.record(file, 'unchanged', content)
+            return False
+        status = 'modified'
+    except FileNotFoundError:
+        pass
+
+    # NB: we use open() rather than `tempfile.mkstemp()` so that the file gets the same (umask-based) permissions that
+    # a plain open() of `file` would have
+    tmp_file = file.with_name(f".{file.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        with open(tmp_file, 'xb') as fp:
+            fp.write(content)
+        os.replace(tmp_file, file)
+    except BaseException:
+        tmp_file.unlink(missing_ok=True)
+        raise
+
+    if changeset is not None:
+        changeset.record(file, status, content)
+    return True
+
+
+def remove_file(file: Path, changeset: Changeset | None = None) -> bool:
+    """
+    Deletes `file` if it exists, e.g., a previously generated file whose data has since gone away.
+
+    :param file: Path of the file to delete
+    :param changeset: optional Changeset to record the deletion in
+    :return: True if `file` was deleted, or False if it did not exist
+    """
+    file = Path(file)
+    try:
+        content = file.read_bytes()
+        file.unlink()
+    except FileNotFoundError:
+        return False
+
+    if changeset is not None:
+        changeset.record(file, 'deleted', content)
+    return True
+
+
+def json_bytes(data, **kwargs) -> bytes:
+    """
+    Returns `data` serialized to utf-8 encoded json bytes. `kwargs` are passed through to `json.dumps()`, e.g., `indent`
+    and `default`. The bytes are identical to what `json.dump()` would have saved to a file opened in text mode.
+    """
+    return json.dumps(data, **kwargs).encode('utf-8')
+
+
+def replace_file_name_chars(the_string: str) -> str:
+    """
+    Returns `the_string` made safe for use in an output file name by replacing all non-alphanumeric characters, except
+    dashes and underscores, with a dash. All output file names (forecast, bundle, and options shard files) use this
+    scheme.
+    """
+    return re.sub(r'[^a-zA-Z0-9-_]', '-', the_string)
@@ -0,0 +1,230 @@
+import hashlib
+import json
+from pathlib import Path
+
+import polars as pl
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import structlog
+
+from hub_predtimechart.hub_config_ptc import VIZ_QUANTILE_LEVELS, HubConfigPtc
+from hub_predtimechart.util.write_files import json_bytes, remove_file, write_file_if_changed
+
+
+logger = structlog.get_logger()
+
+# the cube's wide quantile columns, one per `VIZ_QUANTILE_LEVELS` entry. the names match the forecast json keys
+QUANTILE_COLS = tuple(f"q{quantile_level}" for quantile_level in VIZ_QUANTILE_LEVELS)
+
+MANIFEST_FILE_NAME = 'manifest.json'
+
+
+class VizCube:
+    """
+    A persisted, pre-reduced copy of a hub's model output that holds only what predtimechart uses: for each submission
+    file, the rows for the hub's viz targets at the `VIZ_QUANTILE_LEVELS` quantiles, in wide form. Its columns are
+    'model_id', the targets' `viz_target_col_name`s and `viz_task_ids`, the reference date and target date columns (all
+    named and typed as in the hub's schema), and `QUANTILE_COLS`. Layout:
+
+    - <cube_dir>/manifest.json: maps each reduced submission file ("<model_id>/<file name>") to its [size, mtime_ns]
+        when it was reduced, plus a 'config_key' that identifies the hub configuration the cube was reduced for
+    - <cube_dir>/<model_id>/<file stem>.parquet: one part per submission file. together the parts form one table
+
+    `update()` reduces only new and changed submission files and deletes the parts of removed ones. When a VizCube is
+    set as a HubConfigPtc's `viz_cube`, `HubConfigPtc.model_output_table()` and availability checks read a submission
+    file's part instead of the file itself, as long as the part is current. Reads melt the part back to the long
+    (output_type, output_type_id, value) rows that the raw file would give, so generated json files are identical.
+    One difference: a file is "available" for a target only if it has quantile rows for it.
+
+    Instance variables:
+    - hub_config: the HubConfigPtc the cube is for
+    - cube_dir: the cube's directory Path
+    """
+
+
+    def __init__(self, hub_config: HubConfigPtc, cube_dir: Path):
+        """
+        :param hub_config: the HubConfigPtc the cube is for
+        :param cube_dir: the cube's directory Path. created by `update()` if necessary
+        """
+        self.hub_config = hub_config
+        self.cube_dir = cube_dir
+        self.key_cols = _key_columns(hub_config)
+        self.schema = pa.schema([pa.field('model_id', pa.string())] +
+                                [hub_config.schema.field(col_name) for col_name in self.key_cols] +
+                                [pa.field(quantile_col, hub_config.schema.field('value').type)
+                                 for quantile_col in QUANTILE_COLS])
+        targets = sorted((model_task.viz_target_col_name, model_task.viz_target_id)
+                         for model_task in hub_config.model_tasks)
+        self.config_key = hashlib.sha256(json_bytes({'schema': str(self.schema), 'targets': targets})).hexdigest()
+        self._source_to_stat: dict[str, list[int]] = {}  # the manifest's 'files'. loaded below
+        manifest_file = cube_dir / MANIFEST_FILE_NAME
+        if manifest_file.exists():
+            with open(manifest_file) as fp:
+                manifest = json.load(fp)
+            if manifest.get('config_key') == self.config_key:
+                self._source_to_stat = manifest['files']
+            else:
+                logger.info(f"VizCube(): hub configuration changed. all files will be reduced. {cube_dir=}")
+
+
+    def update(self) -> dict[str, int]:
+        """
+        Brings the cube up to date with the hub's model output: reduces new and changed submission files, deletes the
+        parts of removed ones, and saves the manifest.
+
+        :return: a dict that counts the submission files by what was done: 'reduced', 'removed', and 'unchanged'
+        """
+        counts = {'reduced': 0, 'removed': 0, 'unchanged': 0}
+        source_to_file = _model_output_files(self.hub_config)
+        for source, model_output_file in source_to_file.items():
+            if self._current_part(model_output_file) is not None:
+                counts['unchanged'] += 1
+                continue
+
+            model_id = model_output_file.parent.name
+            part_file = self._part_file(model_output_file)
+            part_file.parent.mkdir(parents=True, exist_ok=True)
+            pq.write_table(self._reduce(model_id, model_output_file), part_file, compression='zstd')
+            stat = model_output_file.stat()
+            self._source_to_stat[source] = [stat.st_size, stat.st_mtime_ns]
+            counts['reduced'] += 1
+
+        for source in sorted(set(self._source_to_stat) - set(source_to_file)):
+            model_id, file_name = source.split('/')
+            remove_file(self.cube_dir / model_id / (Path(file_name).stem + '.parquet'))
+            del self._source_to_stat[source]
+            counts['removed'] += 1
+
+        self.cube_dir.mkdir(parents=True, exist_ok=True)
+        write_file_if_changed(self.cube_dir / MANIFEST_FILE_NAME,
+                              json_bytes({'config_key': self.config_key, 'files': self._source_to_stat}, indent=4,
+                                         sort_keys=True))
+        logger.info(f"update(): {counts=}")
+        return counts
+
+
+    def model_output_table(self, model_output_file: Path, columns: list[str],
+                           filter: pc.Expression) -> pa.Table | None:
+        """
+        Returns the long form of `model_output_file`'s part, filtered by `filter` and limited to `columns`, as
+        `HubConfigPtc.model_output_table()` would. 'output_type_id' is typed as in the hub's schema.
+
+        :param model_output_file: a Path as returned by `HubConfigPtc.model_output_file_for_ref_date()`
+        :param columns: the columns to return
+        :param filter: a pc.Expression to filter rows by. must not refer to the 'model_id' partition column
+        :return: a pa.Table, or None if the part is missing or out of date
+        """
+        part_file = self._current_part(model_output_file)
+        if part_file is None:
+            return None
+
+        part_table = pq.read_table(part_file, schema=self.schema)
+        output_type_id_type = self.hub_config.schema.field('output_type_id').type
+        long_tables = []
+        for quantile_level, quantile_col in zip(VIZ_QUANTILE_LEVELS, QUANTILE_COLS):
+            long_table = (part_table.select(self.key_cols)
+                          .append_column('output_type', pa.repeat('quantile', part_table.num_rows)
+                                         .cast(self.hub_config.schema.field('output_type').type))
+                          .append_column('output_type_id', pa.repeat(quantile_level, part_table.num_rows)
+                                         .cast(output_type_id_type))
+                          .append_column('value', part_table[quantile_col]))
+            long_tables.append(long_table.filter(pc.is_valid(long_table['value'])))
+        return pa.concat_tables(long_tables).filter(filter).select(columns)
+
+
+    def file_has_value(self, model_output_file: Path, col_name: str, value: str) -> bool | None:
+        """
+        :return: True if `model_output_file`'s part has a row whose `col_name` column equals `value`, False if not, or
+            None if the part is missing or out of date
+        """
+        part_file = self._current_part(model_output_file)
+        if part_file is None:
+            return None
+
+        return pq.read_table(part_file, columns=[col_name]).filter(pc.field(col_name) == value).num_rows > 0
+
+
+    def _part_file(self, model_output_file: Path) -> Path:
+        return self.cube_dir / model_output_file.parent.name / (model_output_file.stem + '.parquet')
+
+
+    def _current_part(self, model_output_file: Path) -> Path | None:
+        """
+        :return: `model_output_file`'s part file, or None if it is missing or was reduced from a different version of
+            `model_output_file` (by size and mtime)
+        """
+        recorded_stat = self._source_to_stat.get(f"{model_output_file.parent.name}/{model_output_file.name}")
+        if recorded_stat is None:
+            return None
+
+        stat = model_output_file.stat()
+        part_file = self._part_file(model_output_file)
+        if (recorded_stat != [stat.st_size, stat.st_mtime_ns]) or not part_file.exists():
+            return None
+
+        return part_file
+
+
+    def _reduce(self, model_id: str, model_output_file: Path) -> pa.Table:
+        """
+        `update()` helper that returns `model_output_file`'s part table: its viz target quantile rows, pivoted to wide
+        form.
+
+        :raises RuntimeError: if `model_output_file` has more than one row for the same task ids and quantile level,
+            which the wide form cannot hold
+        """
+        hub_config = self.hub_config
+        target_expr = pc.scalar(False)
+        for model_task in hub_config.model_tasks:
+            target_expr |= pc.field(model_task.viz_target_col_name) == model_task.viz_target_id
+        filter_expr = ((pc.field('output_type') == 'quantile') &
+                       pc.field('output_type_id').isin(hub_config.viz_quantile_levels()) & target_expr)
+        filter_cols = ['output_type', 'output_type_id'] + [model_task.viz_target_col_name
+                                                           for model_task in hub_config.model_tasks]
+        pa_table = hub_config.model_output_table(model_id, model_output_file,
+                                                 self.key_cols + ['output_type_id', 'value'], filter_expr, filter_cols)
+        pa_table = pa_table.set_column(pa_table.schema.get_field_index('output_type_id'), 'output_type_id',
+                                       pc.cast(pa_table['output_type_id'], pa.float64()))
+
+        # pivot the quantile levels to columns, adding any that have no rows
+        long_df = pl.from_arrow(pa_table)
+        num_duplicates = long_df.select(self.key_cols + ['output_type_id']).is_duplicated().sum()
+        if num_duplicates:
+            raise RuntimeError(f"duplicate quantile rows found. {model_output_file=}, {num_duplicates=}")
+
+        wide_df = long_df.pivot(on='output_type_id', index=self.key_cols, values='value')
+        wide_df = wide_df.rename({str(quantile_level): quantile_col
+                                  for quantile_level, quantile_col in zip(VIZ_QUANTILE_LEVELS, QUANTILE_COLS)
+                                  if str(quantile_level) in wide_df.columns})
+        wide_df = wide_df.with_columns([pl.lit(None, dtype=pl.Float64).alias(quantile_col)
+                                        for quantile_col in QUANTILE_COLS if quantile_col not in wide_df.columns])
+        wide_df = wide_df.with_columns(pl.lit(model_id).alias('model_id'))
+        return wide_df.select(self.schema.names).to_arrow().cast(self.schema)
+
+
+def _key_columns(hub_config: HubConfigPtc) -> list[str]:
+    """
+    :return: the cube's non-quantile columns, excluding 'model_id': each model_task's `viz_target_col_name` and
+        `viz_task_ids`, then the reference date and target date columns
+    """
+    key_cols = []
+    for model_task in hub_config.model_tasks:
+        key_cols.extend([model_task.viz_target_col_name] + model_task.viz_task_ids)
+    key_cols.extend([hub_config.reference_date_col_name, hub_config.target_date_col_name])
+    return list(dict.fromkeys(key_cols))
+
+
+def _model_output_files(hub_config: HubConfigPtc) -> dict[str, Path]:
+    """
+    :return: a dict that maps "<model_id>/<file name>" to the Path of each of the hub's CSV and parquet model output
+        files
+    """
+    model_output_dir = hub_config.hub_path / 'model-output'
+    if not model_output_dir.is_dir():
+        return {}
+
+    return {f"{model_output_file.parent.name}/{model_output_file.name}": model_output_file
+            for model_output_file in sorted(model_output_dir.glob('*/*'))
+            if model_output_file.suffix in ('.csv', '.parquet')}
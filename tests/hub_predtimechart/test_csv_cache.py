@@ -0,0 +1,97 @@
+import json
+import os
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pytest
+
+from hub_predtimechart.app.generate_json_files import _generate_forecast_json_files
+from hub_predtimechart.hub_config_ptc import HubConfigPtc
+from hub_predtimechart.util.byte_sizes import parse_byte_size
+from hub_predtimechart.util.csv_cache import CsvCache
+
+
+def test_csv_cache_hit_and_miss(tmp_path):
+    csv_file = tmp_path / 'file.csv'
+    csv_file.write_text('a,b\n1,x\n2,y\n')
+    cache = CsvCache(tmp_path / 'cache')
+    read_csv_calls = []
+
+    def read_csv_fn(file):
+        read_csv_calls.append(file)
+        return pacsv.read_csv(file)
+
+    # case: miss, then hit
+    exp_table = pa.table({'a': [1, 2], 'b': ['x', 'y']})
+    assert cache.get_table(csv_file, read_csv_fn).equals(exp_table)
+    assert cache.get_table(csv_file, read_csv_fn).equals(exp_table)
+    assert read_csv_calls == [csv_file]
+    assert len(list((tmp_path / 'cache').glob('*.arrow'))) == 1
+
+    # case: changed file is a miss
+    csv_file.write_text('a,b\n3,z\n')
+    os.utime(csv_file, ns=(1_000_000_000, 1_000_000_000))
+    assert cache.get_table(csv_file, read_csv_fn).equals(pa.table({'a': [3], 'b': ['z']}))
+    assert len(read_csv_calls) == 2
+
+    # case: a different parse_key (e.g., a changed schema) is a miss
+    assert cache.get_table(csv_file, read_csv_fn, 'other schema').equals(pa.table({'a': [3], 'b': ['z']}))
+    assert len(read_csv_calls) == 3
+
+
+def test_csv_cache_eviction(tmp_path):
+    csv_files = []
+    for idx in range(3):
+        csv_file = tmp_path / f"file{idx}.csv"
+        csv_file.write_text('a\n' + '\n'.join(str(_) for _ in range(1000)) + '\n')
+        csv_files.append(csv_file)
+
+    # size the cache so that it holds only two entries
+    cache = CsvCache(tmp_path / 'cache')
+    cache.get_table(csv_files[0], pacsv.read_csv)
+    entry_size = next((tmp_path / 'cache').glob('*.arrow')).stat().st_size
+    cache.max_bytes = 2 * entry_size
+
+    cache.get_table(csv_files[1], pacsv.read_csv)
+    cache_file_0 = cache.cache_dir / f"{cache._cache_key(csv_files[0])}.arrow"
+    os.utime(cache_file_0, ns=(1_000_000_000, 1_000_000_000))  # oldest
+    cache.get_table(csv_files[2], pacsv.read_csv)
+    assert {_.name for _ in cache.cache_dir.glob('*.arrow')} == {f"{cache._cache_key(csv_files[1])}.arrow",
+                                                                 f"{cache._cache_key(csv_files[2])}.arrow"}
+
+
+def test_generate_forecast_json_files_csv_cache(tmp_path):
+    hub_dir = Path('tests/hubs/example-complex-forecast-hub')
+    hub_config = HubConfigPtc(hub_dir, hub_dir / 'hub-config/predtimechart-config.yml')
+    hub_config.csv_cache = CsvCache(tmp_path / 'cache')
+    for _ in range(2):  # first run fills the cache, second one reads from it
+        output_dir = tmp_path / f"out{_}"
+        output_dir.mkdir()
+        json_files = _generate_forecast_json_files(hub_config, output_dir)
+        assert len(json_files) == 6
+        for json_file in json_files:
+            with open('tests/expected/example-complex-forecast-hub/forecasts/' + json_file.name) as exp_fp, \
+                    open(json_file) as act_fp:
+                assert json.load(act_fp) == json.load(exp_fp)
+    assert len(list((tmp_path / 'cache').glob('*.arrow'))) == len([csv_file for csv_file
+                                                                  in hub_dir.glob('model-output/*/*.csv')
+                                                                  if csv_file.parent.name in hub_config.viz_model_ids])
+
+
+@pytest.mark.parametrize("size_str,exp_bytes", [
+    ('1048576', 1048576),
+    ('512', 512),
+    ('1K', 1024),
+    ('2mb', 2 * 1024 ** 2),
+    ('1.5GiB', int(1.5 * 1024 ** 3)),
+    (' 3 G ', 3 * 1024 ** 3),
+])
+def test_parse_byte_size(size_str, exp_bytes):
+    assert parse_byte_size(size_str) == exp_bytes
+
+
+@pytest.mark.parametrize("size_str", ['', 'MB', '1XB', '-1G', '1 2G'])
+def test_parse_byte_size_invalid(size_str):
+    with pytest.raises(ValueError, match="invalid byte size"):
+        parse_byte_size(size_str)
@@ -0,0 +1,70 @@
+import json
+from pathlib import Path
+
+import pytest
+import yaml
+from click.testing import CliRunner
+
+from hub_predtimechart.app.generate_batch import load_batch_file, main
+
+
+def test_load_batch_file(tmp_path):
+    batch_file = tmp_path / 'batch.yml'
+    batch_file.write_text(yaml.safe_dump({'hubs': [{'hub_dir': 'hub', 'options_file_out': 'out/options.json',
+                                                    'forecasts_out_dir': 'out/forecasts'}]}))
+    assert load_batch_file(batch_file) == [{'hub_dir': tmp_path / 'hub',
+                                            'ptc_config_file': tmp_path / 'hub/hub-config/predtimechart-config.yml',
+                                            'options_file_out': tmp_path / 'out/options.json',
+                                            'forecasts_out_dir': tmp_path / 'out/forecasts'}]
+
+    batch_file.write_text(yaml.safe_dump({'hubs': [{'hub_dir': 'hub'}]}))
+    with pytest.raises(RuntimeError, match="invalid batch file"):
+        load_batch_file(batch_file)
+
+
+def test_generate_batch(tmp_path):
+    hub_entries = []
+    for hub_name in ['example-complex-forecast-hub', 'flu-metrocast']:
+        (tmp_path / hub_name / 'forecasts').mkdir(parents=True)
+        hub_entries.append({'hub_dir': str(Path('tests/hubs', hub_name).resolve()),
+                            'options_file_out': f"{hub_name}/predtimechart-options.json",
+                            'forecasts_out_dir': f"{hub_name}/forecasts"})
+    (tmp_path / 'flu-metrocast' / 'targets').mkdir()
+    hub_entries[1]['target_out_dir'] = 'flu-metrocast/targets'
+    batch_file = tmp_path / 'batch.yml'
+    summary_file = tmp_path / 'summary.json'
+
+    # case: all hubs succeed
+    batch_file.write_text(yaml.safe_dump({'hubs': hub_entries}))
+    result = CliRunner().invoke(main, [str(batch_file), '--workers', '2', '--summary-file', str(summary_file)])
+    assert result.exit_code == 0, result.output
+    with open(tmp_path / 'example-complex-forecast-hub/predtimechart-options.json') as act_fp, \
+            open('tests/expected/example-complex-forecast-hub/predtimechart-options.json') as exp_fp:
+        assert json.load(act_fp) == json.load(exp_fp)
+    for json_file in (tmp_path / 'example-complex-forecast-hub/forecasts').iterdir():
+        with open('tests/expected/example-complex-forecast-hub/forecasts/' + json_file.name) as exp_fp, \
+                open(json_file) as act_fp:
+            assert json.load(act_fp) == json.load(exp_fp)
+    with open(summary_file) as fp:
+        summaries = json.load(fp)
+    assert [summary['status'] for summary in summaries] == ['ok', 'ok']
+    assert summaries[0]['num_forecast_files'] == 6
+    assert (summaries[0]['num_target_files'] == 0) and (summaries[1]['num_target_files'] > 0)
+
+    # case: --all-models outputs forecasts for models that are not displayable, such as Test-NumericOnly
+    result = CliRunner().invoke(main, [str(batch_file), '--all-models'])
+    assert result.exit_code == 0, result.output
+    json_file_name = 'wk-inc-flu-hosp_02_2022-10-22.json'
+    with open(tmp_path / 'example-complex-forecast-hub/forecasts' / json_file_name) as act_fp, \
+            open('tests/expected/example-complex-forecast-hub/forecasts-all-models/' + json_file_name) as exp_fp:
+        assert json.load(act_fp) == json.load(exp_fp)
+
+    # case: one hub fails, the other still succeeds
+    hub_entries.append({'hub_dir': 'no-such-hub', 'options_file_out': 'options.json', 'forecasts_out_dir': '.'})
+    batch_file.write_text(yaml.safe_dump({'hubs': hub_entries}))
+    result = CliRunner().invoke(main, [str(batch_file), '--regenerate', '--summary-file', str(summary_file)])
+    assert result.exit_code == 1
+    with open(summary_file) as fp:
+        summaries = json.load(fp)
+    assert [summary['status'] for summary in summaries] == ['ok', 'ok', 'failed']
+    assert summaries[2]['error']
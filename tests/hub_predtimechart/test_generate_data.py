@@ -1,11 +1,12 @@
 import json
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 import pytest
 
 from hub_predtimechart.app.generate_json_files import json_file_name
-from hub_predtimechart.generate_data import forecast_data_for_model_df
+from hub_predtimechart.generate_data import forecast_data_for_model_df, round_values
 from hub_predtimechart.hub_config_ptc import HubConfigPtc
 
 
@@ -82,6 +83,62 @@ def test_forecast_data_for_model_df_flu_metrocast_bronx():
     assert act_data == exp_data['epiENGAGE-GBQR']
 
 
+def test_forecast_data_for_model_df_value_precision():
+    hub_dir = Path('tests/hubs/flu-metrocast')
+    hub_config = HubConfigPtc(hub_dir, hub_dir / 'hub-config/predtimechart-config.yml')
+    model_output_file = hub_dir / 'model-output/epiENGAGE-GBQR/2025-02-22-epiENGAGE-GBQR.csv'
+    model_df = pd.read_csv(model_output_file)
+    exp_data = forecast_data_for_model_df(hub_config, model_df, 'ILI ED visits', ('Bronx',))
+
+    hub_config.value_precision = {'significant_digits': 2}  # override
+    act_data = forecast_data_for_model_df(hub_config, model_df, 'ILI ED visits', ('Bronx',))
+    assert act_data['target_end_date'] == exp_data['target_end_date']
+    for quantile_key in ['q0.025', 'q0.25', 'q0.5', 'q0.75', 'q0.975']:
+        assert act_data[quantile_key] == [float(f"{value:.2g}") for value in exp_data[quantile_key]]
+        assert all(isinstance(value, int) for value in act_data[quantile_key]
+                   if float(value).is_integer())
+
+
+def test_forecast_data_for_model_df_float32_values():
+    hub_dir = Path('tests/hubs/flu-metrocast')
+    hub_config = HubConfigPtc(hub_dir, hub_dir / 'hub-config/predtimechart-config.yml')
+    model_output_file = hub_dir / 'model-output/epiENGAGE-GBQR/2025-02-22-epiENGAGE-GBQR.csv'
+    model_df = pd.read_csv(model_output_file)
+    exp_data = forecast_data_for_model_df(hub_config, model_df, 'ILI ED visits', ('Bronx',))
+
+    model_df = model_df.assign(value=model_df['value'].astype(np.float32))
+    act_data = forecast_data_for_model_df(hub_config, model_df, 'ILI ED visits', ('Bronx',))
+    assert act_data['target_end_date'] == exp_data['target_end_date']
+    for quantile_key in ['q0.025', 'q0.25', 'q0.5', 'q0.75', 'q0.975']:
+        # values are output via their shortest float32 repr rather than with widened float32 noise
+        assert act_data[quantile_key] == [float(str(np.float32(value))) for value in exp_data[quantile_key]]
+
+
+def test_forecast_data_for_model_df_date_types():
+    hub_dir = Path('tests/hubs/flu-metrocast')
+    hub_config = HubConfigPtc(hub_dir, hub_dir / 'hub-config/predtimechart-config.yml')
+    model_output_file = hub_dir / 'model-output/epiENGAGE-GBQR/2025-02-22-epiENGAGE-GBQR.csv'
+    model_df = pd.read_csv(model_output_file)
+    exp_data = forecast_data_for_model_df(hub_config, model_df, 'ILI ED visits', ('Bronx',))
+    assert exp_data['target_end_date'][0] == '2025-02-22'
+
+    # case: date objects (as from a pa.date32 column) and timestamps are output as ISO strings
+    target_end_dates = pd.to_datetime(model_df['target_end_date'])
+    for target_end_date_col in [target_end_dates.dt.date, target_end_dates]:
+        act_data = forecast_data_for_model_df(hub_config, model_df.assign(target_end_date=target_end_date_col),
+                                              'ILI ED visits', ('Bronx',))
+        assert act_data == exp_data
+
+
+def test_round_values():
+    values = np.array([1723.9999999998, 0.123456, -45.678, 0.0, np.nan, 2.5])
+    assert round_values(values, {'decimal_places': 2}).tolist() == [1724, 0.12, -45.68, 0, None, 2.5]
+    assert round_values(values, {'decimal_places': 0}).tolist() == [1724, 0, -46, 0, None, 2]
+    assert round_values(values, {'significant_digits': 3}).tolist() == [1720, 0.123, -45.7, 0, None, 2.5]
+    act_values = round_values(values, {'significant_digits': 4}).tolist()
+    assert [type(value) for value in act_values] == [int, float, float, int, type(None), float]
+
+
 def test_forecast_data_for_model_df_no_data():
     hub_dir = Path('tests/hubs/example-complex-forecast-hub')
     hub_config = HubConfigPtc(hub_dir, hub_dir / 'hub-config/predtimechart-config.yml')
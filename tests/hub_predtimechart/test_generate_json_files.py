@@ -2,8 +2,17 @@ import json
 import shutil
 from pathlib import Path
 
-from hub_predtimechart.app.generate_json_files import _generate_forecast_json_files, _generate_options_file
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+from click.testing import CliRunner
+
+from hub_predtimechart.app import generate_json_files
+from hub_predtimechart.app.generate_json_files import _forecast_filter_expr, _generate_forecast_json_files, \
+    _generate_options_file, _model_table_to_df, _normalize_output_type_id, iter_forecast_payloads, main
 from hub_predtimechart.hub_config_ptc import HubConfigPtc
+from hub_predtimechart.util.write_files import Changeset, OutputWriter
 
 
 def test_generate_forecast_json_files_ecfh(tmp_path):
@@ -16,7 +25,6 @@ def test_generate_forecast_json_files_ecfh(tmp_path):
     json_files = _generate_forecast_json_files(hub_config, output_dir)
     assert set(json_files) == {output_dir / 'wk-inc-flu-hosp_US_2022-10-22.json',
                                output_dir / 'wk-inc-flu-hosp_01_2022-10-22.json',
-                               output_dir / 'wk-inc-flu-hosp_02_2022-10-22.json',
                                output_dir / 'wk-inc-flu-hosp_US_2022-11-19.json',
                                output_dir / 'wk-inc-flu-hosp_01_2022-11-19.json',
                                output_dir / 'wk-inc-flu-hosp_US_2022-12-17.json',
@@ -28,6 +36,42 @@ def test_generate_forecast_json_files_ecfh(tmp_path):
             act_data = json.load(act_fp)
             assert act_data == exp_data
 
+    # case: all models. Test-NumericOnly is not designated, so by default it is neither loaded nor output
+    assert 'Test-NumericOnly' not in hub_config.viz_model_ids
+    hub_config.viz_model_ids = list(hub_config.model_id_to_metadata)
+    output_dir = tmp_path / 'all-models'
+    output_dir.mkdir()
+    json_files = _generate_forecast_json_files(hub_config, output_dir)
+    assert output_dir / 'wk-inc-flu-hosp_02_2022-10-22.json' in json_files
+    with open('tests/expected/example-complex-forecast-hub/forecasts-all-models/wk-inc-flu-hosp_02_2022-10-22.json') \
+            as exp_fp, open(output_dir / 'wk-inc-flu-hosp_02_2022-10-22.json') as act_fp:
+        assert json.load(act_fp) == json.load(exp_fp)
+    with open(output_dir / 'wk-inc-flu-hosp_01_2022-10-22.json') as act_fp:
+        assert 'Test-NumericOnly' in json.load(act_fp)
+
+
+
+def test_generate_forecast_json_files_numeric_only_locations(tmp_path):
+    """
+    Regression test for issue #78: a displayable model whose location codes are all numeric-looking (e.g., '01', '02')
+    must be output by default, with its locations kept as strings.
+    """
+    hub_dir = tmp_path / 'hub'
+    shutil.copytree('tests/hubs/example-complex-forecast-hub', hub_dir)
+    metadata_file = hub_dir / 'model-metadata/Test-NumericOnly.yml'
+    metadata_file.write_text(metadata_file.read_text().replace('designated_model: false', 'designated_model: true'))
+    hub_config = HubConfigPtc(hub_dir, hub_dir / 'hub-config/predtimechart-config.yml')
+    assert 'Test-NumericOnly' in hub_config.viz_model_ids
+
+    output_dir = tmp_path / 'forecasts'
+    output_dir.mkdir()
+    json_files = _generate_forecast_json_files(hub_config, output_dir)
+    assert output_dir / 'wk-inc-flu-hosp_02_2022-10-22.json' in json_files
+    with open('tests/expected/example-complex-forecast-hub/forecasts-all-models/wk-inc-flu-hosp_02_2022-10-22.json') \
+            as exp_fp, open(output_dir / 'wk-inc-flu-hosp_02_2022-10-22.json') as act_fp:
+        assert json.load(act_fp) == json.load(exp_fp)
+    with open(output_dir / 'wk-inc-flu-hosp_01_2022-10-22.json') as act_fp:
+        assert 'Test-NumericOnly' in json.load(act_fp)
 
 
 def test_generate_forecast_json_files_flu_metrocast(tmp_path):
@@ -92,7 +136,6 @@ def test_generate_forecast_json_files_skip_files(tmp_path):
     json_files = Path(output_dir).glob("*")
     assert set(json_files) == {output_dir / 'wk-inc-flu-hosp_US_2022-10-22.json',
                                output_dir / 'wk-inc-flu-hosp_01_2022-10-22.json',
-                               output_dir / 'wk-inc-flu-hosp_02_2022-10-22.json',
                                output_dir / 'wk-inc-flu-hosp_US_2022-11-19.json',
                                output_dir / 'wk-inc-flu-hosp_01_2022-11-19.json',
                                output_dir / 'wk-inc-flu-hosp_01_2022-12-17.json'}
@@ -125,13 +168,140 @@ def test_generate_forecast_json_files_regenerate(tmp_path):
     json_files = _generate_forecast_json_files(hub_config, output_dir, True)
     assert set(json_files) == {output_dir / 'wk-inc-flu-hosp_US_2022-10-22.json',
                                output_dir / 'wk-inc-flu-hosp_01_2022-10-22.json',
-                               output_dir / 'wk-inc-flu-hosp_02_2022-10-22.json',
                                output_dir / 'wk-inc-flu-hosp_US_2022-11-19.json',
                                output_dir / 'wk-inc-flu-hosp_01_2022-11-19.json',
                                output_dir / 'wk-inc-flu-hosp_US_2022-12-17.json',
                                output_dir / 'wk-inc-flu-hosp_01_2022-12-17.json'}
 
 
+def test_generate_forecast_json_files_bundle(tmp_path, monkeypatch):
+    """
+    An integration test of `generate_json_files.py`'s `_generate_forecast_json_files()` in bundle mode. Validates that
+    each payload addressed by the index files matches the corresponding individual json file.
+    """
+    hub_dir = Path('tests/hubs/example-complex-forecast-hub')
+    hub_config = HubConfigPtc(hub_dir, hub_dir / 'hub-config/predtimechart-config.yml')
+    output_dir = tmp_path
+    act_files = _generate_forecast_json_files(hub_config, output_dir, is_bundle=True)
+    assert set(act_files) == {output_dir / 'wk-inc-flu-hosp_2022-10-22.bundle',
+                              output_dir / 'wk-inc-flu-hosp_2022-10-22.bundle-index.json',
+                              output_dir / 'wk-inc-flu-hosp_2022-11-19.bundle',
+                              output_dir / 'wk-inc-flu-hosp_2022-11-19.bundle-index.json',
+                              output_dir / 'wk-inc-flu-hosp_2022-12-17.bundle',
+                              output_dir / 'wk-inc-flu-hosp_2022-12-17.bundle-index.json'}
+
+    act_json_file_names = set()
+    for index_file in output_dir.glob('*.bundle-index.json'):
+        with open(index_file) as fp:
+            file_name_to_range = json.load(fp)
+        bundle_bytes = (output_dir / index_file.name.replace('.bundle-index.json', '.bundle')).read_bytes()
+        for json_file_name, (offset, length) in file_name_to_range.items():
+            act_json_file_names.add(json_file_name)
+            with open('tests/expected/example-complex-forecast-hub/forecasts/' + json_file_name) as exp_fp:
+                exp_data = json.load(exp_fp)
+            assert json.loads(bundle_bytes[offset:offset + length]) == exp_data
+    assert act_json_file_names == {'wk-inc-flu-hosp_US_2022-10-22.json', 'wk-inc-flu-hosp_01_2022-10-22.json',
+                                   'wk-inc-flu-hosp_US_2022-11-19.json', 'wk-inc-flu-hosp_01_2022-11-19.json',
+                                   'wk-inc-flu-hosp_US_2022-12-17.json', 'wk-inc-flu-hosp_01_2022-12-17.json'}
+
+    # only the current round's bundle should be regenerated (and its data loaded) when the bundles exist
+    load_reference_dates = []
+    load_model_id_to_df = generate_json_files.load_model_id_to_df
+
+    def _load_model_id_to_df(hub_config, model_task, reference_date, *args):
+        load_reference_dates.append(reference_date)
+        return load_model_id_to_df(hub_config, model_task, reference_date, *args)
+
+
+    monkeypatch.setattr(generate_json_files, 'load_model_id_to_df', _load_model_id_to_df)
+    act_files = _generate_forecast_json_files(hub_config, output_dir, is_bundle=True)
+    assert set(load_reference_dates) & {'2022-10-22', '2022-11-19', '2022-12-17'} == {'2022-12-17'}  # those w/data
+    assert set(act_files) == {output_dir / 'wk-inc-flu-hosp_2022-12-17.bundle',
+                              output_dir / 'wk-inc-flu-hosp_2022-12-17.bundle-index.json'}
+
+
+@pytest.mark.parametrize("hub_name,model_id,reference_date", [
+    ('example-complex-forecast-hub', 'Flusight-baseline', '2022-10-22'),  # string output_type_id
+    ('flu-metrocast', 'epiENGAGE-GBQR', '2025-02-22'),  # float output_type_id
+])
+def test__forecast_filter_expr(hub_name, model_id, reference_date):
+    hub_dir = Path('tests/hubs') / hub_name
+    hub_config = HubConfigPtc(hub_dir, hub_dir / 'hub-config/predtimechart-config.yml')
+    model_task = hub_config.model_tasks[0]
+    model_output_file = hub_config.model_output_file_for_ref_date(model_id, reference_date)
+    columns = [model_task.viz_target_col_name, 'output_type', 'output_type_id']
+    pa_table = hub_config.model_output_table(model_id, model_output_file, columns,
+                                             _forecast_filter_expr(hub_config, model_task, reference_date))
+    assert pa_table.num_rows > 0
+    assert set(pa_table[model_task.viz_target_col_name].to_pylist()) == {model_task.viz_target_id}
+    assert set(pa_table['output_type'].to_pylist()) == {'quantile'}
+
+    pa_table = _normalize_output_type_id(pa_table)
+    assert pa_table.schema.field('output_type_id').type == pa.float64()
+    assert set(pa_table['output_type_id'].to_pylist()) == {0.025, 0.25, 0.5, 0.75, 0.975}
+
+
+def test__model_table_to_df():
+    pa_table = pa.table({'target': ['t1', 't1', 't1'], 'location': ['US', '01', 'US'], 'other': ['a', 'b', 'c'],
+                         'output_type_id': [0.25, 0.5, 0.75], 'value': [0.1, 2.5, 1724.0]})
+    model_df = _model_table_to_df(pa_table, ['target', 'location'])
+    assert isinstance(model_df['target'].dtype, pd.CategoricalDtype)
+    assert isinstance(model_df['location'].dtype, pd.CategoricalDtype)
+    assert model_df['other'].dtype == pd.ArrowDtype(pa.string())
+    assert model_df['value'].dtype == np.float64
+    assert model_df.query("location == '01'")['value'].tolist() == [2.5]
+
+    model_df = _model_table_to_df(pa_table, ['target', 'location'], is_float32_values=True)
+    assert model_df['value'].dtype == np.float32
+
+
+def test_generate_forecast_json_files_float32_values(tmp_path):
+    hub_dir = Path('tests/hubs/example-complex-forecast-hub')
+    hub_config = HubConfigPtc(hub_dir, hub_dir / 'hub-config/predtimechart-config.yml')
+    json_files = _generate_forecast_json_files(hub_config, tmp_path, is_float32_values=True)
+    assert len(json_files) == 6
+    for json_file in json_files:
+        with open('tests/expected/example-complex-forecast-hub/forecasts/' + json_file.name) as exp_fp, \
+                open(json_file) as act_fp:
+            assert json.load(act_fp) == json.load(exp_fp)
+
+
+@pytest.mark.parametrize("hub_name", ['example-complex-forecast-hub', 'flu-metrocast'])
+@pytest.mark.parametrize("max_memory", [1, 10_000, 1 << 30])  # slices of one task_ids_tuple, a few, and all
+def test_generate_forecast_json_files_max_memory(tmp_path, hub_name, max_memory):
+    hub_dir = Path('tests/hubs') / hub_name
+    hub_config = HubConfigPtc(hub_dir, hub_dir / 'hub-config/predtimechart-config.yml')
+    (tmp_path / 'default').mkdir()
+    (tmp_path / 'max_memory').mkdir()
+    exp_files = _generate_forecast_json_files(hub_config, tmp_path / 'default')
+    act_files = _generate_forecast_json_files(hub_config, tmp_path / 'max_memory', max_memory=max_memory)
+    assert sorted(act_file.name for act_file in act_files) == sorted(exp_file.name for exp_file in exp_files)
+    for exp_file in exp_files:
+        assert (tmp_path / 'max_memory' / exp_file.name).read_bytes() == exp_file.read_bytes()
+
+    with pytest.raises(RuntimeError, match="not supported with is_bundle"):
+        _generate_forecast_json_files(hub_config, tmp_path, is_bundle=True, max_memory=max_memory)
+
+
+def test_generate_forecast_json_files_max_memory_empty_slice(tmp_path, monkeypatch):
+    # a first slice without rows measures only data frame overhead, which must not size the next slice to all of them
+    hub_dir = Path('tests/hubs/flu-metrocast')
+    hub_config = HubConfigPtc(hub_dir, hub_dir / 'hub-config/predtimechart-config.yml')
+    model_task = hub_config.model_tasks[0]
+    model_task.viz_task_ids_tuples = [('No Such Location',)] + model_task.viz_task_ids_tuples
+    slice_sizes = []
+    load_model_id_to_df = generate_json_files.load_model_id_to_df
+
+    def _load_model_id_to_df(hub_config, model_task, reference_date, is_float32_values=False, task_ids_tuples=None):
+        slice_sizes.append(len(task_ids_tuples))
+        return load_model_id_to_df(hub_config, model_task, reference_date, is_float32_values, task_ids_tuples)
+
+
+    monkeypatch.setattr(generate_json_files, 'load_model_id_to_df', _load_model_id_to_df)
+    _generate_forecast_json_files(hub_config, tmp_path, max_memory=5_000)  # about one task_ids_tuple's rows
+    assert slice_sizes and (max(slice_sizes) <= 2)
+
+
 def test_generate_options_file(tmp_path):
     """
     An integration test of `generate_json_files.py`'s `_generate_options_file()`.
@@ -145,3 +315,70 @@ def test_generate_options_file(tmp_path):
         act_options = json.load(act_options_fp)
         exp_options = json.load(exp_options_fp)
         assert act_options == exp_options
+
+
+def test_generate_options_file_split(tmp_path):
+    """
+    An integration test of `generate_json_files.py`'s `_generate_options_file()` with `is_split_options`.
+    """
+    hub_dir = Path('tests/hubs/example-complex-forecast-hub')
+    hub_config = HubConfigPtc(hub_dir, hub_dir / 'hub-config/predtimechart-config.yml')
+    ptc_options = tmp_path / 'ptc-options.json'
+    _generate_options_file(hub_config, ptc_options, is_split_options=True)
+    with open(ptc_options) as act_options_fp, \
+            open('tests/expected/example-complex-forecast-hub/predtimechart-options.json') as exp_options_fp:
+        act_options = json.load(act_options_fp)
+        exp_options = json.load(exp_options_fp)
+    assert act_options['target_shards'] == {'wk inc flu hosp': 'ptc-options/targets/wk-inc-flu-hosp.json'}
+    with open(tmp_path / act_options['target_shards']['wk inc flu hosp']) as fp:
+        target_shard = json.load(fp)
+    assert target_shard['available_as_ofs'] == exp_options['available_as_ofs']['wk inc flu hosp']
+    with open(tmp_path / target_shard['task_ids']['location']) as fp:
+        assert json.load(fp) == exp_options['task_ids']['wk inc flu hosp']['location']
+
+    # case: regenerating with changed task id values deletes the no longer referenced task id values shard
+    old_location_shard = tmp_path / target_shard['task_ids']['location']
+    hub_config.model_tasks[0].viz_task_id_to_vals['location'] = ['US', '01']
+    changeset = Changeset()
+    _generate_options_file(hub_config, ptc_options, OutputWriter(changeset), is_split_options=True)
+    assert not old_location_shard.exists()
+    assert set(changeset.status_to_files['deleted']) == {str(old_location_shard)}
+    assert len(list((tmp_path / 'ptc-options/task_ids').iterdir())) == 1
+
+
+def test_iter_forecast_payloads():
+    hub_dir = Path('tests/hubs/example-complex-forecast-hub')
+    hub_config = HubConfigPtc(hub_dir, hub_dir / 'hub-config/predtimechart-config.yml')
+    exp_dir = Path('tests/expected/example-complex-forecast-hub/forecasts')
+    relative_path_to_payload = dict(iter_forecast_payloads(hub_config))
+    assert set(relative_path_to_payload) == {exp_file.name for exp_file in exp_dir.iterdir()}
+    for relative_path, payload in relative_path_to_payload.items():
+        with open(exp_dir / relative_path) as fp:
+            assert json.loads(json.dumps(payload, default=str)) == json.load(fp)
+
+    # case: reference_dates
+    relative_paths = [relative_path for relative_path, _ in iter_forecast_payloads(hub_config,
+                                                                                   reference_dates={'2022-11-19'})]
+    assert sorted(relative_paths) == ['wk-inc-flu-hosp_01_2022-11-19.json', 'wk-inc-flu-hosp_US_2022-11-19.json']
+
+
+def test_main_last_n_rounds(tmp_path):
+    hub_dir = Path('tests/hubs/example-complex-forecast-hub')
+    options_file = tmp_path / 'predtimechart-options.json'
+    availability_file = tmp_path / 'availability.json'
+    forecasts_dir = tmp_path / 'forecasts'
+    forecasts_dir.mkdir()
+    args = [str(hub_dir), str(hub_dir / 'hub-config/predtimechart-config.yml'), str(options_file), str(forecasts_dir),
+            '--last-n-rounds', '1', '--availability-file', str(availability_file)]
+    for _ in range(2):  # the first run scans all rounds and saves the availability file, which the second one uses
+        result = CliRunner().invoke(main, args)
+        assert result.exit_code == 0, result.output
+        assert sorted(json_file.name for json_file in forecasts_dir.iterdir()) == \
+               ['wk-inc-flu-hosp_01_2022-12-17.json', 'wk-inc-flu-hosp_US_2022-12-17.json']
+        with open(options_file) as act_fp, \
+                open('tests/expected/example-complex-forecast-hub/predtimechart-options.json') as exp_fp:
+            assert json.load(act_fp) == json.load(exp_fp)
+        assert availability_file.exists()
+
+    result = CliRunner().invoke(main, args + ['--since', '2022-12-17'])
+    assert result.exit_code == 2
@@ -3,7 +3,7 @@ from pathlib import Path
 
 import pytest
 
-from hub_predtimechart.generate_options import ptc_options_for_hub, _host_owner_name
+from hub_predtimechart.generate_options import ptc_options_for_hub, ptc_sharded_options, _host_owner_name
 from hub_predtimechart.hub_config_ptc import HubConfigPtc, ModelTask
 
 
@@ -74,6 +74,41 @@ def test_generate_options_multi_target_per_block():
     assert set(options['task_ids'].keys()) == set(target_values)
 
 
+def test_ptc_sharded_options_flu_metrocast():
+    hub_dir = Path('tests/hubs/flu-metrocast')
+    hub_config = HubConfigPtc(hub_dir, hub_dir / 'hub-config/predtimechart-config.yml')
+    with open('tests/expected/flu-metrocast/predtimechart-options.json') as fp:
+        exp_options = json.load(fp)
+    core_options, shard_path_to_contents = ptc_sharded_options(ptc_options_for_hub(hub_config), 'ptc-options')
+    assert 'task_ids' not in core_options
+    assert 'available_as_ofs' not in core_options
+    assert core_options['target_shards'] == {'ILI ED visits': 'ptc-options/targets/ILI-ED-visits.json',
+                                             'Flu ED visits pct': 'ptc-options/targets/Flu-ED-visits-pct.json'}
+
+    # reconstruct the monolithic options from the shards
+    act_options = {key: value for key, value in core_options.items() if key != 'target_shards'}
+    act_options['task_ids'] = {}
+    act_options['available_as_ofs'] = {}
+    for target, target_shard_path in core_options['target_shards'].items():
+        target_shard = shard_path_to_contents[target_shard_path]
+        act_options['available_as_ofs'][target] = target_shard['available_as_ofs']
+        act_options['task_ids'][target] = {task_id: shard_path_to_contents[task_values_path]
+                                           for task_id, task_values_path in target_shard['task_ids'].items()}
+    assert act_options == exp_options
+
+
+def test_ptc_sharded_options_dedup():
+    task_values = [{'value': 'US', 'text': 'US'}, {'value': '01', 'text': '01'}]
+    options = {'task_ids': {'target a': {'location': task_values}, 'target b': {'location': list(task_values)}},
+               'available_as_ofs': {'target a': ['2022-10-22'], 'target b': ['2022-10-29']}}
+    core_options, shard_path_to_contents = ptc_sharded_options(options, 'shards')
+    assert len(shard_path_to_contents) == 3  # two target shards and one shared task id values shard
+    target_shard_a = shard_path_to_contents[core_options['target_shards']['target a']]
+    target_shard_b = shard_path_to_contents[core_options['target_shards']['target b']]
+    assert target_shard_a['task_ids'] == target_shard_b['task_ids']
+    assert target_shard_b['available_as_ofs'] == ['2022-10-29']
+
+
 def test_generate_options_task_id_text_covid19_forecast_hub():
     hub_dir = Path('tests/hubs/covid19-forecast-hub')
     hub_config = HubConfigPtc(hub_dir, hub_dir / 'hub-config/predtimechart-config.yml')
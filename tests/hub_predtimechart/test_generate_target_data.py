@@ -7,7 +7,7 @@ import polars as pl
 import pytest
 
 from hub_predtimechart.app.generate_target_json_files import ptc_target_data, _generate_target_json_files, \
-    _max_as_of_le_reference_date
+    _max_as_of_le_reference_date, partition_target_data, iter_target_payloads
 from hub_predtimechart.hub_config_ptc import HubConfigPtc
 
 
@@ -73,6 +73,18 @@ def test_ptc_target_data_flu_metrocast():
             assert act_data == exp_data
 
 
+def test_ptc_target_data_value_precision():
+    hub_dir = Path('tests/hubs/flu-metrocast')
+    hub_config = HubConfigPtc(hub_dir, hub_dir / 'hub-config/predtimechart-config.yml')
+    hub_config.value_precision = {'decimal_places': 1}  # override
+    target_data_df = hub_config.get_target_data_df()
+    act_data = ptc_target_data(hub_config.model_tasks[1], target_data_df, ('Austin',), '2025-03-01', None)
+    with open('tests/expected/flu-metrocast/targets/Flu-ED-visits-pct_Austin_2025-03-01.json') as fp:
+        exp_data = json.load(fp)
+    assert act_data['date'] == exp_data['date']
+    assert act_data['y'] == [round(value, 1) for value in exp_data['y']]
+
+
 def test_ptc_target_data_flu_metrocast_no_data():
     hub_dir = Path('tests/hubs/flu-metrocast')
     hub_config = HubConfigPtc(hub_dir, hub_dir / 'hub-config/predtimechart-config.yml')
@@ -212,3 +224,33 @@ def test__generate_target_json_files_regenerate_flu_metrocast(is_regenerate, exp
     # test the default `is_regenerate` parameter (False): no new files should be created
     act_json_files = _generate_target_json_files(hub_config, target_data_df, output_dir)
     assert len(act_json_files) == 0
+
+
+def test_iter_target_payloads(tmp_path):
+    hub_dir = Path('tests/hubs/flu-metrocast')
+    hub_config = HubConfigPtc(hub_dir, hub_dir / 'hub-config/predtimechart-config.yml')
+    exp_json_files = _generate_target_json_files(hub_config, hub_config.get_target_data_df(), tmp_path)
+    relative_path_to_payload = dict(iter_target_payloads(hub_config))
+    assert set(relative_path_to_payload) == {exp_json_file.name for exp_json_file in exp_json_files}
+    for exp_json_file in exp_json_files:
+        with open(exp_json_file) as fp:
+            assert relative_path_to_payload[exp_json_file.name] == json.load(fp)
+
+
+def test_partition_target_data():
+    # case: time-series target data is partitioned by target
+    hub_dir = Path('tests/hubs/flu-metrocast')
+    hub_config = HubConfigPtc(hub_dir, hub_dir / 'hub-config/predtimechart-config.yml')
+    target_data_df = hub_config.get_target_data_df()
+    target_id_to_df = partition_target_data(hub_config, target_data_df)
+    assert set(target_id_to_df) == {'ILI ED visits', 'Flu ED visits pct'}
+    for target_id, target_df in target_id_to_df.items():
+        assert target_df['target'].unique().to_list() == [target_id]
+    assert sum(len(target_df) for target_df in target_id_to_df.values()) == len(target_data_df)
+
+    # case: custom target data files are not keyed by target
+    hub_dir = Path('tests/hubs/FluSight-forecast-hub')
+    hub_config = HubConfigPtc(hub_dir, hub_dir / 'hub-config/predtimechart-config.yml')
+    target_data_df = hub_config.get_target_data_df()
+    assert all(target_df is target_data_df
+               for target_df in partition_target_data(hub_config, target_data_df).values())
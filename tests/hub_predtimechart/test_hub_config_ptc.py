@@ -1,5 +1,7 @@
 import copy
 import json
+import os
+import shutil
 from pathlib import Path
 from unittest.mock import patch
 
@@ -7,8 +9,13 @@ import pytest
 import yaml
 from jsonschema.exceptions import ValidationError
 
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
 from hub_predtimechart.hub_config_ptc import HubConfigPtc, _valid_targets, _validate_hub_ptc_compatibility, \
-    _validate_predtimechart_config, ModelTask
+    _validate_predtimechart_config, ModelTask, _parquet_file_has_value, _csv_file_has_value, CSV_BLOCK_SIZE, \
+    read_model_output_csv
 
 
 def test_hub_config_complex_forecast_hub():
@@ -22,6 +29,8 @@ def test_hub_config_complex_forecast_hub():
     assert hub_config.disclaimer == "Most forecasts have failed to reliably predict rapid changes in the trends of reported cases and hospitalizations. Due to this limitation, they should not be relied upon for decisions about the possibility or timing of rapid changes in trends."
     assert (sorted(list(hub_config.model_id_to_metadata.keys())) ==
             sorted(['Flusight-baseline', 'MOBS-GLEAM_FLUH', 'PSI-DICE', 'Test-NumericOnly']))
+    assert sorted(hub_config.displayable_model_ids) == ['Flusight-baseline', 'MOBS-GLEAM_FLUH', 'PSI-DICE']
+    assert hub_config.viz_model_ids == hub_config.displayable_model_ids
     assert hub_config.target_data_file_name == 'covid-hospital-admissions.csv'
 
     model_task_0 = hub_config.model_tasks[0]  # only one
@@ -72,6 +81,44 @@ def test_model_output_file_for_ref_date():
     assert file is None
 
 
+def test_dataset_reused_until_refreshed(tmp_path):
+    hub_path = tmp_path / 'hub'
+    shutil.copytree('tests/hubs/example-complex-forecast-hub', hub_path)
+    hub_config = HubConfigPtc(hub_path, hub_path / 'hub-config/predtimechart-config.yml')
+    dataset = hub_config.get_dataset()
+    assert hub_config.get_dataset() is dataset
+    num_rows = hub_config.to_table(filter=pc.field('model_id') == 'PSI-DICE').num_rows
+    assert hub_config.model_output_file_for_ref_date('PSI-DICE', '2022-12-17') is not None
+
+    # case: a removed file is still indexed until `refresh_dataset()`
+    psi_dice_file = hub_path / 'model-output/PSI-DICE/2022-12-17-PSI-DICE.parquet'
+    psi_dice_num_rows = pq.read_metadata(psi_dice_file).num_rows
+    psi_dice_file.unlink()
+    assert hub_config.model_output_file_for_ref_date('PSI-DICE', '2022-12-17') is not None
+    hub_config.refresh_dataset()
+    assert hub_config.get_dataset() is not dataset
+    assert hub_config.model_output_file_for_ref_date('PSI-DICE', '2022-12-17') is None
+    assert hub_config.to_table(filter=pc.field('model_id') == 'PSI-DICE').num_rows == num_rows - psi_dice_num_rows
+
+
+def test_refresh_dataset_prunes_file_has_value_memo(tmp_path):
+    hub_path = tmp_path / 'hub'
+    shutil.copytree('tests/hubs/example-complex-forecast-hub', hub_path)
+    hub_config = HubConfigPtc(hub_path, hub_path / 'hub-config/predtimechart-config.yml')
+    hub_config.model_tasks[0].get_available_ref_dates()
+    memoized_files = {memo_key[0] for memo_key in hub_config._file_has_value_memo}
+    removed_file = hub_path / 'model-output/MOBS-GLEAM_FLUH/2022-12-17-MOBS-GLEAM_FLUH.parquet'
+    changed_file = hub_path / 'model-output/MOBS-GLEAM_FLUH/2022-11-19-MOBS-GLEAM_FLUH.csv'
+    assert {str(removed_file), str(changed_file)} <= memoized_files
+
+    # case: entries for removed or changed files are pruned. the others are kept
+    removed_file.unlink()
+    os.utime(changed_file, ns=(1_000_000_000, 1_000_000_000))
+    hub_config.refresh_dataset()
+    assert {memo_key[0] for memo_key in hub_config._file_has_value_memo} == \
+           memoized_files - {str(removed_file), str(changed_file)}
+
+
 def test_get_available_ref_dates():
     hub_path = Path('tests/hubs/example-complex-forecast-hub')
     hub_config = HubConfigPtc(hub_path, hub_path / 'hub-config/predtimechart-config.yml')
@@ -81,6 +128,128 @@ def test_get_available_ref_dates():
     assert act_as_ofs == exp_as_ofs
 
 
+def test_get_available_ref_dates_viz_model_ids(tmp_path):
+    # a reference_date that only non-displayable models submitted to is not available unless all models are
+    hub_path = tmp_path / 'hub'
+    shutil.copytree('tests/hubs/example-complex-forecast-hub', hub_path)
+    model_output_dir = hub_path / 'model-output/Test-NumericOnly'
+    (model_output_dir / '2022-10-22-Test-NumericOnly.csv').rename(model_output_dir / '2022-10-29-Test-NumericOnly.csv')
+    hub_config = HubConfigPtc(hub_path, hub_path / 'hub-config/predtimechart-config.yml')
+    assert hub_config.model_tasks[0].get_available_ref_dates() == ['2022-10-22', '2022-11-19', '2022-12-17']
+    assert hub_config.window_reference_dates(last_n_rounds=4) == {'2022-10-22', '2022-11-19', '2022-12-17'}
+
+    hub_config = HubConfigPtc(hub_path, hub_path / 'hub-config/predtimechart-config.yml')
+    hub_config.viz_model_ids = list(hub_config.model_id_to_metadata)
+    assert (hub_config.model_tasks[0].get_available_ref_dates() ==
+            ['2022-10-22', '2022-10-29', '2022-11-19', '2022-12-17'])
+    assert hub_config.window_reference_dates(last_n_rounds=4) == {'2022-10-22', '2022-10-29', '2022-11-19',
+                                                                  '2022-12-17'}
+
+
+def test_window_reference_dates():
+    hub_path = Path('tests/hubs/example-complex-forecast-hub')
+    hub_config = HubConfigPtc(hub_path, hub_path / 'hub-config/predtimechart-config.yml')
+    assert hub_config.window_reference_dates() is None
+    assert hub_config.window_reference_dates(last_n_rounds=2) == {'2022-11-19', '2022-12-17'}
+    assert hub_config.window_reference_dates(since='2023-05-13') == {'2023-05-13', '2023-05-20', '2023-05-27'}
+    with pytest.raises(RuntimeError, match="only one of"):
+        hub_config.window_reference_dates(since='2023-05-13', last_n_rounds=2)
+
+
+def test_get_available_ref_dates_availability_record(tmp_path):
+    hub_path = Path('tests/hubs/example-complex-forecast-hub')
+    hub_config = HubConfigPtc(hub_path, hub_path / 'hub-config/predtimechart-config.yml')
+    availability_file = tmp_path / 'availability.json'
+    assert not hub_config.load_availability_record(availability_file)
+
+    # case: a window without a record scans all reference_dates
+    hub_config.rounds_window = {'2022-12-17'}
+    assert hub_config.model_tasks[0].get_available_ref_dates() == ['2022-10-22', '2022-11-19', '2022-12-17']
+
+    # case: a window with a record scans only the window's reference_dates
+    hub_config.save_availability_record(availability_file)
+    with open(availability_file) as fp:
+        assert json.load(fp) == {'wk inc flu hosp': ['2022-10-22', '2022-11-19', '2022-12-17']}
+    availability_file.write_text(json.dumps({'wk inc flu hosp': ['2022-10-22', '2022-12-17']}))
+    assert hub_config.load_availability_record(availability_file)
+    assert hub_config.model_tasks[0].get_available_ref_dates() == ['2022-10-22', '2022-12-17']
+
+
+def test__parquet_file_has_value(tmp_path):
+    # case: footer statistics are conclusive
+    parquet_file = Path('tests/hubs/example-complex-forecast-hub/model-output/PSI-DICE/2022-12-17-PSI-DICE.parquet')
+    assert _parquet_file_has_value(parquet_file, 'target', 'wk inc flu hosp')
+    assert not _parquet_file_has_value(parquet_file, 'target', 'wk flu hosp rate')
+    assert not _parquet_file_has_value(parquet_file, 'nonexistent_column', 'wk inc flu hosp')
+
+    # case: multiple row groups, some with inconclusive [min, max] ranges, some excluded by them
+    parquet_file = tmp_path / 'multi.parquet'
+    pq.write_table(pa.table({'target': ['a', 'a', 'c', 'e', 'x', 'z']}), parquet_file, row_group_size=2)
+    assert _parquet_file_has_value(parquet_file, 'target', 'a')  # min == max
+    assert _parquet_file_has_value(parquet_file, 'target', 'e')  # inconclusive, then read
+    assert not _parquet_file_has_value(parquet_file, 'target', 'd')  # inconclusive, then read
+    assert not _parquet_file_has_value(parquet_file, 'target', 'b')  # excluded by all ranges
+
+    # case: no statistics
+    parquet_file = tmp_path / 'no-stats.parquet'
+    pq.write_table(pa.table({'target': ['a', 'c']}), parquet_file, write_statistics=False)
+    assert _parquet_file_has_value(parquet_file, 'target', 'c')
+    assert not _parquet_file_has_value(parquet_file, 'target', 'b')
+
+
+def test__csv_file_has_value(tmp_path):
+    csv_file = Path('tests/hubs/example-complex-forecast-hub/model-output/PSI-DICE/2022-10-22-PSI-DICE.csv')
+    schema = pa.schema([('location', pa.string()), ('target', pa.string())])
+    assert _csv_file_has_value(csv_file, 'target', 'wk inc flu hosp', schema)
+    assert not _csv_file_has_value(csv_file, 'target', 'wk flu hosp rate', schema)
+
+    # case: stops reading at the first block containing the value. we test this by making the file invalid after the
+    # first few blocks, which would raise an error if they were parsed
+    csv_file = tmp_path / 'early-exit.csv'
+    num_rows = (CSV_BLOCK_SIZE * 4) // len('01,wk inc flu hosp\n')
+    with open(csv_file, 'w') as fp:
+        fp.write('location,target\n')
+        fp.write('01,wk inc flu hosp\n' * num_rows)
+        fp.write('01,wk inc flu hosp,extra-column\n')
+    assert _csv_file_has_value(csv_file, 'location', '01', schema)  # typed as string, so '01' matches
+
+
+def test_get_available_ref_dates_memoized():
+    hub_path = Path('tests/hubs/example-complex-forecast-hub')
+    hub_config = HubConfigPtc(hub_path, hub_path / 'hub-config/predtimechart-config.yml')
+    model_task = hub_config.model_tasks[0]
+    with patch('hub_predtimechart.hub_config_ptc._model_output_file_has_value_uncached',
+               return_value=True) as has_value_mock:
+        assert model_task.get_available_ref_dates() == ['2022-10-22', '2022-11-19', '2022-12-17']
+        num_calls = has_value_mock.call_count
+        assert num_calls > 0
+        assert model_task.get_available_ref_dates() == ['2022-10-22', '2022-11-19', '2022-12-17']
+        assert has_value_mock.call_count == num_calls  # all memoized
+
+
+def test_read_model_output_csv():
+    hub_path = Path('tests/hubs/example-complex-forecast-hub')
+    hub_config = HubConfigPtc(hub_path, hub_path / 'hub-config/predtimechart-config.yml')
+    csv_file = hub_path / 'model-output/Test-NumericOnly/2022-10-22-Test-NumericOnly.csv'
+
+    # case: all columns, typed by the schema rather than inferred
+    pa_table = read_model_output_csv(csv_file, hub_config.schema)
+    assert set(pa_table.schema) == {field for field in hub_config.schema if field.name != 'model_id'}
+    assert '01' in pa_table['location'].to_pylist()
+
+    # case: projected columns, single-threaded
+    pa_table = read_model_output_csv(csv_file, hub_config.schema, ['location', 'value'], use_threads=False)
+    assert pa_table.column_names == ['location', 'value']
+    assert pa_table.schema.field('value').type == hub_config.schema.field('value').type
+
+    # case: streamed and filtered
+    act_table = read_model_output_csv(csv_file, hub_config.schema, filter=pc.field('location') == '01')
+    assert act_table.num_rows > 0
+    assert act_table.equals(read_model_output_csv(csv_file, hub_config.schema).filter(pc.field('location') == '01'))
+    act_table = read_model_output_csv(csv_file, hub_config.schema, filter=pc.field('location') == 'XX')
+    assert act_table.num_rows == 0
+
+
 def test_predtimechart_config_file_existence():
     with pytest.raises(RuntimeError, match="predtimechart config file not found"):
         hub_path = Path('tests/hubs/no-ptc-config-hub')
@@ -120,6 +289,14 @@ def test__validate_predtimechart_config():
     with pytest.raises(ValidationError, match="\'\' should be non-empty"):
         _validate_predtimechart_config(ecfh_ptc_config_copy, {})  # tasks not necessary
 
+    # case: value_precision must have exactly one of its two keys
+    for value_precision in [{}, {'significant_digits': 3, 'decimal_places': 1}, {'significant_digits': 0},
+                            {'decimal_digits': 1}]:
+        ecfh_ptc_config_copy = copy.deepcopy(ecfh_ptc_config)
+        ecfh_ptc_config_copy['value_precision'] = value_precision
+        with pytest.raises(ValidationError):
+            _validate_predtimechart_config(ecfh_ptc_config_copy, {})  # tasks not necessary
+
     # case: rounds_idx is out of range
     hub_path = Path('tests/hubs/example-complex-forecast-hub')
     with open(hub_path / 'hub-config' / 'tasks.json') as fp:
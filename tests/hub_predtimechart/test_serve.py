@@ -0,0 +1,116 @@
+import json
+import shutil
+import threading
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+import pytest
+
+from hub_predtimechart.app.serve import PtcServer
+from hub_predtimechart.hub_config_ptc import HubConfigPtc
+from hub_predtimechart.util.lru_cache import LruCache
+
+
+def test_lru_cache():
+    lru_cache = LruCache(10, len)
+    lru_cache.put('a', 'aaaa')
+    lru_cache.put('b', 'bbbb')
+    assert lru_cache.get('a') == 'aaaa'  # 'b' is now the least recently used
+    lru_cache.put('c', 'cccc')
+    assert ('b' not in lru_cache) and ('a' in lru_cache) and ('c' in lru_cache)
+    assert lru_cache.total_size == 8
+
+    # case: a value larger than max_size is not cached
+    lru_cache.put('d', 'd' * 11)
+    assert ('d' not in lru_cache) and (len(lru_cache) == 2)
+
+    # case: get_or_compute() computes only on a miss
+    calls = []
+    assert lru_cache.get_or_compute('e', lambda: calls.append('e') or 'ee') == 'ee'
+    assert lru_cache.get_or_compute('e', lambda: calls.append('e') or 'ee') == 'ee'
+    assert calls == ['e']
+
+    lru_cache.clear()
+    assert (len(lru_cache) == 0) and (lru_cache.total_size == 0)
+
+
+@pytest.fixture
+def server_url_fn():
+    servers = []
+
+
+    def server_url(hub_dir, refresh_interval=0):
+        hub_config = HubConfigPtc(hub_dir, hub_dir / 'hub-config/predtimechart-config.yml')
+        server = PtcServer(hub_config, ('127.0.0.1', 0), 10_000_000, 8, refresh_interval)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}", server
+
+
+    yield server_url
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def _get_json(url):
+    with urllib.request.urlopen(url) as response:
+        assert response.headers['Content-Type'] == 'application/json'
+        return json.load(response)
+
+
+def test_serve_forecasts_and_options(server_url_fn):
+    base_url, server = server_url_fn(Path('tests/hubs/example-complex-forecast-hub'))
+    with open('tests/expected/example-complex-forecast-hub/predtimechart-options.json') as fp:
+        assert _get_json(base_url + '/predtimechart-options.json') == json.load(fp)
+
+    exp_dir = Path('tests/expected/example-complex-forecast-hub/forecasts')
+    for exp_file in exp_dir.iterdir():
+        with open(exp_file) as fp:
+            assert _get_json(f"{base_url}/forecasts/{exp_file.name}") == json.load(fp)
+
+    # one model output load per reference_date, reused across its files
+    assert len(server.model_data_cache) == len({exp_file.stem.rsplit('_', 1)[1] for exp_file in exp_dir.iterdir()})
+
+    # case: unknown paths and files with no data
+    for path in ['/forecasts/no-such-file.json', '/forecasts/wk-inc-flu-hosp_02_2022-11-19.json', '/no-such-path']:
+        with pytest.raises(urllib.error.HTTPError) as exc_info:
+            urllib.request.urlopen(base_url + path)
+        assert exc_info.value.code == 404
+
+
+def test_serve_targets(server_url_fn):
+    base_url, _ = server_url_fn(Path('tests/hubs/flu-metrocast'))
+    for loc in ['Austin', 'Houston']:
+        with open(f'tests/expected/flu-metrocast/targets/Flu-ED-visits-pct_{loc}_2025-03-01.json') as fp:
+            assert _get_json(f"{base_url}/targets/Flu-ED-visits-pct_{loc}_2025-03-01.json") == json.load(fp)
+
+
+def test_serve_refresh(tmp_path, server_url_fn):
+    hub_dir = tmp_path / 'hub'
+    shutil.copytree('tests/hubs/example-complex-forecast-hub', hub_dir)
+    removed_dir = tmp_path / 'PSI-DICE'
+    shutil.move(hub_dir / 'model-output/PSI-DICE', removed_dir)
+    base_url, server = server_url_fn(hub_dir)
+    forecasts_url = f"{base_url}/forecasts/wk-inc-flu-hosp_US_2022-10-22.json"
+    assert 'PSI-DICE' not in _get_json(forecasts_url)
+
+    # case: a new submission is served after a refresh
+    shutil.move(removed_dir, hub_dir / 'model-output/PSI-DICE')
+    assert 'PSI-DICE' not in _get_json(forecasts_url)  # cached
+    server.refresh()
+    assert len(server.model_data_cache) == 0
+    with open('tests/expected/example-complex-forecast-hub/forecasts/wk-inc-flu-hosp_US_2022-10-22.json') as fp:
+        assert _get_json(forecasts_url) == json.load(fp)
+
+    # case: refreshing periodically
+    base_url, server = server_url_fn(hub_dir, refresh_interval=0.05)
+    server.payload_cache.put('/no-such-path', b'{}')
+    for _ in range(100):
+        if '/no-such-path' not in server.payload_cache:
+            break
+
+        time.sleep(0.05)
+    assert '/no-such-path' not in server.payload_cache
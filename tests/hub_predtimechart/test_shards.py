@@ -0,0 +1,110 @@
+import json
+from pathlib import Path
+
+import pytest
+from click.testing import CliRunner
+
+from hub_predtimechart.app import generate_json_files
+from hub_predtimechart.app.generate_json_files import _generate_forecast_json_files
+from hub_predtimechart.app.merge_shards import main as merge_shards_main
+from hub_predtimechart.app.merge_shards import merge_shard_manifests
+from hub_predtimechart.hub_config_ptc import HubConfigPtc
+from hub_predtimechart.util.shards import is_shard_owner, parse_shard
+from hub_predtimechart.util.write_files import Changeset, OutputWriter
+
+
+def test_parse_shard():
+    assert parse_shard('0/4') == (0, 4)
+    assert parse_shard(' 3 / 4 ') == (3, 4)
+    for shard_str in ['4/4', '1/0', '-1/4', '1', 'a/b', '']:
+        with pytest.raises(ValueError, match="invalid shard"):
+            parse_shard(shard_str)
+
+
+def test_is_shard_owner():
+    unit_names = [f"wk-inc-flu-hosp_{idx:02}_2022-10-22.json" for idx in range(100)]
+    for unit_name in unit_names:
+        assert is_shard_owner(unit_name, None)
+        assert sum(is_shard_owner(unit_name, (shard_idx, 3)) for shard_idx in range(3)) == 1  # exactly one owner
+    assert all(any(is_shard_owner(unit_name, (shard_idx, 3)) for unit_name in unit_names) for shard_idx in range(3))
+
+
+@pytest.mark.parametrize("is_bundle", [False, True])
+def test_generate_forecast_json_files_shards(tmp_path, monkeypatch, is_bundle):
+    hub_dir = Path('tests/hubs/example-complex-forecast-hub')
+    hub_config = HubConfigPtc(hub_dir, hub_dir / 'hub-config/predtimechart-config.yml')
+    (tmp_path / 'all').mkdir()
+    exp_files = _generate_forecast_json_files(hub_config, tmp_path / 'all', is_bundle=is_bundle)
+
+    # the shards' files are disjoint and together are the same as an unsharded run's
+    shard_dir = tmp_path / 'shards'
+    shard_dir.mkdir()
+    shard_file_names = []
+    for shard_idx in range(3):
+        act_files = _generate_forecast_json_files(hub_config, shard_dir, is_bundle=is_bundle, shard=(shard_idx, 3))
+        shard_file_names.extend(act_file.name for act_file in act_files)
+    assert sorted(shard_file_names) == sorted(exp_file.name for exp_file in exp_files)
+    for exp_file in exp_files:
+        assert (shard_dir / exp_file.name).read_bytes() == exp_file.read_bytes()
+
+    # a shard loads only the rows of the task ids it owns
+    if not is_bundle:
+        load_task_ids_tuples = []
+        load_model_id_to_df = generate_json_files.load_model_id_to_df
+
+        def _load_model_id_to_df(hub_config, model_task, reference_date, is_float32_values=False,
+                                 task_ids_tuples=None):
+            load_task_ids_tuples.append(task_ids_tuples)
+            return load_model_id_to_df(hub_config, model_task, reference_date, is_float32_values, task_ids_tuples)
+
+
+        monkeypatch.setattr(generate_json_files, 'load_model_id_to_df', _load_model_id_to_df)
+        _generate_forecast_json_files(hub_config, tmp_path / 'all', is_regenerate=True, shard=(0, 3))
+        assert load_task_ids_tuples
+        for task_ids_tuples in load_task_ids_tuples:
+            assert task_ids_tuples is not None
+            assert len(task_ids_tuples) < len(hub_config.model_tasks[0].viz_task_ids_tuples)
+
+
+def test_merge_shards(tmp_path):
+    hub_dir = Path('tests/hubs/example-complex-forecast-hub')
+    hub_config = HubConfigPtc(hub_dir, hub_dir / 'hub-config/predtimechart-config.yml')
+    manifest_files = []
+    for shard_idx in range(2):
+        changeset = Changeset((shard_idx, 2))
+        _generate_forecast_json_files(hub_config, tmp_path, writer=OutputWriter(changeset), shard=(shard_idx, 2))
+        manifest_files.append(tmp_path / f"manifest-{shard_idx}.json")
+        changeset.save(manifest_files[-1])
+
+    # case: valid manifests
+    options_file = tmp_path / 'predtimechart-options.json'
+    changeset_file = tmp_path / 'changeset.json'
+    result = CliRunner().invoke(merge_shards_main, [str(hub_dir), str(hub_dir / 'hub-config/predtimechart-config.yml'),
+                                                    str(options_file)] + [str(_) for _ in manifest_files] +
+                                ['--changeset-file', str(changeset_file)])
+    assert result.exit_code == 0, result.output
+    with open(options_file) as act_fp, \
+            open('tests/expected/example-complex-forecast-hub/predtimechart-options.json') as exp_fp:
+        assert json.load(act_fp) == json.load(exp_fp)
+    with open(changeset_file) as fp:
+        act_changeset = json.load(fp)
+    assert 'shard' not in act_changeset
+    assert set(act_changeset['added']) == {str(_) for _ in tmp_path.glob('*.json')
+                                           if _ not in manifest_files + [changeset_file]}
+
+    # case: missing shard
+    with pytest.raises(RuntimeError, match="do not cover each of the 2 shards"):
+        merge_shard_manifests(manifest_files[:1])
+
+    # case: duplicate shard
+    with pytest.raises(RuntimeError, match="do not cover each of the 2 shards"):
+        merge_shard_manifests([manifest_files[0], manifest_files[0]])
+
+    # case: different shard counts
+    Changeset((2, 3)).save(tmp_path / 'other.json')
+    with pytest.raises(RuntimeError, match="different shard counts"):
+        merge_shard_manifests(manifest_files + [tmp_path / 'other.json'])
+
+    # case: not a shard manifest
+    with pytest.raises(RuntimeError, match="not a shard manifest"):
+        merge_shard_manifests([changeset_file])
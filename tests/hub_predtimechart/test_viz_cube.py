@@ -0,0 +1,74 @@
+import json
+import os
+import shutil
+from pathlib import Path
+
+import pyarrow.parquet as pq
+import pytest
+from click.testing import CliRunner
+
+from hub_predtimechart.app.generate_json_files import iter_forecast_payloads, main
+from hub_predtimechart.hub_config_ptc import HubConfigPtc
+from hub_predtimechart.viz_cube import QUANTILE_COLS, VizCube
+
+
+@pytest.mark.parametrize('hub_name', ['example-complex-forecast-hub', 'flu-metrocast'])
+def test_viz_cube_payloads(tmp_path, hub_name):
+    hub_dir = Path('tests/hubs') / hub_name
+    hub_config = HubConfigPtc(hub_dir, hub_dir / 'hub-config/predtimechart-config.yml')
+    exp_payloads = dict(iter_forecast_payloads(hub_config))
+    exp_available_ref_dates = [model_task.get_available_ref_dates() for model_task in hub_config.model_tasks]
+
+    hub_config = HubConfigPtc(hub_dir, hub_dir / 'hub-config/predtimechart-config.yml')
+    viz_cube = VizCube(hub_config, tmp_path)
+    viz_cube.update()
+    hub_config.viz_cube = viz_cube
+    assert dict(iter_forecast_payloads(hub_config)) == exp_payloads
+    assert [model_task.get_available_ref_dates() for model_task in hub_config.model_tasks] == exp_available_ref_dates
+
+
+def test_viz_cube_update(tmp_path):
+    hub_dir = tmp_path / 'hub'
+    shutil.copytree('tests/hubs/example-complex-forecast-hub', hub_dir)
+    hub_config = HubConfigPtc(hub_dir, hub_dir / 'hub-config/predtimechart-config.yml')
+    cube_dir = tmp_path / 'cube'
+    assert VizCube(hub_config, cube_dir).update() == {'reduced': 10, 'removed': 0, 'unchanged': 0}
+    part_table = pq.read_table(cube_dir / 'PSI-DICE/2022-10-22-PSI-DICE.parquet')
+    assert part_table.column_names == ['model_id', 'target', 'location', 'reference_date', 'target_end_date',
+                                       *QUANTILE_COLS]
+    assert set(part_table['model_id'].to_pylist()) == {'PSI-DICE'}
+
+    # case: only changed and removed files are processed
+    model_output_file = hub_dir / 'model-output/PSI-DICE/2022-10-22-PSI-DICE.csv'
+    os.utime(model_output_file, ns=(1_000_000_000, 1_000_000_000))
+    (hub_dir / 'model-output/PSI-DICE/2022-11-19-PSI-DICE.csv').unlink()
+    viz_cube = VizCube(hub_config, cube_dir)
+    assert viz_cube.update() == {'reduced': 1, 'removed': 1, 'unchanged': 8}
+    assert not (cube_dir / 'PSI-DICE/2022-11-19-PSI-DICE.parquet').exists()
+    assert viz_cube.file_has_value(model_output_file, 'target', 'wk inc flu hosp')
+
+    # case: a part whose submission file changed since it was reduced is not read
+    with open(model_output_file, 'a') as fp:
+        fp.write('\n')
+    assert viz_cube.file_has_value(model_output_file, 'target', 'wk inc flu hosp') is None
+
+    # case: duplicate quantile rows cannot be reduced
+    with open(model_output_file, 'a') as fp:
+        fp.write('US,2022-10-22,0,2022-10-22,wk inc flu hosp,quantile,0.025,1411\n')
+    with pytest.raises(RuntimeError, match="duplicate quantile rows found"):
+        viz_cube.update()
+
+
+def test_main_viz_cube(tmp_path):
+    hub_dir = Path('tests/hubs/example-complex-forecast-hub')
+    forecasts_dir = tmp_path / 'forecasts'
+    forecasts_dir.mkdir()
+    result = CliRunner().invoke(main, [str(hub_dir), str(hub_dir / 'hub-config/predtimechart-config.yml'),
+                                       str(tmp_path / 'predtimechart-options.json'), str(forecasts_dir),
+                                       '--viz-cube', str(tmp_path / 'cube')])
+    assert result.exit_code == 0, result.output
+    assert (tmp_path / 'cube/manifest.json').exists()
+    for json_file in forecasts_dir.iterdir():
+        with open(json_file) as act_fp, \
+                open('tests/expected/example-complex-forecast-hub/forecasts/' + json_file.name) as exp_fp:
+            assert json.load(act_fp) == json.load(exp_fp)
@@ -0,0 +1,120 @@
+import json
+import os
+import shutil
+
+from hub_predtimechart.app.watch import HubWatcher
+
+
+def test_hub_watcher(tmp_path):
+    hub_dir = tmp_path / 'hub'
+    shutil.copytree('tests/hubs/example-complex-forecast-hub', hub_dir)
+    forecasts_dir = tmp_path / 'forecasts'
+    forecasts_dir.mkdir()
+    options_file = tmp_path / 'predtimechart-options.json'
+    watcher = HubWatcher(hub_dir, hub_dir / 'hub-config/predtimechart-config.yml', options_file, forecasts_dir,
+                         debounce_seconds=10)
+    watcher.generate_all()
+    assert len(list(forecasts_dir.iterdir())) == 6
+    for json_file in forecasts_dir.iterdir():
+        os.utime(json_file, ns=(1_000_000_000, 1_000_000_000))  # so we can tell which files were rewritten
+
+    # case: no changes
+    assert watcher.poll(now=0) == set()
+
+    # case: a burst of changes is debounced until no more changes are seen for `debounce_seconds`
+    (hub_dir / 'model-output/PSI-DICE/2022-10-22-PSI-DICE.csv').unlink()
+    assert watcher.poll(now=100) == set()
+    (hub_dir / 'model-output/MOBS-GLEAM_FLUH/2022-10-22-MOBS-GLEAM_FLUH.csv').unlink()
+    assert watcher.poll(now=105) == set()
+    assert watcher.poll(now=114) == set()
+    assert watcher.poll(now=115) == {hub_dir / 'model-output/PSI-DICE/2022-10-22-PSI-DICE.csv',
+                                     hub_dir / 'model-output/MOBS-GLEAM_FLUH/2022-10-22-MOBS-GLEAM_FLUH.csv'}
+
+    # only the affected reference date's files were regenerated
+    with open(forecasts_dir / 'wk-inc-flu-hosp_US_2022-10-22.json') as fp:
+        assert list(json.load(fp)) == ['Flusight-baseline']
+    rewritten_files = {json_file.name for json_file in forecasts_dir.iterdir()
+                       if json_file.stat().st_mtime_ns != 1_000_000_000}
+    assert rewritten_files == {'wk-inc-flu-hosp_US_2022-10-22.json', 'wk-inc-flu-hosp_01_2022-10-22.json'}
+
+    # case: processed changes are not processed again
+    assert watcher.poll(now=200) == set()
+
+    # case: a metadata change rebuilds the HubConfigPtc
+    hub_config = watcher.hub_config
+    shutil.rmtree(hub_dir / 'model-output/PSI-DICE')
+    next((hub_dir / 'model-metadata').glob('PSI-DICE.*')).unlink()
+    assert watcher.poll(now=300) == set()
+    assert watcher.poll(now=310)
+    assert watcher.hub_config is not hub_config
+    assert 'PSI-DICE' not in watcher.hub_config.model_id_to_metadata
+    with open(options_file) as fp:
+        assert 'PSI-DICE' not in json.load(fp)['models']
+
+
+def test_hub_watcher_error(tmp_path):
+    hub_dir = tmp_path / 'hub'
+    shutil.copytree('tests/hubs/example-complex-forecast-hub', hub_dir)
+    forecasts_dir = tmp_path / 'forecasts'
+    forecasts_dir.mkdir()
+    watcher = HubWatcher(hub_dir, hub_dir / 'hub-config/predtimechart-config.yml',
+                         tmp_path / 'predtimechart-options.json', forecasts_dir, debounce_seconds=10)
+    watcher.generate_all()
+
+    # case: a partly uploaded file fails processing. the error is not raised, and the change is kept
+    csv_file = hub_dir / 'model-output/PSI-DICE/2022-10-22-PSI-DICE.csv'
+    content = csv_file.read_bytes()
+    csv_file.write_bytes(content[:content.index(b'\n', len(content) // 2) + 1] + b'2022-10-22,wk inc flu hosp')
+    assert watcher.poll(now=100) == set()
+    assert watcher.poll(now=110) == set()
+    assert watcher._pending_files == {csv_file}
+
+    # case: the failed change is retried after the next quiet period, along with any newer ones
+    assert watcher.poll(now=115) == set()
+    csv_file.write_bytes(content)
+    assert watcher.poll(now=120) == set()
+    assert watcher.poll(now=130) == {csv_file}
+    with open(forecasts_dir / 'wk-inc-flu-hosp_US_2022-10-22.json') as fp:
+        assert 'PSI-DICE' in json.load(fp)
+
+
+def test_hub_watcher_target_data(tmp_path):
+    hub_dir = tmp_path / 'hub'
+    shutil.copytree('tests/hubs/flu-metrocast', hub_dir)
+    forecasts_dir, target_dir = tmp_path / 'forecasts', tmp_path / 'targets'
+    forecasts_dir.mkdir()
+    target_dir.mkdir()
+    watcher = HubWatcher(hub_dir, hub_dir / 'hub-config/predtimechart-config.yml',
+                         tmp_path / 'predtimechart-options.json', forecasts_dir, target_dir, debounce_seconds=0)
+    watcher.generate_all()
+    exp_target_files = sorted(target_dir.iterdir())
+    assert exp_target_files
+    for target_file in exp_target_files:
+        target_file.unlink()
+
+    # case: a target data change regenerates the target files
+    target_data_file = next(file for file in (hub_dir / 'target-data').rglob('*') if file.is_file())
+    os.utime(target_data_file, ns=(2_000_000_000, 2_000_000_000))
+    assert watcher.poll(now=0) == {target_data_file}
+    assert sorted(target_dir.iterdir()) == exp_target_files
+
+
+def test_hub_watcher_all_models(tmp_path):
+    hub_dir = tmp_path / 'hub'
+    shutil.copytree('tests/hubs/example-complex-forecast-hub', hub_dir)
+    forecasts_dir = tmp_path / 'forecasts'
+    forecasts_dir.mkdir()
+    watcher = HubWatcher(hub_dir, hub_dir / 'hub-config/predtimechart-config.yml',
+                         tmp_path / 'predtimechart-options.json', forecasts_dir, debounce_seconds=0,
+                         is_all_models=True)
+    assert 'Test-NumericOnly' in watcher.hub_config.viz_model_ids
+    watcher.generate_all()
+    assert (forecasts_dir / 'wk-inc-flu-hosp_02_2022-10-22.json').exists()
+
+    # case: a rebuilt HubConfigPtc keeps all models
+    metadata_file = next((hub_dir / 'model-metadata').glob('PSI-DICE.*'))
+    metadata_file.write_text(metadata_file.read_text() + '\n')
+    hub_config = watcher.hub_config
+    assert watcher.poll(now=100) == {metadata_file}
+    assert watcher.hub_config is not hub_config
+    assert 'Test-NumericOnly' in watcher.hub_config.viz_model_ids
@@ -0,0 +1,190 @@
+import gzip
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+import pytest
+from structlog.testing import capture_logs
+
+from hub_predtimechart.app.generate_json_files import _generate_forecast_json_files, _generate_options_file
+from hub_predtimechart.hub_config_ptc import HubConfigPtc
+from hub_predtimechart.util.write_files import Changeset, OutputWriter, json_bytes, remove_file, write_file_if_changed
+
+
+def test_write_file_if_changed(tmp_path):
+    file = tmp_path / 'file.json'
+
+    # case: new file
+    assert write_file_if_changed(file, json_bytes({'a': 1}, indent=4))
+    assert file.read_bytes() == b'{\n    "a": 1\n}'
+
+    # case: identical content. set an old mtime so we can tell whether the file was touched
+    os.utime(file, ns=(1_000_000_000, 1_000_000_000))
+    assert not write_file_if_changed(file, json_bytes({'a': 1}, indent=4))
+    assert file.stat().st_mtime_ns == 1_000_000_000
+
+    # case: changed content
+    assert write_file_if_changed(file, json_bytes({'a': 2}, indent=4))
+    assert file.read_bytes() == b'{\n    "a": 2\n}'
+    assert file.stat().st_mtime_ns != 1_000_000_000
+
+    # no temporary files should be left behind
+    assert list(tmp_path.iterdir()) == [file]
+
+
+def test_generate_options_file_unchanged(tmp_path):
+    hub_dir = Path('tests/hubs/example-complex-forecast-hub')
+    hub_config = HubConfigPtc(hub_dir, hub_dir / 'hub-config/predtimechart-config.yml')
+    ptc_options = tmp_path / 'ptc_options'
+    _generate_options_file(hub_config, ptc_options)
+    os.utime(ptc_options, ns=(1_000_000_000, 1_000_000_000))
+    _generate_options_file(hub_config, ptc_options)
+    assert ptc_options.stat().st_mtime_ns == 1_000_000_000
+
+
+def test_changeset(tmp_path):
+    changeset = Changeset()
+    file_a, file_b, file_c = tmp_path / 'a.json', tmp_path / 'b.json', tmp_path / 'c.json'
+    write_file_if_changed(file_b, b'old')
+    write_file_if_changed(file_c, b'same')
+    write_file_if_changed(file_a, b'new', changeset)
+    write_file_if_changed(file_b, b'changed', changeset)
+    write_file_if_changed(file_c, b'same', changeset)
+    assert remove_file(file_b, changeset)
+    assert not remove_file(tmp_path / 'missing.json', changeset)
+
+    changeset_file = tmp_path / 'changeset.json'
+    changeset.save(changeset_file)
+    with open(changeset_file) as fp:
+        act_changeset = json.load(fp)
+    assert act_changeset == {
+        'added': {str(file_a): {'sha256': hashlib.sha256(b'new').hexdigest(), 'size': 3}},
+        'modified': {},
+        'unchanged': {str(file_c): {'sha256': hashlib.sha256(b'same').hexdigest(), 'size': 4}},
+        'deleted': {str(file_b): {'sha256': hashlib.sha256(b'changed').hexdigest(), 'size': 7}},
+    }
+
+    # case: update() follows the same rule: the other changeset's status wins
+    other_changeset = Changeset()
+    other_changeset.record(file_a, 'deleted', b'new')
+    changeset.update(other_changeset)
+    assert set(changeset.status_to_files['added']) == set()
+    assert set(changeset.status_to_files['deleted']) == {str(file_a), str(file_b)}
+
+
+def test_generate_forecast_json_files_changeset(tmp_path):
+    hub_dir = Path('tests/hubs/example-complex-forecast-hub')
+    hub_config = HubConfigPtc(hub_dir, hub_dir / 'hub-config/predtimechart-config.yml')
+    output_dir = tmp_path
+
+    # generate all files and then delete one from the current round so that the second run adds it and leaves the
+    # current round's other file unchanged
+    _generate_forecast_json_files(hub_config, output_dir)
+    (output_dir / 'wk-inc-flu-hosp_US_2022-12-17.json').unlink()
+
+    changeset = Changeset()
+    _generate_forecast_json_files(hub_config, output_dir, writer=OutputWriter(changeset))
+    assert set(changeset.status_to_files['added']) == {str(output_dir / 'wk-inc-flu-hosp_US_2022-12-17.json')}
+    assert set(changeset.status_to_files['unchanged']) == {str(output_dir / 'wk-inc-flu-hosp_01_2022-12-17.json')}
+    assert changeset.status_to_files['modified'] == changeset.status_to_files['deleted'] == {}
+
+
+def test_output_writer_sidecars(tmp_path):
+    changeset = Changeset()
+    writer = OutputWriter(changeset, ('gz',))
+    file = tmp_path / 'file.json'
+    gz_file = tmp_path / 'file.json.gz'
+
+    assert writer.write(file, b'{"a": 1}')
+    assert gzip.decompress(gz_file.read_bytes()) == b'{"a": 1}'
+    assert set(changeset.status_to_files['added']) == {str(file), str(gz_file)}
+
+    # case: unchanged file: sidecar is not recompressed
+    os.utime(gz_file, ns=(1_000_000_000, 1_000_000_000))
+    assert not writer.write(file, b'{"a": 1}')
+    assert gz_file.stat().st_mtime_ns == 1_000_000_000
+    assert set(changeset.status_to_files['unchanged']) == {str(file), str(gz_file)}
+
+    # case: unchanged file but missing sidecar
+    gz_file.unlink()
+    assert not writer.write(file, b'{"a": 1}')
+    assert gzip.decompress(gz_file.read_bytes()) == b'{"a": 1}'
+
+    # case: no sidecar
+    no_compress_file = tmp_path / 'file.bundle'
+    writer.write(no_compress_file, b'{"a": 1}', is_compress=False)
+    assert not (tmp_path / 'file.bundle.gz').exists()
+
+    # case: remove also removes sidecars
+    assert writer.remove(file)
+    assert not file.exists() and not gz_file.exists()
+    assert set(changeset.status_to_files['deleted']) == {str(file), str(gz_file)}
+
+    with pytest.raises(ValueError, match="invalid compress_format"):
+        OutputWriter(compress_formats=('zip',))
+
+
+def test_output_writer_brotli_sidecars(tmp_path):
+    brotli = pytest.importorskip('brotli')
+    writer = OutputWriter(compress_formats=('gz', 'br'))
+    file = tmp_path / 'file.json'
+    writer.write(file, b'{"a": 1}')
+    assert brotli.decompress((tmp_path / 'file.json.br').read_bytes()) == b'{"a": 1}'
+    assert gzip.decompress((tmp_path / 'file.json.gz').read_bytes()) == b'{"a": 1}'
+
+
+def test_output_writer_threads(tmp_path):
+    changeset = Changeset()
+    with OutputWriter(changeset, num_threads=3, queue_size=2) as writer:
+        for idx in range(50):
+            writer.write_json(tmp_path / f"file{idx}.json", {'idx': idx}, indent=4)
+    assert len(changeset.status_to_files['added']) == 50
+    for idx in range(50):
+        assert json.loads((tmp_path / f"file{idx}.json").read_text()) == {'idx': idx}
+    assert writer._threads == []
+    writer.close()  # safe to call again
+
+    # case: writing after close() raises rather than queueing an item that nothing will write
+    with pytest.raises(RuntimeError, match="closed OutputWriter"):
+        writer.write_json(tmp_path / 'late.json', {'a': 1})
+    assert not (tmp_path / 'late.json').exists()
+
+
+def test_output_writer_threads_error(tmp_path):
+    writer = OutputWriter(num_threads=2)
+    writer.write_json(tmp_path / 'missing-dir' / 'file.json', {'a': 1})  # fails on a writer thread
+    with pytest.raises(RuntimeError, match="an OutputWriter thread failed") as exc_info:
+        writer.close()
+    assert isinstance(exc_info.value.__cause__, FileNotFoundError)
+
+    # case: producers stop early once a thread has failed
+    writer = OutputWriter(num_threads=1)
+    writer.write_json(tmp_path / 'missing-dir' / 'file.json', {'a': 1})
+    with pytest.raises(RuntimeError, match="an OutputWriter thread failed"):
+        for idx in range(1000):
+            writer.write_json(tmp_path / f"file{idx}.json", {'idx': idx})
+            time.sleep(0.001)  # give the thread a chance to fail
+    with pytest.raises(RuntimeError):
+        writer.close()
+
+    # case: a writer thread's error is logged, not lost, when the caller's own exception is propagating
+    with capture_logs() as logs, pytest.raises(ValueError, match="caller error"):
+        with OutputWriter(num_threads=1) as writer:
+            writer.write_json(tmp_path / 'missing-dir' / 'file.json', {'a': 1})
+            raise ValueError("caller error")
+    assert [log['log_level'] for log in logs] == ['error']
+    assert 'a writer thread also failed' in logs[0]['event']
+
+
+def test_generate_forecast_json_files_writer_threads(tmp_path):
+    hub_dir = Path('tests/hubs/example-complex-forecast-hub')
+    hub_config = HubConfigPtc(hub_dir, hub_dir / 'hub-config/predtimechart-config.yml')
+    with OutputWriter(num_threads=4) as writer:
+        json_files = _generate_forecast_json_files(hub_config, tmp_path, writer=writer)
+    assert len(json_files) == 6
+    for json_file in json_files:
+        with open('tests/expected/example-complex-forecast-hub/forecasts/' + json_file.name) as exp_fp, \
+                open(json_file) as act_fp:
+            assert json.load(act_fp) == json.load(exp_fp)